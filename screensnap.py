@@ -13,14 +13,16 @@ Purpose: Save time during UI troubleshooting by enabling quick visual feedback
 
 import os
 import sys
-import platform
+import itertools
 from pathlib import Path
 from datetime import datetime
-from typing import Optional
-import json
+from typing import Optional, Dict, Type
 
 VERSION = "1.0.0"
 DEFAULT_CONFIG_PATH = Path.home() / ".screensnaprc"
+DEFAULT_BACKEND = "imagegrab"
+DEFAULT_SOCKET_PATH = Path.home() / ".screensnap.sock"
+OUTPUT_FORMATS = ["png", "jpg", "jpeg", "webp", "raw"]
 
 # ============== CONFIGURATION ==============
 
@@ -33,6 +35,8 @@ class ScreenSnapConfig:
     
     def _load_config(self) -> dict:
         """Load configuration from file"""
+        import json
+        
         if self.config_path.exists():
             try:
                 with open(self.config_path, 'r') as f:
@@ -47,280 +51,5230 @@ class ScreenSnapConfig:
             "version": VERSION,
             "output_dir": ".",
             "format": "png",
-            "include_timestamp": True
+            "include_timestamp": True,
+            "backend": DEFAULT_BACKEND
         }
     
     def save(self):
         """Save current configuration to file"""
+        import json
+        
         with open(self.config_path, 'w') as f:
             json.dump(self.config, f, indent=2)
 
 
-# ============== MAIN CLASS ==============
+# ============== CAPTURE BACKENDS ==============
 
-class ScreenSnap:
-    """Main screenshot capture class"""
+def validate_region(region) -> tuple:
+    """
+    Validate a capture region
     
-    def __init__(self, output_dir: Optional[str] = None, 
-                 format: str = "png",
-                 config_path: Optional[Path] = None):
+    Args:
+        region: (x, y, width, height) sequence, or "X,Y,W,H" string
+    
+    Returns:
+        Region as a tuple of four ints
+    
+    Raises:
+        ValueError: If region is malformed, negative or empty
+    """
+    values = region.replace(' ', '').split(',') if isinstance(region, str) else region
+    try:
+        x, y, width, height = (int(v) for v in values)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid region {region!r}. Expected X,Y,WIDTH,HEIGHT")
+    if x < 0 or y < 0 or width <= 0 or height <= 0:
+        raise ValueError(
+            f"Invalid region ({x}, {y}, {width}, {height}): "
+            "origin must be non-negative and size positive"
+        )
+    return (x, y, width, height)
+
+
+class CaptureBackend:
+    """
+    Base class for screen capture backends
+    
+    A backend turns "grab the screen" into a PIL Image. Backends may keep
+    resources (display connections, file descriptors, shared memory) open
+    between grabs; they are acquired lazily on the first grab and released
+    by close().
+    """
+    
+    name = "base"
+    
+    # True if _grab(region) reads only the region's pixels; otherwise the
+    # full screen is grabbed and cropped
+    supports_region = False
+    
+    def __init__(self, **options):
+        self.options = options
+        self._opened = False
+        # Screen size, when the backend knows it (set by open())
+        self.width = None
+        self.height = None
+    
+    @classmethod
+    def is_available(cls) -> bool:
+        """Return True if this backend can plausibly run on this host"""
+        return True
+    
+    def open(self):
+        """Acquire backend resources (called automatically on first grab)"""
+        self._opened = True
+    
+    def grab(self, region: Optional[tuple] = None):
         """
-        Initialize ScreenSnap
+        Grab the screen
         
         Args:
-            output_dir: Directory to save screenshots (default: current dir)
-            format: Image format (default: png)
-            config_path: Path to config file (default: ~/.screensnaprc)
+            region: (x, y, width, height) to capture (default: full screen)
+        
+        Returns:
+            PIL Image of the screen contents
         
         Raises:
-            ValueError: If format is invalid
-            ImportError: If Pillow is not installed
+            ValueError: If region is malformed or outside the screen
         """
-        self.config_manager = ScreenSnapConfig(config_path)
-        self.output_dir = Path(output_dir or self.config_manager.config['output_dir'])
+        if region is not None:
+            region = validate_region(region)
+        if not self._opened:
+            self.open()
+        if region is None:
+            return self._grab(None) if self.supports_region else self._grab()
         
-        # Validate format
-        valid_formats = ['png', 'jpg', 'jpeg']
-        format_lower = format.lower()
-        if format_lower not in valid_formats:
+        x, y, width, height = region
+        if self.width is not None and (x + width > self.width or y + height > self.height):
             raise ValueError(
-                f"Invalid format '{format}'. Must be one of: {', '.join(valid_formats)}"
+                f"Region {region} is outside the {self.width}x{self.height} screen"
             )
-        self.format = format_lower
-        
-        self.system = platform.system()
+        if self.supports_region:
+            return self._grab(region)
+        return self._grab().crop((x, y, x + width, y + height))
+    
+    def _grab(self, region=None):
+        raise NotImplementedError
+    
+    def monitors(self) -> list:
+        """
+        Enumerate monitors
         
-        # Ensure output directory exists
-        self.output_dir.mkdir(parents=True, exist_ok=True)
+        Returns:
+            List of monitor dicts (index from 1, x, y, width, height,
+            primary) in the coordinate space of a full-screen grab. Backends
+            that cannot enumerate report the whole screen as one monitor.
+        """
+        if not self._opened:
+            self.open()
+        monitors = self._monitors()
+        if monitors:
+            return monitors
+        if self.width is None:
+            self.width, self.height = self.grab().size
+        return [_monitor(1, 0, 0, self.width, self.height, True)]
+    
+    def _monitors(self) -> list:
+        return []
+    
+    def grab_monitor(self, monitor: dict):
+        """
+        Grab one monitor returned by monitors()
         
-        # Import PIL
+        Returns:
+            PIL Image of that monitor only
+        """
+        return self.grab((monitor["x"], monitor["y"], monitor["width"], monitor["height"]))
+    
+    def close(self):
+        """Release backend resources"""
+        self._opened = False
+
+
+class ImageGrabBackend(CaptureBackend):
+    """Pillow's ImageGrab (portable, but reconnects on every grab on Linux)"""
+    
+    name = "imagegrab"
+    
+    supports_region = True
+    
+    def open(self):
+        from PIL import ImageGrab
+        self._image_grab = ImageGrab
+        super().open()
+    
+    def _grab(self, region=None):
+        if region is None:
+            return self._image_grab.grab(**self.options)
+        x, y, width, height = region
+        return self._image_grab.grab(bbox=(x, y, x + width, y + height), **self.options)
+    
+    def _monitors(self) -> list:
+        if sys.platform == "win32":
+            return _win32_monitors()
+        if os.environ.get("DISPLAY"):
+            return _xrandr_monitors(self.options.get("xdisplay"))
+        return []
+    
+    def grab_monitor(self, monitor: dict):
+        if sys.platform != "win32":
+            return super().grab_monitor(monitor)
+        # Windows monitors use virtual-screen coordinates (possibly
+        # negative), which ImageGrab only accepts with all_screens
+        if not self._opened:
+            self.open()
+        x, y = monitor["x"], monitor["y"]
+        options = dict(self.options, all_screens=True)
+        return self._image_grab.grab(
+            bbox=(x, y, x + monitor["width"], y + monitor["height"]), **options
+        )
+
+
+class XlibBackend(CaptureBackend):
+    """
+    Raw Xlib capture over one persistent X connection
+    
+    Requires python-xlib. Pixels still travel through the X socket, but the
+    connection setup ImageGrab pays on every call happens only once.
+    """
+    
+    name = "xlib"
+    supports_region = True
+    
+    @classmethod
+    def is_available(cls) -> bool:
+        import importlib.util
+        return bool(os.environ.get("DISPLAY")) and \
+            importlib.util.find_spec("Xlib") is not None
+    
+    def open(self):
         try:
-            from PIL import ImageGrab
-            self.ImageGrab = ImageGrab
+            from Xlib import display, X
         except ImportError:
             raise ImportError(
-                "Pillow is required for ScreenSnap. Install it with: pip install pillow"
+                "python-xlib is required for the xlib backend. "
+                "Install it with: pip install python-xlib"
             )
+        self._X = X
+        self.display = display.Display(self.options.get("display"))
+        screen = self.display.screen()
+        self.root = screen.root
+        self.width = screen.width_in_pixels
+        self.height = screen.height_in_pixels
+        super().open()
     
-    def _validate_filename(self, filename: str) -> str:
-        """
-        Validate and sanitize filename
+    def _grab(self, region=None):
+        from PIL import Image
         
-        Args:
-            filename: User-provided filename
+        x, y, width, height = region or (0, 0, self.width, self.height)
+        raw = self.root.get_image(x, y, width, height, self._X.ZPixmap, 0xffffffff)
+        if raw.depth not in (24, 32):
+            raise RuntimeError(f"Unsupported X display depth: {raw.depth}")
+        return Image.frombuffer(
+            'RGB', (width, height), raw.data, 'raw', 'BGRX', 0, 1
+        )
+    
+    def _monitors(self) -> list:
+        return _xrandr_monitors(self.options.get("display"))
+    
+    def close(self):
+        if self._opened:
+            self.display.close()
+        super().close()
+
+
+class XShmBackend(CaptureBackend):
+    """
+    X11 MIT-SHM capture with a persistent connection and shared segment
+    
+    The display connection and a System V shared-memory segment live for
+    the lifetime of the backend. Each grab is one XShmGetImage: the X server
+    writes pixels straight into the segment, which is then wrapped with
+    Image.frombuffer (no socket transfer, no intermediate bytes object).
+    Talks to libX11/libXext through ctypes, so no extra packages are needed.
+    Only works against a local X server (Xorg, Xvfb).
+    """
+    
+    name = "xshm"
+    supports_region = True
+    
+    ZPIXMAP = 2
+    MAX_REGION_SEGMENTS = 4
+    ALL_PLANES = 0xffffffffffffffff
+    IPC_PRIVATE = 0
+    IPC_CREAT = 0o1000
+    IPC_RMID = 0
+    
+    # XSetErrorHandler is process-wide: one handler serves every open
+    # backend (errors are filed by display) and the handler it replaced is
+    # restored when the last backend closes
+    _error_handler = None
+    _previous_handler = None
+    _error_handler_users = 0
+    _errors_by_display = {}
+    
+    @classmethod
+    def is_available(cls) -> bool:
+        import ctypes.util
+        return bool(os.environ.get("DISPLAY")) and \
+            ctypes.util.find_library("X11") is not None and \
+            ctypes.util.find_library("Xext") is not None
+    
+    @staticmethod
+    def _load_libraries():
+        """Load libX11/libXext/libc and declare the prototypes we call"""
+        import ctypes
+        import ctypes.util
+        from ctypes import (POINTER, c_char_p, c_int, c_uint, c_ulong,
+                            c_void_p, c_size_t)
         
-        Returns:
-            Sanitized filename (basename only, no path components)
+        class XImage(ctypes.Structure):
+            # Leading fields of Xlib's XImage; we only ever hold pointers
+            _fields_ = [
+                ("width", c_int), ("height", c_int), ("xoffset", c_int),
+                ("format", c_int), ("data", c_void_p),
+                ("byte_order", c_int), ("bitmap_unit", c_int),
+                ("bitmap_bit_order", c_int), ("bitmap_pad", c_int),
+                ("depth", c_int), ("bytes_per_line", c_int),
+                ("bits_per_pixel", c_int), ("red_mask", c_ulong),
+                ("green_mask", c_ulong), ("blue_mask", c_ulong),
+            ]
         
-        Raises:
-            ValueError: If filename is invalid
+        class XShmSegmentInfo(ctypes.Structure):
+            _fields_ = [
+                ("shmseg", c_ulong), ("shmid", c_int),
+                ("shmaddr", c_void_p), ("readOnly", c_int),
+            ]
+        
+        names = {lib: ctypes.util.find_library(lib) for lib in ("X11", "Xext", "c")}
+        missing = [lib for lib, path in names.items() if path is None]
+        if missing:
+            raise ImportError(
+                f"The xshm backend needs lib{', lib'.join(missing)} (X11 client libraries)"
+            )
+        x11 = ctypes.CDLL(names["X11"])
+        xext = ctypes.CDLL(names["Xext"])
+        libc = ctypes.CDLL(names["c"], use_errno=True)
+        
+        prototypes = [
+            (x11.XOpenDisplay, c_void_p, [c_char_p]),
+            (x11.XCloseDisplay, c_int, [c_void_p]),
+            (x11.XDefaultScreen, c_int, [c_void_p]),
+            (x11.XRootWindow, c_ulong, [c_void_p, c_int]),
+            (x11.XDefaultVisual, c_void_p, [c_void_p, c_int]),
+            (x11.XDefaultDepth, c_int, [c_void_p, c_int]),
+            (x11.XDisplayWidth, c_int, [c_void_p, c_int]),
+            (x11.XDisplayHeight, c_int, [c_void_p, c_int]),
+            (x11.XSync, c_int, [c_void_p, c_int]),
+            (x11.XFree, c_int, [c_void_p]),
+            (x11.XSetErrorHandler, c_void_p, [c_void_p]),
+            (xext.XShmQueryExtension, c_int, [c_void_p]),
+            (xext.XShmCreateImage, POINTER(XImage),
+             [c_void_p, c_void_p, c_uint, c_int, c_void_p,
+              POINTER(XShmSegmentInfo), c_uint, c_uint]),
+            (xext.XShmAttach, c_int, [c_void_p, POINTER(XShmSegmentInfo)]),
+            (xext.XShmDetach, c_int, [c_void_p, POINTER(XShmSegmentInfo)]),
+            (xext.XShmGetImage, c_int,
+             [c_void_p, c_ulong, POINTER(XImage), c_int, c_int, c_ulong]),
+            (libc.shmget, c_int, [c_int, c_size_t, c_int]),
+            (libc.shmat, c_void_p, [c_int, c_void_p, c_int]),
+            (libc.shmdt, c_int, [c_void_p]),
+            (libc.shmctl, c_int, [c_int, c_int, c_void_p]),
+        ]
+        for func, restype, argtypes in prototypes:
+            func.restype = restype
+            func.argtypes = argtypes
+        
+        return x11, xext, libc, XShmSegmentInfo
+    
+    @classmethod
+    def _acquire_error_handler(cls, x11, display) -> list:
         """
-        if not filename:
-            return filename
+        Record X errors on display instead of letting Xlib exit the process
         
-        # Get basename only (prevent path traversal)
-        from os.path import basename
-        clean_filename = basename(filename)
+        Returns:
+            List the display's error events are appended to
+        """
+        import ctypes
         
-        # Check if path traversal was attempted
-        if clean_filename != filename:
-            raise ValueError(
-                f"Invalid filename (path components not allowed): {filename}"
+        if cls._error_handler_users == 0:
+            handler_type = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.c_void_p)
+            cls._error_handler = handler_type(
+                lambda display, event:
+                    cls._errors_by_display.setdefault(display, []).append(event) or 0
             )
+            cls._previous_handler = x11.XSetErrorHandler(cls._error_handler)
+        cls._error_handler_users += 1
+        return cls._errors_by_display.setdefault(display, [])
+    
+    @classmethod
+    def _release_error_handler(cls, x11, display):
+        """Undo _acquire_error_handler(); the last user restores the old handler"""
+        cls._errors_by_display.pop(display, None)
+        cls._error_handler_users -= 1
+        if cls._error_handler_users == 0:
+            x11.XSetErrorHandler(cls._previous_handler)
+            cls._error_handler = cls._previous_handler = None
+    
+    def open(self):
+        import ctypes
         
-        # Check length (most filesystems have 255 char limit)
-        if len(clean_filename) > 255:
-            raise ValueError(
-                f"Filename too long ({len(clean_filename)} chars). Max: 255"
+        self._ctypes = ctypes
+        self._x11, self._xext, self._libc, self._SegmentInfo = self._load_libraries()
+        
+        display_name = self.options.get("display")
+        self.display = self._x11.XOpenDisplay(
+            display_name.encode() if display_name else None
+        )
+        if not self.display:
+            raise RuntimeError(
+                f"Cannot open X display {display_name or os.environ.get('DISPLAY')}"
             )
         
-        # Windows invalid characters: < > : " / \ | ? *
-        invalid_chars = ['<', '>', ':', '"', '/', '\\', '|', '?', '*']
-        for char in invalid_chars:
-            if char in clean_filename:
-                raise ValueError(
-                    f"Invalid character in filename: '{char}'"
-                )
+        # Default Xlib error handler exits the process; record errors instead
+        self._x_errors = self._acquire_error_handler(self._x11, self.display)
         
-        return clean_filename
+        try:
+            if not self._xext.XShmQueryExtension(self.display):
+                raise RuntimeError("X server does not support MIT-SHM")
+            
+            screen = self._x11.XDefaultScreen(self.display)
+            self.root = self._x11.XRootWindow(self.display, screen)
+            self.visual = self._x11.XDefaultVisual(self.display, screen)
+            self.depth = self._x11.XDefaultDepth(self.display, screen)
+            self.width = self._x11.XDisplayWidth(self.display, screen)
+            self.height = self._x11.XDisplayHeight(self.display, screen)
+            
+            # Segments by (width, height): full screen plus recent regions
+            self._segments = {}
+            self._segment_for(self.width, self.height)
+        except Exception:
+            self._x11.XCloseDisplay(self.display)
+            self._release_error_handler(self._x11, self.display)
+            raise
+        super().open()
     
-    def _generate_filename(self, custom_name: Optional[str] = None) -> Path:
-        """
-        Generate filename for screenshot
+    def _create_segment(self, width: int, height: int):
+        """Create an XShm image of the given size backed by a new segment"""
+        ctypes = self._ctypes
+        shminfo = self._SegmentInfo()
+        ximage = self._xext.XShmCreateImage(
+            self.display, self.visual, self.depth, self.ZPIXMAP,
+            None, ctypes.byref(shminfo), width, height
+        )
+        if not ximage:
+            raise RuntimeError("XShmCreateImage failed")
         
-        Args:
-            custom_name: Custom filename (optional)
+        image = ximage.contents
+        if image.bits_per_pixel != 32:
+            self._x11.XFree(ximage)
+            raise RuntimeError(
+                f"Unsupported X pixel format: {image.bits_per_pixel} bpp"
+            )
+        size = image.bytes_per_line * image.height
         
-        Returns:
-            Full path to screenshot file
+        shminfo.shmid = self._libc.shmget(self.IPC_PRIVATE, size, self.IPC_CREAT | 0o600)
+        if shminfo.shmid < 0:
+            self._x11.XFree(ximage)
+            raise OSError(ctypes.get_errno(), "shmget failed")
+        shminfo.shmaddr = self._libc.shmat(shminfo.shmid, None, 0)
+        if shminfo.shmaddr in (None, ctypes.c_void_p(-1).value):
+            self._libc.shmctl(shminfo.shmid, self.IPC_RMID, None)
+            self._x11.XFree(ximage)
+            raise OSError(ctypes.get_errno(), "shmat failed")
+        image.data = shminfo.shmaddr
+        shminfo.readOnly = 0
+        
+        self._x_errors.clear()
+        self._xext.XShmAttach(self.display, ctypes.byref(shminfo))
+        self._x11.XSync(self.display, 0)
+        # Segment is freed automatically once both sides detach
+        self._libc.shmctl(shminfo.shmid, self.IPC_RMID, None)
+        if self._x_errors:
+            self._libc.shmdt(shminfo.shmaddr)
+            self._x11.XFree(ximage)
+            raise RuntimeError("XShmAttach failed (is the X server remote?)")
+        
+        # View over the segment; frombuffer reads from it directly
+        buffer = (ctypes.c_char * size).from_address(shminfo.shmaddr)
+        return ximage, shminfo, buffer
+    
+    def _segment_for(self, width: int, height: int):
+        """Return a cached segment of the given size, creating it if needed"""
+        key = (width, height)
+        if key not in self._segments:
+            # Keep the full-screen segment and a few region sizes
+            regions = [k for k in self._segments if k != (self.width, self.height)]
+            if len(regions) >= self.MAX_REGION_SEGMENTS:
+                self._destroy_segment(*self._segments.pop(regions[0]))
+            self._segments[key] = self._create_segment(width, height)
+        return self._segments[key]
+    
+    def _destroy_segment(self, ximage, shminfo, buffer):
+        self._xext.XShmDetach(self.display, self._ctypes.byref(shminfo))
+        self._x11.XSync(self.display, 0)
+        self._libc.shmdt(shminfo.shmaddr)
+        self._x11.XFree(ximage)
+    
+    def _grab(self, region=None):
+        from PIL import Image
+        
+        x, y, width, height = region or (0, 0, self.width, self.height)
+        ximage, _, buffer = self._segment_for(width, height)
+        if not self._xext.XShmGetImage(self.display, self.root, ximage,
+                                       x, y, self.ALL_PLANES):
+            raise RuntimeError("XShmGetImage failed")
+        image = ximage.contents
+        # 32bpp little-endian TrueColor is BGRX in memory; Pillow cannot map
+        # that as RGB, so frombuffer does one swizzle straight from the segment
+        rawmode = 'RGBX' if image.red_mask == 0xff else 'BGRX'
+        return Image.frombuffer(
+            'RGB', (image.width, image.height), buffer,
+            'raw', rawmode, image.bytes_per_line, 1
+        )
+    
+    def _monitors(self) -> list:
+        return _xrandr_monitors(self.options.get("display"))
+    
+    def close(self):
+        if self._opened:
+            for segment in self._segments.values():
+                self._destroy_segment(*segment)
+            self._segments = {}
+            self._x11.XCloseDisplay(self.display)
+            self._release_error_handler(self._x11, self.display)
+        super().close()
+
+
+class FramebufferBackend(CaptureBackend):
+    """
+    Linux framebuffer (/dev/fbN) capture for console-only hosts
+    
+    Geometry is read once from sysfs; the device stays open between grabs.
+    
+    Options:
+        device: Framebuffer device (default: /dev/fb0)
+        sysfs: Directory with virtual_size/bits_per_pixel/stride
+               (default: /sys/class/graphics/<device name>)
+    """
+    
+    name = "framebuffer"
+    supports_region = True
+    
+    RAWMODES = {32: "BGRX", 24: "BGR", 16: "BGR;16"}
+    
+    @classmethod
+    def is_available(cls) -> bool:
+        return os.path.exists("/dev/fb0")
+    
+    def open(self):
+        device = self.options.get("device", "/dev/fb0")
+        sysfs = Path(self.options.get(
+            "sysfs", Path("/sys/class/graphics") / Path(device).name
+        ))
+        
+        width, height = (
+            int(v) for v in (sysfs / "virtual_size").read_text().strip().split(",")
+        )
+        bpp = int((sysfs / "bits_per_pixel").read_text().strip())
+        if bpp not in self.RAWMODES:
+            raise RuntimeError(f"Unsupported framebuffer depth: {bpp} bpp")
+        stride_file = sysfs / "stride"
+        stride = (int(stride_file.read_text().strip())
+                  if stride_file.exists() else width * bpp // 8)
+        
+        self.width, self.height, self.bpp, self.stride = width, height, bpp, stride
+        self.fd = os.open(device, os.O_RDONLY)
+        super().open()
+    
+    def _grab(self, region=None):
+        from PIL import Image
+        
+        x, y, width, height = region or (0, 0, self.width, self.height)
+        # Read only the region's rows, then start decoding at column x
+        data = os.pread(self.fd, self.stride * height, self.stride * y)
+        return Image.frombuffer(
+            'RGB', (width, height), memoryview(data)[x * self.bpp // 8:],
+            'raw', self.RAWMODES[self.bpp], self.stride, 1
+        )
+    
+    def close(self):
+        if self._opened:
+            os.close(self.fd)
+        super().close()
+
+
+class SyntheticBackend(CaptureBackend):
+    """
+    Deterministic desktop-like frames (no display needed)
+    
+    Used for tests and benchmarks. The same seed and size always yield the
+    same base image; a small clock area changes on every grab so consecutive
+    frames are realistic near-duplicates.
+    
+    Options:
+        width, height: Frame size (default: 1920x1080)
+        seed: Layout seed (default: 0)
+        monitors: List of [width, height] monitors laid out left to right
+                  (overrides width/height; default: one monitor)
+    """
+    
+    name = "synthetic"
+    
+    def open(self):
+        layout = self.options.get("monitors")
+        if layout:
+            self._layout = [(int(w), int(h)) for w, h in layout]
+        else:
+            self._layout = [(int(self.options.get("width", 1920)),
+                             int(self.options.get("height", 1080)))]
+        self.width = sum(w for w, _ in self._layout)
+        self.height = max(h for _, h in self._layout)
+        self.seed = int(self.options.get("seed", 0))
+        self.frame_number = 0
+        self._base = self._render_desktop()
+        super().open()
+    
+    def _render_desktop(self):
+        import random
+        from PIL import Image, ImageDraw
+        
+        rng = random.Random(self.seed)
+        width, height = self.width, self.height
+        image = Image.new('RGB', (width, height), (32, 64, 96))
+        draw = ImageDraw.Draw(image)
+        
+        # Wallpaper gradient (banded, like a real desktop after dithering)
+        for y in range(0, height, 8):
+            shade = 64 + (y * 96) // max(height, 1)
+            draw.rectangle([0, y, width, y + 8], fill=(24, shade // 2, shade))
+        
+        # Windows with title bars and lines of "text"
+        for _ in range(max(3, (width * height) // 400000)):
+            w = rng.randint(width // 5, width // 2)
+            h = rng.randint(height // 5, height // 2)
+            x = rng.randint(0, width - w)
+            y = rng.randint(0, max(0, height - h - 40))
+            draw.rectangle([x, y, x + w, y + h], fill=(245, 245, 245),
+                           outline=(90, 90, 90))
+            draw.rectangle([x, y, x + w, y + 24], fill=rng.choice(
+                [(45, 90, 160), (60, 60, 60), (120, 40, 40), (40, 110, 60)]
+            ))
+            for line_y in range(y + 36, y + h - 12, 18):
+                line_w = rng.randint(w // 4, w - 24)
+                draw.rectangle([x + 12, line_y, x + 12 + line_w, line_y + 8],
+                               fill=(rng.randint(20, 80),) * 3)
+        
+        # Taskbar
+        draw.rectangle([0, height - 40, width, height], fill=(20, 20, 20))
+        for i in range(8):
+            draw.rectangle([8 + i * 48, height - 34, 44 + i * 48, height - 6],
+                           fill=(70 + i * 20, 70, 160 - i * 10))
+        
+        return image
+    
+    def _grab(self):
+        from PIL import ImageDraw
+        
+        # Synthetic frames are rendered whole; regions are cropped by grab()
+        self.frame_number += 1
+        frame = self._base.copy()
+        
+        # Taskbar clock: the only thing that changes between frames
+        draw = ImageDraw.Draw(frame)
+        x = self.width - 120
+        draw.rectangle([x, self.height - 34, self.width - 8, self.height - 6],
+                       fill=(20, 20, 20))
+        draw.text((x + 8, self.height - 28), f"{self.frame_number:08d}",
+                  fill=(230, 230, 230))
+        return frame
+    
+    def _monitors(self) -> list:
+        monitors = []
+        x = 0
+        for index, (width, height) in enumerate(self._layout, start=1):
+            monitors.append(_monitor(index, x, 0, width, height, index == 1))
+            x += width
+        return monitors
+
+
+def _monitor(index: int, x: int, y: int, width: int, height: int,
+             primary: bool = False) -> dict:
+    """Build a monitor description dict"""
+    return {"index": index, "x": x, "y": y, "width": width, "height": height,
+            "primary": primary}
+
+
+def _xrandr_monitors(display_name: Optional[str] = None) -> list:
+    """
+    Enumerate X11 monitors with XRandR 1.5 (via ctypes)
+    
+    Returns:
+        Monitor dicts ordered left to right, or [] if RandR is unavailable
+    """
+    import ctypes
+    import ctypes.util
+    from ctypes import POINTER, byref, c_char_p, c_int, c_ulong, c_void_p
+    
+    class XRRMonitorInfo(ctypes.Structure):
+        _fields_ = [
+            ("name", c_ulong), ("primary", c_int), ("automatic", c_int),
+            ("noutput", c_int), ("x", c_int), ("y", c_int),
+            ("width", c_int), ("height", c_int),
+            ("mwidth", c_int), ("mheight", c_int), ("outputs", c_void_p),
+        ]
+    
+    x11_path = ctypes.util.find_library("X11")
+    xrandr_path = ctypes.util.find_library("Xrandr")
+    if not x11_path or not xrandr_path:
+        return []
+    x11 = ctypes.CDLL(x11_path)
+    xrandr = ctypes.CDLL(xrandr_path)
+    x11.XOpenDisplay.restype = c_void_p
+    x11.XOpenDisplay.argtypes = [c_char_p]
+    x11.XDefaultRootWindow.restype = c_ulong
+    x11.XDefaultRootWindow.argtypes = [c_void_p]
+    x11.XCloseDisplay.argtypes = [c_void_p]
+    if not hasattr(xrandr, "XRRGetMonitors"):
+        return []
+    xrandr.XRRGetMonitors.restype = POINTER(XRRMonitorInfo)
+    xrandr.XRRGetMonitors.argtypes = [c_void_p, c_ulong, c_int, POINTER(c_int)]
+    xrandr.XRRFreeMonitors.argtypes = [c_void_p]
+    
+    display = x11.XOpenDisplay(display_name.encode() if display_name else None)
+    if not display:
+        return []
+    try:
+        count = c_int(0)
+        infos = xrandr.XRRGetMonitors(display, x11.XDefaultRootWindow(display), 1,
+                                      byref(count))
+        if not infos:
+            return []
+        rects = [(infos[i].x, infos[i].y, infos[i].width, infos[i].height,
+                  bool(infos[i].primary)) for i in range(count.value)]
+        xrandr.XRRFreeMonitors(infos)
+    finally:
+        x11.XCloseDisplay(display)
+    
+    rects.sort(key=lambda r: (r[0], r[1]))
+    return [_monitor(i, *rect) for i, rect in enumerate(rects, start=1)]
+
+
+def _win32_monitors() -> list:
+    """
+    Enumerate Windows monitors with EnumDisplayMonitors (via ctypes)
+    
+    Returns:
+        Monitor dicts in virtual-screen coordinates, ordered left to right
+    """
+    import ctypes
+    from ctypes import wintypes
+    
+    class MONITORINFO(ctypes.Structure):
+        _fields_ = [("cbSize", wintypes.DWORD), ("rcMonitor", wintypes.RECT),
+                    ("rcWork", wintypes.RECT), ("dwFlags", wintypes.DWORD)]
+    
+    user32 = ctypes.windll.user32
+    rects = []
+    
+    def callback(hmonitor, hdc, lprect, lparam):
+        info = MONITORINFO()
+        info.cbSize = ctypes.sizeof(MONITORINFO)
+        if user32.GetMonitorInfoW(hmonitor, ctypes.byref(info)):
+            r = info.rcMonitor
+            rects.append((r.left, r.top, r.right - r.left, r.bottom - r.top,
+                          bool(info.dwFlags & 1)))  # MONITORINFOF_PRIMARY
+        return True
+    
+    proc_type = ctypes.WINFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.c_void_p,
+                                   ctypes.POINTER(wintypes.RECT), ctypes.c_void_p)
+    user32.EnumDisplayMonitors(None, None, proc_type(callback), 0)
+    
+    rects.sort(key=lambda r: (r[0], r[1]))
+    return [_monitor(i, *rect) for i, rect in enumerate(rects, start=1)]
+
+
+CAPTURE_BACKENDS: Dict[str, Type[CaptureBackend]] = {
+    ImageGrabBackend.name: ImageGrabBackend,
+    XlibBackend.name: XlibBackend,
+    XShmBackend.name: XShmBackend,
+    FramebufferBackend.name: FramebufferBackend,
+    SyntheticBackend.name: SyntheticBackend,
+}
+
+# Order tried by backend="auto" (fastest first)
+AUTO_BACKEND_ORDER = ["xshm", "xlib", "imagegrab"]
+
+
+def register_backend(backend_class: Type[CaptureBackend]):
+    """
+    Register a capture backend under its ``name``
+    
+    Can be used as a class decorator.
+    """
+    CAPTURE_BACKENDS[backend_class.name] = backend_class
+    return backend_class
+
+
+def available_backends() -> list:
+    """Return names of registered backends usable on this host"""
+    return [name for name, cls in CAPTURE_BACKENDS.items() if cls.is_available()]
+
+
+def create_backend(name: str, **options) -> CaptureBackend:
+    """
+    Create a capture backend by name
+    
+    With "auto", the available backends in AUTO_BACKEND_ORDER are opened
+    in turn until one succeeds: a backend can look available and still
+    fail to open (MIT-SHM over ssh -X, where XShmAttach is refused). The
+    last candidate is returned unopened.
+    
+    Args:
+        name: Registered backend name, or "auto" to pick the fastest
+              available backend
+        **options: Backend-specific options
+    
+    Returns:
+        CaptureBackend instance (unopened, unless picked by "auto")
+    
+    Raises:
+        ValueError: If backend name is unknown
+    """
+    name_lower = name.lower()
+    if name_lower == "auto":
+        candidates = [n for n in AUTO_BACKEND_ORDER
+                      if n in CAPTURE_BACKENDS and CAPTURE_BACKENDS[n].is_available()]
+        for candidate in candidates[:-1]:
+            backend = CAPTURE_BACKENDS[candidate](**options)
+            try:
+                backend.open()
+            except Exception:
+                continue  # Fall back to the next backend
+            return backend
+        name_lower = candidates[-1] if candidates else DEFAULT_BACKEND
+    if name_lower not in CAPTURE_BACKENDS:
+        raise ValueError(
+            f"Invalid backend '{name}'. Must be one of: "
+            f"{', '.join(['auto'] + list(CAPTURE_BACKENDS))}"
+        )
+    return CAPTURE_BACKENDS[name_lower](**options)
+
+
+# ============== CHANGE DETECTION ==============
+
+DEFAULT_TILE_SIZE = 64
+
+
+def tile_hashes(image, tile_size: int = DEFAULT_TILE_SIZE) -> list:
+    """
+    Hash an image tile by tile
+    
+    Args:
+        image: PIL Image
+        tile_size: Tile edge in pixels (edge tiles may be smaller)
+    
+    Returns:
+        Row-major list of 16-byte digests, one per tile
+    """
+    import hashlib
+    
+    width, height = image.size
+    hashes = []
+    for top in range(0, height, tile_size):
+        # One stripe copy per tile row, then crop tiles out of it
+        stripe = image.crop((0, top, width, min(top + tile_size, height)))
+        for left in range(0, width, tile_size):
+            tile = stripe.crop((left, 0, min(left + tile_size, width), stripe.height))
+            hashes.append(hashlib.blake2b(tile.tobytes(), digest_size=16).digest())
+    return hashes
+
+
+def tile_box(index: int, size: tuple, tile_size: int = DEFAULT_TILE_SIZE) -> tuple:
+    """
+    Return the (left, top, right, bottom) box of tile index
+    
+    Args:
+        index: Row-major tile index, as produced by tile_hashes()
+        size: (width, height) of the image
+        tile_size: Tile edge in pixels
+    """
+    width, height = size
+    columns = -(-width // tile_size)
+    left = (index % columns) * tile_size
+    top = (index // columns) * tile_size
+    return (left, top, min(left + tile_size, width), min(top + tile_size, height))
+
+
+def frame_fingerprint(image, tile_size: int = DEFAULT_TILE_SIZE) -> tuple:
+    """
+    Return a fingerprint that is equal only for pixel-identical frames
+    
+    Args:
+        image: PIL Image
+        tile_size: Tile edge used for hashing
+    
+    Returns:
+        Hashable (mode, size, tile hashes) tuple
+    """
+    return (image.mode, image.size, tuple(tile_hashes(image, tile_size)))
+
+
+# ============== TILE DELTA STORAGE ==============
+
+class TileStoreWriter:
+    """
+    Store a frame sequence as keyframes plus changed tiles only
+    
+    Each frame is split into tile_size x tile_size tiles and hashed. A
+    keyframe stores the whole frame; other frames store only the tiles
+    whose hash differs from the previous frame. On a mostly static screen
+    that is a handful of small zlib blobs per frame instead of a full PNG.
+    
+    Layout of a store directory:
+        store.json    format version and tile size
+        frames.jsonl  one JSON record per frame (time, size, tile locations)
+        tiles.bin     append-only zlib blobs referenced by the records
+    
+    Use TileStoreReader to rebuild any frame.
+    """
+    
+    HEADER = "store.json"
+    MANIFEST = "frames.jsonl"
+    DATA = "tiles.bin"
+    FORMAT_VERSION = 1
+    
+    def __init__(self, path: Path, tile_size: int = DEFAULT_TILE_SIZE,
+                 keyframe_interval: int = 100, compress_level: int = 6):
+        """
+        Args:
+            path: Store directory (created; must not already hold a store)
+            tile_size: Tile edge in pixels
+            keyframe_interval: Frames between keyframes (bounds rebuild cost)
+            compress_level: zlib level for tile and keyframe blobs
         
         Raises:
-            ValueError: If custom_name is invalid
+            ValueError: If parameters are invalid or the store exists
         """
-        if custom_name:
-            # Validate custom name
-            filename = self._validate_filename(custom_name)
-            if not filename.endswith(f'.{self.format}'):
-                filename += f'.{self.format}'
-        else:
-            # Generate timestamp-based name
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"screenshot_{timestamp}.{self.format}"
+        import json
+        
+        if tile_size < 1 or keyframe_interval < 1:
+            raise ValueError("tile_size and keyframe_interval must be positive")
+        self.path = Path(path)
+        if (self.path / self.MANIFEST).exists():
+            raise ValueError(f"Tile store already exists: {self.path}")
+        self.path.mkdir(parents=True, exist_ok=True)
         
-        return self.output_dir / filename
+        self.tile_size = tile_size
+        self.keyframe_interval = keyframe_interval
+        self.compress_level = compress_level
+        
+        with open(self.path / self.HEADER, 'w') as f:
+            json.dump({"version": self.FORMAT_VERSION, "tile_size": tile_size}, f)
+        self._data = open(self.path / self.DATA, 'wb')
+        self._manifest = open(self.path / self.MANIFEST, 'w')
+        self._offset = 0
+        self._previous = None  # (mode, size, tile hashes)
+        self._since_key = 0
+        
+        self.frames_written = 0
+        self.keyframes_written = 0
+        self.tiles_written = 0
+        self.tiles_total = 0
+        self.bytes_written = 0
     
-    def capture(self, filename: Optional[str] = None) -> Path:
+    def _append(self, blob: bytes) -> list:
+        """Append a blob to tiles.bin and return [offset, length]"""
+        self._data.write(blob)
+        location = [self._offset, len(blob)]
+        self._offset += len(blob)
+        self.bytes_written += len(blob)
+        return location
+    
+    def write(self, image, timestamp: Optional[datetime] = None) -> int:
         """
-        Capture full screen screenshot
+        Append one frame
         
         Args:
-            filename: Output filename (optional, auto-generates if not provided)
+            image: PIL Image
+            timestamp: Capture time (default: now)
         
         Returns:
-            Path to saved screenshot
-        
-        Raises:
-            ValueError: If filename is invalid
-            RuntimeError: If screenshot capture fails
+            Number of tiles stored for this frame
         """
-        try:
-            # Generate filepath (validation happens here)
-            filepath = self._generate_filename(filename)
-            
-            # Capture screenshot
-            screenshot = self.ImageGrab.grab()
-            
-            # Save screenshot
-            screenshot.save(filepath, self.format.upper())
-            
-            return filepath
+        import json
+        import zlib
+        
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        hashes = tile_hashes(image, self.tile_size)
+        record = {
+            "frame": self.frames_written,
+            "time": (timestamp or datetime.now()).isoformat(),
+            "size": list(image.size),
+            "mode": image.mode,
+        }
+        
+        is_key = (self._previous is None
+                  or self._previous[:2] != (image.mode, image.size)
+                  or self._since_key >= self.keyframe_interval)
+        if is_key:
+            record["key"] = self._append(
+                zlib.compress(image.tobytes(), self.compress_level)
+            )
+            stored = len(hashes)
+            self._since_key = 0
+            self.keyframes_written += 1
+        else:
+            record["tiles"] = []
+            for index, (new, old) in enumerate(zip(hashes, self._previous[2])):
+                if new != old:
+                    tile = image.crop(tile_box(index, image.size, self.tile_size))
+                    record["tiles"].append([index] + self._append(
+                        zlib.compress(tile.tobytes(), self.compress_level)
+                    ))
+            stored = len(record["tiles"])
+        
+        # Data before manifest, so a record never points past the data file
+        self._data.flush()
+        self._manifest.write(json.dumps(record) + "\n")
+        self._manifest.flush()
+        
+        self._previous = (image.mode, image.size, hashes)
+        self._since_key += 1
+        self.frames_written += 1
+        self.tiles_written += stored
+        self.tiles_total += len(hashes)
+        return stored
+    
+    def close(self):
+        """Close the store files"""
+        self._data.close()
+        self._manifest.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class TileStoreReader:
+    """Rebuild frames from a TileStoreWriter directory"""
+    
+    def __init__(self, path: Path):
+        """
+        Args:
+            path: Store directory
+        
+        Raises:
+            FileNotFoundError: If path is not a tile store
+        """
+        import json
+        
+        self.path = Path(path)
+        with open(self.path / TileStoreWriter.HEADER, 'r') as f:
+            self.tile_size = json.load(f)["tile_size"]
+        self.records = []
+        with open(self.path / TileStoreWriter.MANIFEST, 'r') as f:
+            for line in f:
+                try:
+                    self.records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Torn final record from an interrupted writer
+                    break
+        self._data = open(self.path / TileStoreWriter.DATA, 'rb')
+        self._cached = None  # (index, image) of the last rebuilt frame
+    
+    def __len__(self) -> int:
+        return len(self.records)
+    
+    def timestamp(self, index: int) -> datetime:
+        """Capture time of frame index"""
+        return datetime.fromisoformat(self.records[index]["time"])
+    
+    def _blob(self, offset: int, length: int) -> bytes:
+        import zlib
+        
+        self._data.seek(offset)
+        return zlib.decompress(self._data.read(length))
+    
+    def frame(self, index: int):
+        """
+        Rebuild frame index
+        
+        Starts from the cached frame when it lies between the governing
+        keyframe and index, so sequential reads apply one delta each.
+        
+        Returns:
+            PIL Image
+        
+        Raises:
+            IndexError: If index is out of range
+        """
+        from PIL import Image
+        
+        if not 0 <= index < len(self.records):
+            raise IndexError(f"Frame {index} out of range (store has {len(self)})")
+        key_index = next(i for i in range(index, -1, -1) if "key" in self.records[i])
+        
+        if self._cached is not None and key_index <= self._cached[0] <= index:
+            start, image = self._cached[0], self._cached[1].copy()
+        else:
+            record = self.records[key_index]
+            image = Image.frombytes(record["mode"], tuple(record["size"]),
+                                    self._blob(*record["key"]))
+            start = key_index
+        
+        for record in self.records[start + 1:index + 1]:
+            for tile_index, offset, length in record["tiles"]:
+                box = tile_box(tile_index, image.size, self.tile_size)
+                tile_size = (box[2] - box[0], box[3] - box[1])
+                image.paste(Image.frombytes(record["mode"], tile_size,
+                                            self._blob(offset, length)), box[:2])
+        
+        self._cached = (index, image)
+        return image.copy()
+    
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.frame(index)
+    
+    def close(self):
+        self._data.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# ============== SESSION CONTAINER ==============
+
+SESSION_EXTENSION = ".snapsession"
+_SESSION_MAGIC = b"SNAPSES1"
+_SESSION_INDEX_MAGIC = b"SNAPIDX1"
+# Frame record header: tag, frame number, timestamp, width, height, data length, extension
+_SESSION_RECORD = "<4sIdIIQ4s"
+# Trailing index entry: data offset, data length, timestamp, width, height
+_SESSION_ENTRY = "<QQdII"
+# Footer: index offset, frame count, magic
+_SESSION_FOOTER = "<QI8s"
+
+
+class SessionWriter:
+    """
+    Append encoded frames to a single session file
+    
+    One file per capture session instead of one per frame: each frame is
+    a small record header followed by the encoded PNG/JPEG bytes, appended
+    and flushed in order. close() appends an index of frame offsets and a
+    footer pointing at it, so SessionReader finds any frame without
+    scanning. A session cut short (crash, kill -9) has no index; the
+    reader rebuilds it from the record headers and drops a torn last frame.
+    
+    Implements the frame store protocol, write(image, timestamp), used by
+    capture_burst() and capture_periodic().
+    """
+    
+    def __init__(self, path: Path, encode, extension: str = "png", fsync: bool = False,
+                 on_close=None):
+        """
+        Args:
+            path: Session file (must not exist)
+            encode: Callable(image) -> bytes producing each frame's file data
+            extension: Format of the encoded frames, e.g. "png" or "jpg"
+            fsync: fsync the file on close()
+            on_close: Callable(path) invoked once the session is complete
+        
+        Raises:
+            ValueError: If the session already exists
+        """
+        import threading
+        
+        self.path = Path(path)
+        try:
+            self._file = open(self.path, 'xb')
+        except FileExistsError:
+            raise ValueError(f"Session already exists: {self.path}")
+        self._file.write(_SESSION_MAGIC)
+        self._offset = len(_SESSION_MAGIC)
+        self.encode = encode
+        self.extension = extension.lstrip('.').lower()
+        self.fsync = fsync
+        self.on_close = on_close
+        self._lock = threading.Lock()
+        self._index = []
+        self.frames_written = 0
+        self.bytes_written = self._offset
+    
+    def write(self, image, timestamp: Optional[datetime] = None) -> int:
+        """
+        Encode and append one frame
+        
+        Args:
+            image: PIL Image
+            timestamp: Capture time (default: now)
+        
+        Returns:
+            Frame number
+        """
+        import struct
+        
+        data = self.encode(image)
+        when = (timestamp or datetime.now()).timestamp()
+        with self._lock:
+            number = self.frames_written
+            header = struct.pack(_SESSION_RECORD, b"FRME", number, when, image.width,
+                                 image.height, len(data), self.extension.encode()[:4])
+            self._file.write(header)
+            self._file.write(data)
+            self._file.flush()
+            data_offset = self._offset + len(header)
+            self._index.append((data_offset, len(data), when, image.width, image.height))
+            self._offset = data_offset + len(data)
+            self.bytes_written = self._offset
+            self.frames_written += 1
+        return number
+    
+    def close(self):
+        """Append the frame index and footer, and close the file"""
+        import struct
+        
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(b"SIDX")
+            for entry in self._index:
+                self._file.write(struct.pack(_SESSION_ENTRY, *entry))
+            self._file.write(struct.pack(_SESSION_FOOTER, self._offset,
+                                         len(self._index), _SESSION_INDEX_MAGIC))
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._file.close()
+            self.bytes_written = self.path.stat().st_size
+        if self.on_close is not None:
+            self.on_close(self.path)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class SessionReader:
+    """Random access to the frames of a session file through mmap"""
+    
+    def __init__(self, path: Path):
+        """
+        Args:
+            path: Session file
+        
+        Raises:
+            ValueError: If path is not a session file
+        """
+        import mmap
+        import struct
+        
+        self.path = Path(path)
+        self._file = open(self.path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        if size < len(_SESSION_MAGIC) or self._file.read(len(_SESSION_MAGIC)) != _SESSION_MAGIC:
+            self._file.close()
+            raise ValueError(f"Not a ScreenSnap session: {self.path}")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.complete = False
+        self.extensions = []
+        
+        footer_size = struct.calcsize(_SESSION_FOOTER)
+        if size >= len(_SESSION_MAGIC) + footer_size:
+            index_offset, count, magic = struct.unpack_from(_SESSION_FOOTER, self._map,
+                                                            size - footer_size)
+            if magic == _SESSION_INDEX_MAGIC:
+                entry_size = struct.calcsize(_SESSION_ENTRY)
+                self.entries = [struct.unpack_from(_SESSION_ENTRY, self._map,
+                                                   index_offset + 4 + i * entry_size)
+                                for i in range(count)]
+                self.complete = True
+        if not self.complete:
+            self.entries = self._scan(size)
+        record_size = struct.calcsize(_SESSION_RECORD)
+        for offset, _, _, _, _ in self.entries:
+            extension = struct.unpack_from(_SESSION_RECORD, self._map, offset - record_size)[6]
+            self.extensions.append(extension.rstrip(b"\0").decode())
+    
+    def _scan(self, size: int) -> list:
+        """Rebuild the index from record headers (session without a footer)"""
+        import struct
+        
+        record_size = struct.calcsize(_SESSION_RECORD)
+        entries = []
+        offset = len(_SESSION_MAGIC)
+        while offset + record_size <= size:
+            tag, _, when, width, height, length, _ = struct.unpack_from(
+                _SESSION_RECORD, self._map, offset)
+            if tag != b"FRME" or offset + record_size + length > size:
+                break  # Torn final record from an interrupted writer
+            entries.append((offset + record_size, length, when, width, height))
+            offset += record_size + length
+        return entries
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+    
+    def timestamp(self, index: int) -> datetime:
+        """Capture time of frame index"""
+        return datetime.fromtimestamp(self.entries[index][2])
+    
+    def frame_bytes(self, index: int) -> memoryview:
+        """Encoded file data of frame index, without copying"""
+        if not 0 <= index < len(self.entries):
+            raise IndexError(f"Frame {index} out of range (session has {len(self)})")
+        offset, length = self.entries[index][:2]
+        return memoryview(self._map)[offset:offset + length]
+    
+    def frame(self, index: int):
+        """
+        Decode frame index
+        
+        Returns:
+            PIL Image
+        
+        Raises:
+            IndexError: If index is out of range
+        """
+        import io
+        from PIL import Image
+        
+        if self.extensions[index] == RAW_EXTENSION:
+            return decode_raw(self.frame_bytes(index))[0]
+        image = Image.open(io.BytesIO(self.frame_bytes(index)))
+        image.load()
+        return image
+    
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.frame(index)
+    
+    def close(self):
+        self._map.close()
+        self._file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# ============== RAW FRAMES ==============
+
+# Raw frames skip encoding at capture time: a 64-byte header, then the
+# pixel rows exactly as grabbed. `screensnap encode` compresses them later.
+RAW_EXTENSION = "raw"
+_RAW_MAGIC = b"SNAPRAW1"
+# Header: magic, width, height, mode, stride, timestamp, data offset
+_RAW_HEADER = "<8sII8sIdI"
+# Pixel data starts on a 64-byte boundary
+_RAW_DATA_OFFSET = 64
+
+
+def raw_header(image, stride: int, timestamp: Optional[datetime] = None) -> bytes:
+    """
+    64-byte raw frame header
+    
+    Args:
+        image: PIL Image the pixel data comes from
+        stride: Bytes per row of pixel data
+        timestamp: Capture time (default: now)
+    """
+    import struct
+    
+    header = struct.pack(_RAW_HEADER, _RAW_MAGIC, image.width, image.height,
+                         image.mode.encode(), stride,
+                         (timestamp or datetime.now()).timestamp(), _RAW_DATA_OFFSET)
+    return header.ljust(_RAW_DATA_OFFSET, b"\0")
+
+
+def encode_raw(image, timestamp: Optional[datetime] = None) -> bytes:
+    """
+    Raw frame file contents: the header and the unencoded pixels
+    
+    Args:
+        image: PIL Image
+        timestamp: Capture time stored in the header (default: now)
+    """
+    pixels = image.tobytes()
+    return raw_header(image, len(pixels) // max(image.height, 1), timestamp) + pixels
+
+
+def _unpack_raw_header(data) -> tuple:
+    """(width, height, mode, stride, timestamp, data offset) of a raw frame"""
+    import struct
+    
+    if len(data) < _RAW_DATA_OFFSET:
+        raise ValueError("Not a ScreenSnap raw frame (too short)")
+    magic, *fields = struct.unpack_from(_RAW_HEADER, data)
+    if magic != _RAW_MAGIC:
+        raise ValueError("Not a ScreenSnap raw frame")
+    return tuple(fields)
+
+
+def decode_raw(data) -> tuple:
+    """
+    Parse a raw frame
+    
+    Args:
+        data: Raw frame contents (bytes, memoryview or mmap)
+    
+    Returns:
+        (PIL Image, capture timestamp)
+    
+    Raises:
+        ValueError: If data is not a raw frame or is truncated
+    """
+    from PIL import Image
+    
+    width, height, mode, stride, timestamp, offset = _unpack_raw_header(data)
+    if len(data) < offset + stride * height:
+        raise ValueError(f"Truncated raw frame ({len(data)} bytes)")
+    mode = mode.rstrip(b"\0").decode()
+    image = Image.frombuffer(mode, (width, height),
+                             bytes(data[offset:offset + stride * height]),
+                             "raw", mode, stride, 1)
+    return image, datetime.fromtimestamp(timestamp)
+
+
+def read_raw(path: Path) -> tuple:
+    """
+    Read a raw frame file through mmap
+    
+    Returns:
+        (PIL Image, capture timestamp)
+    
+    Raises:
+        ValueError: If the file is not a raw frame or is truncated
+    """
+    import mmap
+    
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError(f"Not a ScreenSnap raw frame (empty): {path}")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return decode_raw(data)
+
+
+def raw_timestamp(path: Path) -> datetime:
+    """
+    Capture time of a raw frame file, read from its header alone
+    
+    Raises:
+        ValueError: If the file is not a raw frame
+    """
+    with open(path, 'rb') as f:
+        header = f.read(_RAW_DATA_OFFSET)
+    return datetime.fromtimestamp(_unpack_raw_header(header)[4])
+
+
+# ============== ENCODE PIPELINE ==============
+
+class EncodePipeline:
+    """
+    Bounded queue of grabbed frames drained by a pool of encoder threads
+    
+    Pillow releases the GIL while compressing, so several workers encode
+    in parallel. When the queue is full, submit() blocks until a worker
+    frees a slot; memory use is capped at roughly max_pending frames.
+    """
+    
+    def __init__(self, save_func, workers: int = 2, max_pending: int = 8):
+        """
+        Args:
+            save_func: Callable(image, filepath) that encodes and writes
+            workers: Number of encoder threads
+            max_pending: Max queued frames before submit() blocks
+        
+        Raises:
+            ValueError: If workers or max_pending is not positive
+        """
+        import queue
+        import threading
+        
+        if workers < 1:
+            raise ValueError(f"Encoder workers must be at least 1, got {workers}")
+        if max_pending < 1:
+            raise ValueError(f"max_pending must be at least 1, got {max_pending}")
+        
+        self._save = save_func
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._worker, daemon=True,
+                             name=f"screensnap-encoder-{i}")
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+    
+    @property
+    def pending(self) -> int:
+        """Number of frames waiting for an encoder"""
+        return self._queue.qsize()
+    
+    def submit(self, image, filepath: Path, timing: Optional["CaptureTiming"] = None,
+               on_error=None):
+        """
+        Queue an image for encoding
+        
+        Args:
+            image: PIL Image (must not be modified afterwards)
+            filepath: Destination path
+            timing: Timing record passed on to the save function (optional)
+            on_error: Callable(filepath) run on the worker when the save
+                      fails, before the future reports the error (optional)
+        
+        Returns:
+            concurrent.futures.Future resolving to filepath, or raising
+            RuntimeError if the save failed
+        
+        Raises:
+            RuntimeError: If the pipeline has been closed
+        """
+        from concurrent.futures import Future
+        
+        if self._closed:
+            raise RuntimeError("Encode pipeline is closed")
+        future = Future()
+        self._queue.put((image, filepath, timing, future, on_error))
+        return future
+    
+    def flush(self):
+        """Block until every submitted frame has been written"""
+        self._queue.join()
+    
+    def close(self):
+        """Finish pending frames and stop the workers"""
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+    
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                image, filepath, timing, future, on_error = item
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    if timing is None:
+                        self._save(image, filepath)
+                    else:
+                        self._save(image, filepath, timing)
+                    future.set_result(filepath)
+                except Exception as e:
+                    if on_error is not None:
+                        on_error(filepath)
+                    future.set_exception(RuntimeError(f"Failed to save screenshot: {e}"))
+            finally:
+                self._queue.task_done()
+
+
+# ============== PARALLEL PNG ENCODER ==============
+
+PNG_ENCODERS = ["pillow", "parallel"]
+PNG_FILTERS = {"none": 0, "sub": 1, "up": 2}
+
+# PNG color types for the modes written as-is; others are converted to RGB
+_PNG_COLOR_TYPES = {"L": 0, "RGB": 2, "LA": 4, "RGBA": 6}
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    """Serialize one PNG chunk (length, type, data, CRC)"""
+    import struct
+    import zlib
+    
+    return (struct.pack(">I", len(data)) + kind + data +
+            struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff))
+
+
+def _adler32_combine(adler1: int, adler2: int, len2: int) -> int:
+    """Adler-32 of A+B from adler32(A), adler32(B) and len(B) (zlib's algorithm)"""
+    base = 65521
+    rem = len2 % base
+    sum1 = adler1 & 0xffff
+    sum2 = (rem * sum1) % base
+    sum1 += (adler2 & 0xffff) + base - 1
+    sum2 += ((adler1 >> 16) & 0xffff) + ((adler2 >> 16) & 0xffff) + base - rem
+    if sum1 >= base:
+        sum1 -= base
+    if sum1 >= base:
+        sum1 -= base
+    if sum2 >= base << 1:
+        sum2 -= base << 1
+    if sum2 >= base:
+        sum2 -= base
+    return sum1 | (sum2 << 16)
+
+
+class ParallelPngEncoder:
+    """
+    PNG encoder that deflates horizontal strips on a thread pool
+    
+    The whole image is filtered with one PNG filter type, then cut into
+    strips of rows. Each strip is compressed as a raw deflate stream ending
+    on a sync-flush boundary (the last one with the final block), so the
+    strips concatenate into a single valid zlib stream. Every strip becomes
+    its own IDAT chunk. zlib releases the GIL, so strips compress on all
+    cores; the output is a standard PNG any viewer opens.
+    """
+    
+    def __init__(self, workers: Optional[int] = None, level: int = 6,
+                 filter: str = "up", min_strip_rows: int = 16,
+                 strategy: int = 0):
+        """
+        Args:
+            workers: Compression threads (default: CPU count)
+            level: zlib compression level, 0-9
+            filter: PNG row filter applied to every row: none, sub or up
+            min_strip_rows: Smallest strip height worth a separate task
+            strategy: zlib strategy (0 default, 1 filtered, 2 Huffman only,
+                      3 RLE)
+        
+        Raises:
+            ValueError: If level or filter is invalid
+        """
+        import threading
+        
+        if not 0 <= level <= 9:
+            raise ValueError(f"Invalid compression level {level}. Must be 0-9")
+        if filter not in PNG_FILTERS:
+            raise ValueError(
+                f"Invalid PNG filter '{filter}'. Must be one of: {', '.join(PNG_FILTERS)}"
+            )
+        self.workers = workers or os.cpu_count() or 1
+        self.level = level
+        self.filter = filter
+        self.min_strip_rows = max(1, min_strip_rows)
+        self.strategy = strategy
+        # Encoder threads may call encode() concurrently; the pool is
+        # created once, on first use
+        self._executor = None
+        self._executor_lock = threading.Lock()
+    
+    def close(self):
+        """Stop the compression threads"""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def _filtered_rows(self, image):
+        """Return image data with the filter byte prepended to every row"""
+        from PIL import Image, ImageChops
+        
+        width, height = image.size
+        if self.filter == "none":
+            filtered = image
+        else:
+            # Sub/Up subtract the neighbouring pixel bytewise, mod 256
+            neighbour = Image.new(image.mode, image.size)
+            if self.filter == "up":
+                neighbour.paste(image.crop((0, 0, width, height - 1)), (0, 1))
+            else:
+                neighbour.paste(image.crop((0, 0, width - 1, height)), (1, 0))
+            filtered = ImageChops.subtract_modulo(image, neighbour)
+        
+        # Widen each row by one byte holding the filter type
+        stride = width * len(image.getbands())
+        rows = Image.new('L', (stride + 1, height), PNG_FILTERS[self.filter])
+        rows.paste(Image.frombytes('L', (stride, height), filtered.tobytes()), (1, 0))
+        return rows.tobytes(), stride + 1
+    
+    def _deflate(self, data, final: bool) -> tuple:
+        """Compress one strip; returns (raw deflate bytes, adler32, length)"""
+        import zlib
+        
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15,
+                                      zlib.DEF_MEM_LEVEL, self.strategy)
+        body = compressor.compress(data)
+        body += compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+        return body, zlib.adler32(data), len(data)
+    
+    def encode(self, image) -> bytes:
+        """
+        Encode an image as PNG
+        
+        Args:
+            image: PIL Image (L, LA, RGB and RGBA are kept, others become RGB)
+        
+        Returns:
+            Complete PNG file contents
+        """
+        import struct
+        from concurrent.futures import ThreadPoolExecutor
+        
+        if image.mode not in _PNG_COLOR_TYPES:
+            image = image.convert('RGB')
+        width, height = image.size
+        data, row_bytes = self._filtered_rows(image)
+        
+        # Twice as many strips as workers evens out uneven strip costs
+        strip_rows = max(self.min_strip_rows, -(-height // (self.workers * 2)))
+        view = memoryview(data)
+        strips = [view[y * row_bytes:min(y + strip_rows, height) * row_bytes]
+                  for y in range(0, height, strip_rows)]
+        
+        if len(strips) == 1 or self.workers == 1:
+            results = [self._deflate(strip, i == len(strips) - 1)
+                       for i, strip in enumerate(strips)]
+        else:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.workers,
+                                                        thread_name_prefix="screensnap-png")
+                executor = self._executor
+            results = list(executor.map(
+                self._deflate, strips,
+                [i == len(strips) - 1 for i in range(len(strips))]
+            ))
+        
+        adler = 1
+        for _, strip_adler, length in results:
+            adler = _adler32_combine(adler, strip_adler, length)
+        
+        # zlib header (deflate, 32K window) and trailer frame the strip streams
+        idat = [b"\x78\x9c" + results[0][0]] + [body for body, _, _ in results[1:]]
+        idat[-1] += struct.pack(">I", adler)
+        
+        header = struct.pack(">IIBBBBB", width, height, 8,
+                             _PNG_COLOR_TYPES[image.mode], 0, 0, 0)
+        return b"".join(
+            [b"\x89PNG\r\n\x1a\n", _png_chunk(b"IHDR", header)] +
+            [_png_chunk(b"IDAT", body) for body in idat] +
+            [_png_chunk(b"IEND", b"")]
+        )
+
+
+# ============== COMPRESSION PROFILES ==============
+
+# Encoder settings per speed/size trade-off. "png"/"jpeg"/"webp" are Pillow
+# save() options, "parallel" configures ParallelPngEncoder. compress_type/
+# strategy 3 is zlib's Z_RLE, which is nearly as compact as the default on
+# screen content at a fraction of the cost. "balanced" matches Pillow's
+# defaults. WebP is lossless (like PNG); quality and method set the effort.
+COMPRESSION_PROFILES = {
+    "fast": {
+        "png": {"compress_level": 1, "compress_type": 3},
+        "jpeg": {"quality": 75, "subsampling": "4:2:0", "optimize": False},
+        "webp": {"lossless": True, "quality": 0, "method": 0},
+        "parallel": {"level": 1, "filter": "sub", "strategy": 3},
+    },
+    "balanced": {
+        "png": {"compress_level": 6},
+        "jpeg": {"quality": 75},
+        "webp": {"lossless": True, "quality": 75, "method": 4},
+        "parallel": {"level": 6, "filter": "up"},
+    },
+    "small": {
+        "png": {"compress_level": 9, "optimize": True},
+        "jpeg": {"quality": 65, "subsampling": "4:2:0", "optimize": True,
+                 "progressive": True},
+        "webp": {"lossless": True, "quality": 100, "method": 6},
+        "parallel": {"level": 9, "filter": "up"},
+    },
+}
+DEFAULT_PROFILE = "balanced"
+
+
+def validate_profile(profile: str) -> str:
+    """
+    Validate a compression profile name
+    
+    Returns:
+        Lower-cased profile name
+    
+    Raises:
+        ValueError: If the profile is unknown
+    """
+    profile_lower = str(profile).lower()
+    if profile_lower not in COMPRESSION_PROFILES:
+        raise ValueError(
+            f"Invalid profile '{profile}'. Must be one of: "
+            f"{', '.join(COMPRESSION_PROFILES)}"
+        )
+    return profile_lower
+
+
+# ============== BURST CAPTURE ==============
+
+class BurstResult:
+    """Outcome and pacing statistics of ScreenSnap.capture_burst()"""
+    
+    def __init__(self, paths: list, target_fps: float,
+                 grab_times: list, lateness: list):
+        """
+        Args:
+            paths: Saved frame paths, in capture order
+            target_fps: Requested frame rate
+            grab_times: time.monotonic() at the start of each grab
+            lateness: Seconds each grab started after its scheduled slot
+        """
+        self.paths = paths
+        self.target_fps = target_fps
+        self.grab_times = grab_times
+        self.lateness = lateness
+    
+    @property
+    def intervals(self) -> list:
+        """Seconds between consecutive grabs"""
+        return [b - a for a, b in zip(self.grab_times, self.grab_times[1:])]
+    
+    @property
+    def achieved_fps(self) -> float:
+        """Average grab rate over the burst"""
+        if len(self.grab_times) < 2:
+            return 0.0
+        elapsed = self.grab_times[-1] - self.grab_times[0]
+        return (len(self.grab_times) - 1) / elapsed if elapsed > 0 else 0.0
+    
+    @property
+    def jitter_ms(self) -> float:
+        """Standard deviation of inter-grab intervals, in milliseconds"""
+        import statistics
+        
+        intervals = self.intervals
+        if len(intervals) < 2:
+            return 0.0
+        return statistics.pstdev(intervals) * 1000
+    
+    @property
+    def max_lateness_ms(self) -> float:
+        """Worst delay of a grab behind its scheduled slot, in milliseconds"""
+        return max(self.lateness, default=0.0) * 1000
+    
+    def summary(self) -> dict:
+        """Return statistics as a JSON-serializable dict"""
+        return {
+            "frames": len(self.grab_times),
+            "target_fps": self.target_fps,
+            "achieved_fps": round(self.achieved_fps, 3),
+            "jitter_ms": round(self.jitter_ms, 3),
+            "max_lateness_ms": round(self.max_lateness_ms, 3),
+        }
+
+
+# ============== CAPTURE TIMING ==============
+
+CAPTURE_STAGES = ["grab", "convert", "detect", "encode", "write"]
+
+
+class CaptureTiming:
+    """
+    Per-stage timing record of one captured frame
+    
+    Stages: grab (backend or window read), convert (pixel format
+    conversion), detect (skip-unchanged check), encode, write. Stages a
+    capture did not run stay at 0.
+    """
+    
+    def __init__(self, kind: str, window: Optional[str] = None,
+                 region: Optional[tuple] = None, monitor: Optional[int] = None):
+        """
+        Args:
+            kind: "screen", "window", "monitor", "burst" or "recorder"
+            window: Requested window title, if any
+            region: Requested (x, y, width, height), if any
+            monitor: Requested monitor number, if any
+        """
+        import time
+        
+        self.kind = kind
+        self.window = window
+        self.region = region
+        self.monitor = monitor
+        self.timestamp = datetime.now()
+        self.stages = dict.fromkeys(CAPTURE_STAGES, 0.0)
+        self.path = None
+        self.width = 0
+        self.height = 0
+        self.mode = None
+        self.bytes = 0
+        self.skipped = False
+        self.error = None
+        self._start = self._last = time.perf_counter()
+        self.total = 0.0
+    
+    def mark(self, stage: str):
+        """Attribute the time since the previous mark to stage"""
+        import time
+        
+        now = time.perf_counter()
+        self.stages[stage] += now - self._last
+        self._last = now
+    
+    def set_image(self, image):
+        """Record the captured frame's dimensions and mode"""
+        self.width, self.height = image.size
+        self.mode = image.mode
+    
+    def finish(self, path: Optional[Path] = None, error: Optional[Exception] = None):
+        """Close the record with the saved path or the exception raised"""
+        import time
+        
+        self.path = path
+        self.error = type(error).__name__ if error is not None else None
+        self.total = time.perf_counter() - self._start
+    
+    def to_dict(self) -> dict:
+        """Return the record as a JSON-serializable dict (durations in ms)"""
+        return {
+            "kind": self.kind,
+            "timestamp": self.timestamp.isoformat(),
+            "path": str(self.path) if self.path is not None else None,
+            "window": self.window,
+            "region": list(self.region) if self.region else None,
+            "monitor": self.monitor,
+            "width": self.width,
+            "height": self.height,
+            "mode": self.mode,
+            "bytes": self.bytes,
+            "skipped": self.skipped,
+            "error": self.error,
+            "total_ms": round(self.total * 1000, 3),
+            "stages_ms": {stage: round(seconds * 1000, 3)
+                          for stage, seconds in self.stages.items()},
+        }
+    
+    def summary(self) -> str:
+        """One-line human-readable summary"""
+        stages = " ".join(f"{stage}={seconds * 1000:.1f}ms"
+                          for stage, seconds in self.stages.items() if seconds)
+        return (f"{self.kind} {self.width}x{self.height} {self.bytes} bytes "
+                f"in {self.total * 1000:.1f}ms ({stages})")
+
+
+# ============== FILENAME ALLOCATION ==============
+
+# Per-process capture sequence; next() on itertools.count is atomic under the GIL
+_NAME_SEQUENCE = itertools.count(1)
+
+# Give up after this many taken names in a row (something else is wrong)
+MAX_NAME_ATTEMPTS = 10000
+
+
+def unique_stem(kind: str, now: Optional[datetime] = None) -> str:
+    """
+    Build <kind>_<YYYYmmdd_HHMMSS>_<milliseconds>_<sequence>
+    
+    The sequence increases on every call in this process, so stems never
+    repeat within a process and sort in allocation order.
+    
+    Args:
+        kind: Name prefix
+        now: Timestamp to encode (default: current time)
+    """
+    now = now or datetime.now()
+    return (f"{kind}_{now.strftime('%Y%m%d_%H%M%S')}_{now.microsecond // 1000:03d}_"
+            f"{next(_NAME_SEQUENCE):04d}")
+
+
+def allocate_filename(directory: Path, kind: str, extension: str,
+                      hidden: bool = False, now: Optional[datetime] = None) -> Path:
+    """
+    Reserve a new, unused file name in directory
+    
+    The file is created with O_CREAT | O_EXCL, which is atomic even across
+    processes sharing the directory; a name taken by another writer is
+    skipped and the next sequence number tried. The caller owns (and
+    overwrites) the empty file.
+    
+    Args:
+        directory: Output directory
+        kind: Name prefix, e.g. "screenshot"
+        extension: File extension without the dot
+        hidden: Reserve a hidden .<name>.tmp placeholder instead of the
+                name itself (atomic writes rename the temp into place)
+        now: Timestamp to encode (default: current time)
+    
+    Returns:
+        Path of the reserved name
+    
+    Raises:
+        RuntimeError: If no free name was found
+    """
+    for _ in range(MAX_NAME_ATTEMPTS):
+        path = Path(directory) / f"{unique_stem(kind, now)}.{extension}"
+        target = path
+        if hidden:
+            if path.exists():
+                continue
+            target = _reservation_path(path)
+        try:
+            fd = os.open(target, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666)
+        except FileExistsError:
+            continue
+        os.close(fd)
+        return path
+    raise RuntimeError(f"Could not allocate a free {kind} filename in {directory}")
+
+
+# ============== OUTPUT LAYOUT ==============
+
+OUTPUT_LAYOUTS = ["flat", "date", "hash"]
+
+# Hash layout: one of 256 subdirectories per capture second
+_HASH_SHARDS = 256
+
+
+def parse_capture_time(path: Path) -> Optional[datetime]:
+    """
+    Recover the capture time encoded in a generated filename
+    
+    Understands <kind>_<YYYYmmdd_HHMMSS>_<ms>_<seq> names and the older
+    second-resolution <kind>_<YYYYmmdd_HHMMSS> names.
+    
+    Returns:
+        The timestamp, or None for names without one
+    """
+    import re
+    
+    match = re.search(r"_(\d{8}_\d{6})(?:_(\d{3})_\d+)?(?:_|\.|$)", Path(path).name)
+    if not match:
+        return None
+    try:
+        when = datetime.strptime(match.group(1), "%Y%m%d_%H%M%S")
+    except ValueError:
+        return None
+    if match.group(2):
+        when = when.replace(microsecond=int(match.group(2)) * 1000)
+    return when
+
+
+class OutputLayout:
+    """
+    Maps capture times to (sharded) subdirectories of the output directory
+    
+    Layouts:
+        flat  Everything in the output directory (default)
+        date  <YYYY-MM-DD>/<HH>/ per capture hour
+        hash  <xx>/ from a hash of the capture second, spreading captures
+              evenly over 256 directories
+    
+    Both sharded layouts are derived from the capture time, so lookups by
+    time only list the few directories that can hold a match. Created
+    directories are remembered, so the hot path does no mkdir/stat.
+    """
+    
+    def __init__(self, root: Path, layout: str = "flat"):
+        """
+        Args:
+            root: Output directory
+            layout: flat, date or hash
+        
+        Raises:
+            ValueError: If layout is invalid
+        """
+        layout_lower = str(layout).lower()
+        if layout_lower not in OUTPUT_LAYOUTS:
+            raise ValueError(
+                f"Invalid layout '{layout}'. Must be one of: {', '.join(OUTPUT_LAYOUTS)}"
+            )
+        self.root = Path(root)
+        self.layout = layout_lower
+        self._created = set()
+    
+    def _relative(self, when: datetime) -> str:
+        """Subdirectory (relative to root) for a capture time"""
+        import zlib
+        
+        if self.layout == "date":
+            return f"{when:%Y-%m-%d}/{when:%H}"
+        if self.layout == "hash":
+            second = f"{when:%Y%m%d_%H%M%S}".encode()
+            return f"{zlib.crc32(second) % _HASH_SHARDS:02x}"
+        return ""
+    
+    def directory_for(self, when: Optional[datetime] = None) -> Path:
+        """
+        Return (creating on first use) the directory for a capture time
+        
+        Args:
+            when: Capture time (default: now)
+        """
+        directory = self.root / self._relative(when or datetime.now())
+        if directory not in self._created:
+            directory.mkdir(parents=True, exist_ok=True)
+            self._created.add(directory)
+        return directory
+    
+    def forget(self, directory: Path):
+        """Drop a directory from the cache (e.g. after it was removed)"""
+        self._created.discard(Path(directory))
+    
+    def candidate_directories(self, start: datetime, end: datetime) -> list:
+        """Existing directories that may hold captures taken in [start, end]"""
+        from datetime import timedelta
+        
+        if self.layout == "flat":
+            return [self.root]
+        if self.layout == "date":
+            step = timedelta(hours=1)
+            slot = start.replace(minute=0, second=0, microsecond=0)
+        else:
+            if (end - start).total_seconds() >= _HASH_SHARDS:
+                # Long ranges touch every shard anyway
+                return sorted(p for p in self.root.iterdir() if p.is_dir())
+            step = timedelta(seconds=1)
+            slot = start.replace(microsecond=0)
+        
+        directories = []
+        while slot <= end:
+            directory = self.root / self._relative(slot)
+            if directory not in directories and directory.is_dir():
+                directories.append(directory)
+            slot += step
+        return directories
+    
+    def find(self, start: datetime, end: datetime, pattern: str = "*") -> list:
+        """
+        Find captures taken between start and end (inclusive)
+        
+        The time comes from the filename, or the modification time for
+        custom names without one.
+        
+        Args:
+            start: Earliest capture time
+            end: Latest capture time
+            pattern: Glob pattern for file names
+        
+        Returns:
+            (capture time, Path) tuples sorted by time
+        """
+        found = []
+        for directory in self.candidate_directories(start, end):
+            for path in directory.glob(pattern):
+                if path.name.startswith(".") or not path.is_file():
+                    continue
+                when = parse_capture_time(path)
+                if when is None:
+                    when = datetime.fromtimestamp(path.stat().st_mtime)
+                if start <= when <= end:
+                    found.append((when, path))
+        found.sort()
+        return found
+
+
+# ============== FILE WRITING ==============
+
+FSYNC_POLICIES = ["never", "per-file", "batched"]
+
+
+def _reservation_path(path: Path) -> Path:
+    """Hidden placeholder that reserves an auto-generated name in atomic mode"""
+    return path.with_name(f".{path.name}.tmp")
+
+
+def _fsync_directory(directory: Path):
+    """Persist directory entries (renames); a no-op where unsupported"""
+    if not hasattr(os, "O_DIRECTORY"):
+        return  # Windows cannot open directories
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class OutputWriter:
+    """
+    Writes encoded screenshots to disk
+    
+    In atomic mode the data goes to a hidden temp file in the same
+    directory and is renamed over the final name, so readers polling the
+    output directory see either no file or a complete one. The fsync
+    policy trades durability for throughput:
+        
+        never     Leave flushing to the OS (fastest)
+        per-file  fsync each file (and its directory) before returning
+        batched   fsync every batch_size files or batch_seconds, and on
+                  sync()/close(); a crash can lose at most the last batch
+    """
+    
+    def __init__(self, atomic: bool = False, fsync: str = "never",
+                 batch_size: int = 64, batch_seconds: float = 5.0):
+        """
+        Args:
+            atomic: Write to a temp file and rename it into place
+            fsync: Durability policy: never, per-file or batched
+            batch_size: Files per fsync batch (batched policy)
+            batch_seconds: Max age of an unsynced file (batched policy)
+        
+        Raises:
+            ValueError: If fsync or the batch limits are invalid
+        """
+        import threading
+        
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(
+                f"Invalid fsync policy '{fsync}'. Must be one of: {', '.join(FSYNC_POLICIES)}"
+            )
+        if batch_size < 1 or batch_seconds <= 0:
+            raise ValueError("batch_size and batch_seconds must be positive")
+        self.atomic = atomic
+        self.fsync = fsync
+        self.batch_size = batch_size
+        self.batch_seconds = batch_seconds
+        self._lock = threading.Lock()
+        self._unsynced = []
+        self._batch_started = None
+    
+    def write(self, path: Path, data: bytes):
+        """
+        Write data to path according to the atomicity and fsync settings
+        
+        Raises:
+            OSError: If writing, syncing or renaming fails (no temp file is
+                     left behind)
+        """
+        self._write(path, lambda f: f.write(data))
+    
+    def write_mapped(self, path: Path, chunks: list):
+        """
+        Write chunks into a file preallocated at their total size and
+        filled through mmap (one copy, no write() per chunk)
+        
+        Same atomicity and fsync handling as write().
+        
+        Raises:
+            OSError: If preallocating, mapping or renaming fails
+        """
+        import errno
+        import mmap
+        
+        size = sum(len(chunk) for chunk in chunks)
+        
+        def fill(f):
+            if size == 0:
+                return
+            try:
+                # Reserve the blocks up front: a full disk fails here, not
+                # as SIGBUS while copying into the mapping
+                os.posix_fallocate(f.fileno(), 0, size)
+            except AttributeError:
+                f.truncate(size)  # Windows, macOS
+            except OSError as e:
+                if e.errno not in (errno.EOPNOTSUPP, errno.EINVAL, errno.ENOSYS):
+                    raise
+                f.truncate(size)  # Filesystem without fallocate support
+            with mmap.mmap(f.fileno(), size) as mapped:
+                offset = 0
+                for chunk in chunks:
+                    mapped[offset:offset + len(chunk)] = chunk
+                    offset += len(chunk)
+                if self.fsync == "per-file":
+                    mapped.flush()
+        
+        self._write(path, fill)
+    
+    def _write(self, path: Path, fill):
+        """Open path (or a temp file in atomic mode), fill it, sync and rename"""
+        import threading
+        
+        if not self.atomic:
+            # w+b: mmap needs the file open for reading too
+            with open(path, 'w+b') as f:
+                fill(f)
+                if self.fsync == "per-file":
+                    f.flush()
+                    os.fsync(f.fileno())
+        else:
+            # Auto-generated names come with their reserved temp file
+            tmp_path = _reservation_path(path)
+            if not tmp_path.exists():
+                tmp_path = path.with_name(
+                    f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+                )
+            try:
+                with open(tmp_path, 'w+b') as f:
+                    fill(f)
+                    if self.fsync == "per-file":
+                        f.flush()
+                        os.fsync(f.fileno())
+                os.replace(tmp_path, path)
+            except BaseException:
+                tmp_path.unlink(missing_ok=True)
+                raise
+            if self.fsync == "per-file":
+                _fsync_directory(path.parent)
+        self._track(path)
+    
+    def link(self, path: Path, source: Path) -> bool:
+        """
+        Make path a hardlink to source, renamed into place like a write
+        
+        Where hardlinks are unsupported (FAT, some network shares, another
+        filesystem) path gets a copy of source instead.
+        
+        Returns:
+            True if path was hardlinked, False if it was copied
+        
+        Raises:
+            OSError: If linking, copying or renaming fails
+        """
+        import threading
+        
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            try:
+                os.link(source, tmp_path)
+                linked = True
+            except OSError:
+                import shutil
+                shutil.copyfile(source, tmp_path)
+                linked = False
+            os.replace(tmp_path, path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        if self.atomic:
+            _reservation_path(path).unlink(missing_ok=True)
+        if self.fsync == "per-file":
+            _fsync_directory(path.parent)
+        self._track(path)
+        return linked
+    
+    def _track(self, path: Path):
+        """Add a written file to the fsync batch (batched policy)"""
+        import time
+        
+        if self.fsync == "batched":
+            with self._lock:
+                if not self._unsynced:
+                    self._batch_started = time.monotonic()
+                self._unsynced.append(path)
+                due = (len(self._unsynced) >= self.batch_size or
+                       time.monotonic() - self._batch_started >= self.batch_seconds)
+            if due:
+                self.sync()
+    
+    def sync(self):
+        """fsync every file written since the last batch (batched policy)"""
+        with self._lock:
+            paths, self._unsynced = self._unsynced, []
+        for path in paths:
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except FileNotFoundError:
+                continue  # Already evicted or replaced
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        for directory in {path.parent for path in paths}:
+            _fsync_directory(directory)
+    
+    def close(self):
+        """Flush the pending batch"""
+        self.sync()
+
+
+# ============== CONTENT STORE ==============
+
+DEFAULT_STORE_NAME = ".screensnap-objects"
+
+
+def pixel_digest(image) -> str:
+    """SHA-256 of an image's mode, size and pixel data (not its encoding)"""
+    import hashlib
+    
+    digest = hashlib.sha256(f"{image.mode}:{image.width}x{image.height}:".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+class ContentStore:
+    """
+    Content-addressed store for encoded captures
+    
+    Each distinct frame is encoded and stored once, as
+    <root>/<first two hex digits>/<pixel digest>.<ext>. Capture files are
+    hardlinks to their object, so a repeated frame costs a directory entry
+    instead of an encode and a file. An object's link count is its
+    reference count: deleting captures releases it and collect() removes
+    objects nothing links to any more.
+    
+    Objects are keyed by pixels, so a frame that was first stored with one
+    compression profile is reused as-is under another.
+    """
+    
+    def __init__(self, root: Path, writer: Optional["OutputWriter"] = None):
+        """
+        Args:
+            root: Object directory (created if missing); must be on the same
+                  filesystem as the captures for hardlinks to work
+            writer: OutputWriter placing the capture links (default: plain
+                    writer, no fsync)
+        """
+        import threading
+        
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.writer = writer or OutputWriter()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.copies = 0
+    
+    def object_path(self, digest: str, extension: str) -> Path:
+        """Where the object for a pixel digest and file extension lives"""
+        return self.root / digest[:2] / f"{digest}.{extension.lstrip('.')}"
+    
+    def put(self, image, encode, extension: str) -> tuple:
+        """
+        Store an image unless an identical frame is already stored
+        
+        Args:
+            image: PIL Image
+            encode: Function turning the image into file bytes (only called
+                    for new content)
+            extension: Object file extension, e.g. "png"
+        
+        Returns:
+            (object path, True if the object was created by this call)
+        """
+        import threading
+        
+        path = self.object_path(pixel_digest(image), extension)
+        if path.exists():
+            with self._lock:
+                self.hits += 1
+            return path, False
+        
+        data = encode(image)
+        path.parent.mkdir(exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+                if self.writer.fsync != "never":
+                    f.flush()
+                    os.fsync(f.fileno())
+            # Identical bytes if another thread stored it meanwhile
+            os.replace(tmp_path, path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        with self._lock:
+            self.misses += 1
+        return path, True
+    
+    def link(self, path: Path, object_path: Path):
+        """Point a capture filename at a stored object"""
+        if not self.writer.link(path, object_path):
+            with self._lock:
+                self.copies += 1
+    
+    @staticmethod
+    def refcount(object_path: Path) -> int:
+        """Captures referencing an object (its hardlinks besides the store's)"""
+        return os.stat(object_path).st_nlink - 1
+    
+    def _objects(self):
+        for shard in self.root.iterdir():
+            if shard.is_dir():
+                yield from shard.iterdir()
+    
+    def collect(self, dry_run: bool = False) -> dict:
+        """
+        Garbage-collect objects no capture references
+        
+        Also removes temp files left by interrupted writes.
+        
+        Args:
+            dry_run: Only report what would be removed
+        
+        Returns:
+            Dict with objects (kept), removed, bytes_freed
+        """
+        kept = removed = freed = 0
+        for path in self._objects():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue  # Collected concurrently
+            if path.name.startswith(".") or stat.st_nlink <= 1:
+                if not dry_run:
+                    path.unlink(missing_ok=True)
+                removed += 1
+                freed += stat.st_size
+            else:
+                kept += 1
+        return {"objects": kept, "removed": removed, "bytes_freed": freed}
+    
+    def stats(self) -> dict:
+        """Objects, references and bytes stored (each object counted once)"""
+        objects = references = size = 0
+        for path in self._objects():
+            if path.name.startswith("."):
+                continue
+            stat = path.stat()
+            objects += 1
+            references += stat.st_nlink - 1
+            size += stat.st_size
+        return {"objects": objects, "references": references, "bytes": size,
+                "hits": self.hits, "misses": self.misses}
+
+
+# ============== RETENTION ==============
+
+# Which captures go first when a limit is exceeded (max_age always evicts by age)
+EVICTION_PRIORITIES = ["oldest", "largest"]
+
+_SIZE_UNITS = {"": 1, "B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3, "TB": 1024 ** 4,
+               "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+_DURATION_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def parse_size(value) -> int:
+    """
+    Parse a byte count: an int, or a string like "500MB", "500M" or "20 GB"
+    
+    Raises:
+        ValueError: If value is malformed or negative
+    """
+    import re
+    
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?B?)\s*", str(value), re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid size '{value}'. Expected bytes or e.g. 500MB, 20GB")
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).upper()])
+
+
+def parse_duration(value) -> float:
+    """
+    Parse seconds: a number, or a string like "90m", "12h" or "7d"
+    
+    Raises:
+        ValueError: If value is malformed or negative
+    """
+    import re
+    
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([smhdw]?)\s*", str(value), re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid duration '{value}'. Expected seconds or e.g. 90m, 12h, 7d")
+    return float(match.group(1)) * _DURATION_UNITS[match.group(2).lower()]
+
+
+class RetentionEvictor:
+    """
+    Background thread keeping an output directory within retention limits
+    
+    The directory tree is scanned once on start(); after that, usage is
+    tracked in memory from the files ScreenSnap reports through track(),
+    so captures never trigger a directory walk. The scan only picks up
+    files named like generated captures (<kind>_<YYYYmmdd_HHMMSS>...);
+    other images in the tree, such as project assets, are never touched.
+    Custom-named captures are managed once reported through track().
+    Limits:
+        
+        max_bytes  Total size of all captures
+        max_age    Seconds since a capture was written
+        max_count  Captures per directory (per shard with a date or hash
+                   layout)
+    
+    Over max_bytes or max_count, captures are evicted by priority: oldest
+    first, or largest first. Hidden files and directories (temp files,
+    the capture index, the dedup store) are never tracked or evicted.
+    With --dedup, sizes are per capture file, so evicting a capture whose
+    frame is still referenced elsewhere frees less than its size.
+    """
+    
+    def __init__(self, root: Path, max_bytes=None, max_age=None,
+                 max_count: Optional[int] = None, priority: str = "oldest",
+                 extensions: Optional[tuple] = None,
+                 interval: float = 60.0):
+        """
+        Args:
+            root: Output directory to manage
+            max_bytes: Total size limit (int or e.g. "20GB")
+            max_age: Age limit in seconds (number or e.g. "7d")
+            max_count: Max captures per directory
+            priority: Eviction order for size/count limits: oldest or largest
+            extensions: File extensions counted as captures (default: every
+                        output format, plus session files)
+            interval: Seconds between age checks when nothing is captured
+        
+        Raises:
+            ValueError: If a limit or the priority is invalid
+        """
+        import threading
+        from collections import deque
+        
+        priority_lower = str(priority).lower()
+        if priority_lower not in EVICTION_PRIORITIES:
+            raise ValueError(
+                f"Invalid priority '{priority}'. Must be one of: {', '.join(EVICTION_PRIORITIES)}"
+            )
+        if max_count is not None and int(max_count) < 1:
+            raise ValueError("max_count must be positive")
+        self.root = Path(root)
+        self.max_bytes = parse_size(max_bytes) if max_bytes is not None else None
+        self.max_age = parse_duration(max_age) if max_age is not None else None
+        self.max_count = int(max_count) if max_count is not None else None
+        self.priority = priority_lower
+        if extensions is None:
+            extensions = (*OUTPUT_FORMATS, SESSION_EXTENSION)
+        self.extensions = {f".{ext.lstrip('.').lower()}" for ext in extensions}
+        self.interval = interval
+        
+        self.total_bytes = 0
+        self.evicted = 0
+        self.bytes_evicted = 0
+        self._entries = {}      # path -> (mtime, size, directory, path)
+        self._by_age = []       # heap of (mtime, seq, entry)
+        self._by_priority = []  # heap of (priority key, seq, entry)
+        self._dirs = {}         # directory -> [count, heap of (priority key, seq, entry)]
+        self._seq = itertools.count()
+        self._incoming = deque()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+    
+    @classmethod
+    def from_config(cls, root: Path, retention: dict, **kwargs) -> Optional["RetentionEvictor"]:
+        """
+        Build an evictor from a "retention" config section, or None if it
+        sets no limit
+        
+        Keys: max_bytes, max_age, max_count_per_dir, priority
+        """
+        limits = {"max_bytes": retention.get("max_bytes"),
+                  "max_age": retention.get("max_age"),
+                  "max_count": retention.get("max_count_per_dir")}
+        if all(value is None for value in limits.values()):
+            return None
+        return cls(root, priority=retention.get("priority", "oldest"), **limits, **kwargs)
+    
+    @property
+    def file_count(self) -> int:
+        """Captures currently tracked"""
+        return len(self._entries)
+    
+    def start(self) -> "RetentionEvictor":
+        """Scan the directory once and start evicting (returns self)"""
+        import threading
+        
+        for directory, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+            for name in filenames:
+                self._incoming.append((Path(directory) / name, False))
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name="screensnap-retention")
+        self._thread.start()
+        self._wake.set()
+        return self
+    
+    def track(self, path: Path):
+        """Report a newly written capture (cheap; accounting happens on the thread)"""
+        self._incoming.append((Path(path), True))
+        self._wake.set()
+    
+    def enforce(self):
+        """Account for reported captures and evict until within limits"""
+        import heapq
+        import time
+        
+        with self._lock:
+            while self._incoming:
+                self._add(*self._incoming.popleft())
+            
+            if self.max_age is not None:
+                cutoff = time.time() - self.max_age
+                while self._by_age and self._by_age[0][0] < cutoff:
+                    self._evict(heapq.heappop(self._by_age)[2])
+            
+            if self.max_count is not None:
+                for count_heap in self._dirs.values():
+                    while count_heap[0] > self.max_count and count_heap[1]:
+                        self._evict(heapq.heappop(count_heap[1])[2])
+            
+            if self.max_bytes is not None:
+                while self.total_bytes > self.max_bytes and self._by_priority:
+                    self._evict(heapq.heappop(self._by_priority)[2])
+            
+            for directory in [d for d, (count, _) in self._dirs.items() if count == 0]:
+                del self._dirs[directory]
+            self._compact()
+    
+    def _key(self, mtime: float, size: int):
+        return mtime if self.priority == "oldest" else -size
+    
+    def _add(self, path: Path, written: bool):
+        import heapq
+        
+        if path.suffix.lower() not in self.extensions or path.name.startswith("."):
+            return
+        if not written and parse_capture_time(path) is None:
+            return  # Found by the scan but not named like a capture: not ours
+        if path in self._entries:
+            self._forget(self._entries[path])  # Overwritten: count the new file
+        try:
+            stat = path.stat()
+        except OSError:
+            return  # Removed before we got to it
+        entry = (stat.st_mtime, stat.st_size, path.parent, path)
+        self._entries[path] = entry
+        self.total_bytes += stat.st_size
+        key = self._key(stat.st_mtime, stat.st_size)
+        heapq.heappush(self._by_age, (stat.st_mtime, next(self._seq), entry))
+        heapq.heappush(self._by_priority, (key, next(self._seq), entry))
+        count_heap = self._dirs.setdefault(path.parent, [0, []])
+        count_heap[0] += 1
+        heapq.heappush(count_heap[1], (key, next(self._seq), entry))
+    
+    def _forget(self, entry: tuple):
+        # Heap items for the entry go stale and are skipped when popped
+        mtime, size, directory, path = entry
+        del self._entries[path]
+        self.total_bytes -= size
+        self._dirs[directory][0] -= 1
+    
+    def _compact(self):
+        # Drop stale heap items once they outnumber live captures
+        import heapq
+        
+        heaps = [(len(self._entries), self._by_age), (len(self._entries), self._by_priority)]
+        heaps.extend(self._dirs.values())
+        for live, heap in heaps:
+            if len(heap) > 2 * live + 64:
+                heap[:] = [item for item in heap if self._entries.get(item[2][3]) is item[2]]
+                heapq.heapify(heap)
+    
+    def _evict(self, entry: tuple):
+        # Every capture sits in three heaps; skip it if another one evicted it
+        path, size = entry[3], entry[1]
+        if self._entries.get(path) is not entry:
+            return
+        self._forget(entry)
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            return  # Deleted by someone else: just stop counting it
+        except OSError as e:
+            print(f"Warning: could not evict {path}: {e}", file=sys.stderr)
+            return
+        self.evicted += 1
+        self.bytes_evicted += size
+    
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.enforce()
+            except Exception as e:
+                print(f"Warning: retention check failed: {e}", file=sys.stderr)
+    
+    def close(self):
+        """Apply the limits one last time and stop the thread"""
+        if self._thread is not None:
+            self._stop.set()
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+        self.enforce()
+
+
+# ============== MAIN CLASS ==============
+
+class ScreenSnap:
+    """Main screenshot capture class"""
+    
+    def __init__(self, output_dir: Optional[str] = None, 
+                 format: str = "png",
+                 config_path: Optional[Path] = None,
+                 backend: Optional[str] = None,
+                 backend_options: Optional[dict] = None,
+                 encoder_workers: Optional[int] = None,
+                 max_pending: Optional[int] = None,
+                 skip_unchanged: Optional[bool] = None,
+                 encoder: Optional[str] = None,
+                 profile: Optional[str] = None,
+                 log_timings: Optional[bool] = None,
+                 atomic_writes: Optional[bool] = None,
+                 fsync: Optional[str] = None,
+                 layout: Optional[str] = None,
+                 index: Optional[bool] = None,
+                 dedup: Optional[bool] = None,
+                 retention: Optional[dict] = None):
+        """
+        Initialize ScreenSnap
+        
+        Args:
+            output_dir: Directory to save screenshots (default: current dir)
+            format: Image format: png, jpg, webp (lossless) or raw
+                    (unencoded pixels, see `screensnap encode`) (default: png)
+            config_path: Path to config file (default: ~/.screensnaprc)
+            backend: Capture backend name or "auto" (default: from config,
+                     else imagegrab)
+            backend_options: Backend-specific options (default: from config)
+            encoder_workers: Encoder threads for capture_async()/bursts
+                             (default: from config, else 2)
+            max_pending: Frames capture_async() may queue before blocking
+                         (default: from config, else 8)
+            skip_unchanged: Don't write auto-named captures identical to the
+                            last saved frame (default: from config, else False)
+            encoder: PNG encoder, "pillow" or "parallel" (multi-threaded
+                     strip deflate) (default: from config, else pillow)
+            profile: Compression profile: fast, balanced or small
+                     (default: from config, else balanced)
+            log_timings: Print each capture's timing summary to stderr
+                         (default: from config, else False)
+            atomic_writes: Write to a temp file and rename it into place, so
+                           readers never see partial files (default: from
+                           config, else False)
+            fsync: Durability policy: never, per-file or batched (default:
+                   from config, else never)
+            layout: Output directory layout: flat, date (YYYY-MM-DD/HH/) or
+                    hash (256 shards) (default: from config, else flat)
+            index: Record captures in a SQLite index for `screensnap query`
+                   (default: from config, else False; database at
+                   index_path, else <output_dir>/.screensnap-index.db)
+            dedup: Store each distinct frame once and hardlink capture
+                   filenames to it (default: from config, else False;
+                   objects in <output_dir>/.screensnap-objects)
+            retention: Limits enforced by a background evictor: max_bytes,
+                       max_age, max_count_per_dir, priority (default: the
+                       config's "retention" section, else none)
+        
+        Raises:
+            ValueError: If format, backend, encoder, profile, fsync, layout
+                        or retention is invalid
+            ImportError: If Pillow is not installed
+        """
+        self.config_manager = ScreenSnapConfig(config_path)
+        self.output_dir = Path(output_dir or self.config_manager.config['output_dir'])
+        
+        # Validate format
+        format_lower = format.lower()
+        if format_lower not in OUTPUT_FORMATS:
+            raise ValueError(
+                f"Invalid format '{format}'. Must be one of: {', '.join(OUTPUT_FORMATS)}"
+            )
+        self.format = format_lower
+        
+        # Validate PNG encoder
+        config = self.config_manager.config
+        encoder = (encoder or config.get('encoder', 'pillow')).lower()
+        if encoder not in PNG_ENCODERS:
+            raise ValueError(
+                f"Invalid encoder '{encoder}'. Must be one of: {', '.join(PNG_ENCODERS)}"
+            )
+        self.encoder = encoder
+        
+        # Compression settings for the chosen format
+        self.profile = validate_profile(profile or config.get('profile', DEFAULT_PROFILE))
+        settings = COMPRESSION_PROFILES[self.profile]
+        self._save_options = ({} if self.format == RAW_EXTENSION else
+                              settings["jpeg" if self.format in ("jpg", "jpeg") else
+                                       self.format])
+        self._png_encoder = (ParallelPngEncoder(**settings["parallel"])
+                             if encoder == "parallel" else None)
+        
+        import platform
+        self.system = platform.system()
+        
+        # Ensure output directory exists
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Import PIL
+        try:
+            import PIL  # noqa: F401
+        except ImportError:
+            raise ImportError(
+                "Pillow is required for ScreenSnap. Install it with: pip install pillow"
+            )
+        if self.format == "webp":
+            from PIL import features
+            if not features.check("webp"):
+                raise ValueError("Invalid format 'webp': this Pillow build has no WebP support")
+        
+        # Select capture backend (resources are acquired on first grab)
+        self.backend = create_backend(
+            backend or config.get('backend', DEFAULT_BACKEND),
+            **(backend_options if backend_options is not None
+               else config.get('backend_options', {}))
+        )
+        
+        # Background encoding (created on first capture_async)
+        self.encoder_workers = encoder_workers or config.get('encoder_workers', 2)
+        self.max_pending = max_pending or config.get('max_pending', 8)
+        self._pipeline = None
+        
+        # Change detection against the last saved frame
+        self.skip_unchanged = (skip_unchanged if skip_unchanged is not None
+                               else config.get('skip_unchanged', False))
+        self.frames_skipped = 0
+        self._last_fingerprint = None
+        self._last_saved_path = None
+        
+        # Per-stage timing of capture()/capture_window()
+        self.log_timings = (log_timings if log_timings is not None
+                            else config.get('log_timings', False))
+        self.last_timing = None
+        self._timing_hooks = []
+        
+        # Atomic, crash-safe writes
+        self.writer = OutputWriter(
+            atomic=(atomic_writes if atomic_writes is not None
+                    else config.get('atomic_writes', False)),
+            fsync=fsync or config.get('fsync', 'never'),
+            batch_size=config.get('fsync_batch_size', 64),
+            batch_seconds=config.get('fsync_batch_seconds', 5.0)
+        )
+        
+        # Sharded subdirectories for large capture volumes
+        self.layout = OutputLayout(self.output_dir, layout or config.get('layout', 'flat'))
+        
+        # Searchable capture index, written in batches off the capture path
+        self.index = None
+        if index if index is not None else config.get('index', False):
+            index_path = config.get('index_path') or self.output_dir / DEFAULT_INDEX_NAME
+            self.index = CaptureIndex(Path(index_path).expanduser()).attach(self)
+        
+        # Content-addressed storage: identical frames are encoded once
+        self.store = None
+        if dedup if dedup is not None else config.get('dedup', False):
+            self.store = ContentStore(self.output_dir / DEFAULT_STORE_NAME, self.writer)
+        
+        # Retention limits, enforced off the capture path
+        self.evictor = RetentionEvictor.from_config(
+            self.output_dir, retention if retention is not None else config.get('retention', {})
+        )
+        if self.evictor is not None:
+            self.evictor.start()
+    
+    def close(self):
+        """Finish background encodes and release capture backend resources"""
+        if self._pipeline is not None:
+            self._pipeline.close()
+            self._pipeline = None
+        self.writer.close()
+        if self.evictor is not None:
+            self.evictor.close()
+        if self.index is not None:
+            self.index.close()
+        if self._png_encoder is not None:
+            self._png_encoder.close()
+        self.backend.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    @property
+    def pending_encodes(self) -> int:
+        """Frames queued by capture_async() and not yet picked up by an encoder"""
+        return self._pipeline.pending if self._pipeline is not None else 0
+    
+    def _validate_filename(self, filename: str) -> str:
+        """
+        Validate and sanitize filename
+        
+        Args:
+            filename: User-provided filename
+        
+        Returns:
+            Sanitized filename (basename only, no path components)
+        
+        Raises:
+            ValueError: If filename is invalid
+        """
+        if not filename:
+            return filename
+        
+        # Get basename only (prevent path traversal)
+        from os.path import basename
+        clean_filename = basename(filename)
+        
+        # Check if path traversal was attempted
+        if clean_filename != filename:
+            raise ValueError(
+                f"Invalid filename (path components not allowed): {filename}"
+            )
+        
+        # Check length (most filesystems have 255 char limit)
+        if len(clean_filename) > 255:
+            raise ValueError(
+                f"Filename too long ({len(clean_filename)} chars). Max: 255"
+            )
+        
+        # Windows invalid characters: < > : " / \ | ? *
+        invalid_chars = ['<', '>', ':', '"', '/', '\\', '|', '?', '*']
+        for char in invalid_chars:
+            if char in clean_filename:
+                raise ValueError(
+                    f"Invalid character in filename: '{char}'"
+                )
+        
+        return clean_filename
+    
+    def _generate_filename(self, custom_name: Optional[str] = None,
+                           when: Optional[datetime] = None) -> Path:
+        """
+        Generate filename for screenshot
+        
+        Auto-generated names (screenshot_<timestamp>_<ms>_<seq>) are
+        reserved by creating the file exclusively, so concurrent captures
+        from any thread or process never overwrite each other. Custom names
+        are used as given. With a sharded layout the file goes into the
+        subdirectory for the capture time.
+        
+        Args:
+            custom_name: Custom filename (optional)
+            when: Capture time (default: now)
+        
+        Returns:
+            Full path to screenshot file
+        
+        Raises:
+            ValueError: If custom_name is invalid
+            RuntimeError: If no free auto-generated name is found
+        """
+        now = when or datetime.now()
+        if custom_name:
+            # Validate custom name
+            filename = self._validate_filename(custom_name)
+            if not filename.endswith(f'.{self.format}'):
+                filename += f'.{self.format}'
+            return self.layout.directory_for(now) / filename
+        
+        # Reserve a unique timestamp-based name
+        directory = self.layout.directory_for(now)
+        try:
+            return allocate_filename(directory, "screenshot", self.format,
+                                     hidden=self.writer.atomic, now=now)
+        except FileNotFoundError:
+            # The cached shard was removed behind our back; recreate it
+            self.layout.forget(directory)
+            return allocate_filename(self.layout.directory_for(now), "screenshot",
+                                     self.format, hidden=self.writer.atomic, now=now)
+    
+    def find_captures(self, start: datetime, end: Optional[datetime] = None) -> list:
+        """
+        Find captures in the output directory taken between start and end
+        
+        With the date or hash layout only the subdirectories covering the
+        time range are listed.
+        
+        Args:
+            start: Earliest capture time
+            end: Latest capture time (default: now)
+        
+        Returns:
+            Paths sorted by capture time
+        """
+        end = end or datetime.now()
+        return [path for _, path in self.layout.find(start, end, f"*.{self.format}")]
+    
+    def find_capture(self, when: datetime, tolerance: float = 60.0) -> Optional[Path]:
+        """
+        Find the capture closest to a point in time
+        
+        Args:
+            when: Time of interest
+            tolerance: Max distance in seconds
+        
+        Returns:
+            Path of the nearest capture, or None if none is within tolerance
+        """
+        from datetime import timedelta
+        
+        window = timedelta(seconds=tolerance)
+        matches = self.layout.find(when - window, when + window, f"*.{self.format}")
+        if not matches:
+            return None
+        return min(matches, key=lambda match: abs((match[0] - when).total_seconds()))[1]
+    
+    def _encode_image(self, image) -> bytes:
+        """
+        Encode an image in the configured format and compression profile
+        
+        Args:
+            image: PIL Image to encode
+        
+        Returns:
+            Encoded file contents
+        """
+        import io
+        
+        if self._png_encoder is not None and self.format == "png":
+            return self._png_encoder.encode(image)
+        if self.format == RAW_EXTENSION:
+            return encode_raw(image)
+        # Pillow knows JPEG only as "JPEG", not "JPG"
+        pil_format = "JPEG" if self.format in ("jpg", "jpeg") else self.format.upper()
+        buffer = io.BytesIO()
+        image.save(buffer, pil_format, **self._save_options)
+        return buffer.getvalue()
+    
+    def _save_image(self, image, filepath: Path,
+                    timing: Optional[CaptureTiming] = None):
+        """
+        Encode and write an image in the configured format
+        
+        Args:
+            image: PIL Image to save
+            filepath: Destination path
+            timing: Record to charge the encode and write stages to (optional)
+        """
+        if self.store is not None:
+            object_path, created = self.store.put(image, self._encode_image, self.format)
+            if timing is not None:
+                timing.mark("encode")
+                timing.bytes = object_path.stat().st_size if created else 0
+            self.store.link(filepath, object_path)
+        elif self.format == RAW_EXTENSION:
+            # No encoding: copy the pixels into a preallocated mapped file
+            pixels = image.tobytes()
+            header = raw_header(image, len(pixels) // max(image.height, 1),
+                                timing.timestamp if timing is not None else None)
+            if timing is not None:
+                timing.mark("encode")
+                timing.bytes = len(header) + len(pixels)
+            self.writer.write_mapped(filepath, [header, pixels])
+        else:
+            data = self._encode_image(image)
+            if timing is not None:
+                timing.mark("encode")
+                timing.bytes = len(data)
+            self.writer.write(filepath, data)
+        if timing is not None:
+            timing.mark("write")
+        if self.evictor is not None:
+            self.evictor.track(filepath)
+    
+    def add_timing_hook(self, hook):
+        """
+        Call hook(CaptureTiming) after every captured frame
+        
+        That covers capture(), capture_window(), capture_monitor(),
+        capture_async(), capture_all_monitors(), bursts, timer captures and
+        FlightRecorder dumps. Hooks also run for failed captures
+        (timing.error is set) and run on the capturing or encoder thread,
+        so they should be quick. Exceptions raised by
+        a hook are reported and otherwise ignored.
+        
+        Returns:
+            hook (so it can be used as a decorator)
+        """
+        self._timing_hooks.append(hook)
+        return hook
+    
+    def remove_timing_hook(self, hook):
+        """Stop calling a hook added with add_timing_hook()"""
+        self._timing_hooks.remove(hook)
+    
+    def _emit_timing(self, timing: CaptureTiming):
+        """Publish a finished timing record"""
+        self.last_timing = timing
+        if self.log_timings:
+            print(f"Timing: {timing.summary()}", file=sys.stderr)
+        for hook in list(self._timing_hooks):
+            try:
+                hook(timing)
+            except Exception as e:
+                print(f"Warning: timing hook failed: {e}", file=sys.stderr)
+    
+    def _grab_frame(self, timing: CaptureTiming, region: Optional[tuple] = None,
+                    monitor: Optional[dict] = None):
+        """
+        Grab a frame (the whole screen, a region or a monitor) for timing
+        
+        Publishes the record if the grab fails, then re-raises.
+        """
+        try:
+            if monitor is not None:
+                image = self.backend.grab_monitor(monitor)
+            else:
+                image = self.backend.grab(region)
+        except Exception as e:
+            timing.finish(error=e)
+            self._emit_timing(timing)
+            raise
+        timing.mark("grab")
+        timing.set_image(image)
+        return image
+    
+    def _save_frame(self, image, target, timing: CaptureTiming, store=None):
+        """
+        Save a grabbed frame and publish its timing record
+        
+        The shared save step of capture_async(), capture_all_monitors(),
+        bursts, timer captures and recorder dumps, so timing hooks (and the
+        capture index) see every frame whichever thread writes it.
+        
+        Args:
+            image: PIL Image
+            target: Destination path, or the capture time with a store
+            timing: Record for this frame
+            store: Frame store with write(image, timestamp) (optional); its
+                   path, if it has one, is recorded as the frame's path
+        """
+        try:
+            if store is not None:
+                store.write(image, target)
+                timing.mark("write")
+                target = getattr(store, "path", None)
+            else:
+                self._save_image(image, target, timing)
+        except Exception as e:
+            timing.finish(error=e)
+            self._emit_timing(timing)
+            raise
+        timing.finish(target)
+        self._emit_timing(timing)
+    
+    def _sequence_prefix(self, prefix: Optional[str], kind: str) -> str:
+        """
+        Validate a frame-sequence prefix, or generate <kind>_<timestamp>
+        
+        Raises:
+            ValueError: If prefix is invalid
+        """
+        if not prefix:
+            return unique_stem(kind)
+        prefix = self._validate_filename(prefix)
+        if prefix.endswith(f'.{self.format}'):
+            prefix = prefix[:-len(self.format) - 1]
+        return prefix
+    
+    def _unchanged_path(self, image, filename: Optional[str]) -> Optional[Path]:
+        """
+        Change-detection stage run before encoding
+        
+        Args:
+            image: Newly grabbed frame
+            filename: Caller's filename (explicitly named captures are
+                      always written)
+        
+        Returns:
+            Path of the identical last saved frame if this one can be
+            skipped, else None (and the frame becomes the new reference)
+        """
+        if not self.skip_unchanged:
+            return None
+        
+        fingerprint = frame_fingerprint(image)
+        if (not filename and fingerprint == self._last_fingerprint
+                and self._last_saved_path is not None
+                and self._last_saved_path.exists()):
+            self.frames_skipped += 1
+            return self._last_saved_path
+        self._last_fingerprint = fingerprint
+        return None
+    
+    def capture(self, filename: Optional[str] = None,
+                region: Optional[tuple] = None) -> Path:
+        """
+        Capture full screen screenshot
+        
+        With skip_unchanged enabled, an auto-named capture identical to the
+        last saved frame is not written; the earlier file's path is returned.
+        
+        Args:
+            filename: Output filename (optional, auto-generates if not provided)
+            region: (x, y, width, height) to capture (optional); the backend
+                    reads, converts and encodes only those pixels
+        
+        Returns:
+            Path to saved screenshot
+        
+        Raises:
+            ValueError: If filename or region is invalid
+            RuntimeError: If screenshot capture fails
+        """
+        return self._capture_screen(filename, region)
+    
+    def _capture_screen(self, filename: Optional[str], region: Optional[tuple],
+                        window_title: Optional[str] = None) -> Path:
+        """capture(), recording window_title when falling back from a window"""
+        timing = CaptureTiming("screen", window_title, region)
+        filepath = None
+        try:
+            # Validate a custom name before grabbing; auto-names are
+            # reserved only once the frame is known to be written
+            if filename:
+                filepath = self._generate_filename(filename)
+            
+            # Capture screenshot
+            screenshot = self.backend.grab(region)
+            timing.mark("grab")
+            timing.set_image(screenshot)
+            
+            unchanged = self._unchanged_path(screenshot, filename)
+            timing.mark("detect")
+            if unchanged is not None:
+                timing.skipped = True
+                timing.finish(unchanged)
+                self._emit_timing(timing)
+                return unchanged
+            if filepath is None:
+                filepath = self._generate_filename()
+            self._last_saved_path = filepath
+            
+            # Save screenshot
+            self._save_image(screenshot, filepath, timing)
+            
+            timing.finish(filepath)
+            self._emit_timing(timing)
+            return filepath
+        
+        except ValueError as e:
+            if filepath is not None:
+                self._discard_failed(filepath, auto_named=not filename)
+            # Re-raise validation errors as-is
+            timing.finish(error=e)
+            self._emit_timing(timing)
+            raise
+        
+        except Exception as e:
+            if filepath is not None:
+                self._discard_failed(filepath, auto_named=not filename)
+            timing.finish(error=e)
+            self._emit_timing(timing)
+            raise RuntimeError(f"Failed to capture screenshot: {e}")
+    
+    def _discard_failed(self, filepath: Path, auto_named: bool):
+        """
+        Clean up after a capture whose save failed
+        
+        Removes an auto-named file and its reservation, so no reserved or
+        half-written file is left behind, and stops change detection from
+        treating the failed file as the last saved frame.
+        """
+        if auto_named:
+            filepath.unlink(missing_ok=True)
+            _reservation_path(filepath).unlink(missing_ok=True)
+        if self._last_saved_path == filepath:
+            self._last_saved_path = None
+            self._last_fingerprint = None
+    
+    def capture_async(self, filename: Optional[str] = None,
+                      region: Optional[tuple] = None):
+        """
+        Capture full screen now; encode and write in the background
+        
+        Only the grab runs on the caller's thread. The frame then waits in
+        a bounded queue for an encoder worker, so a failing process can
+        capture its screen without stalling on PNG compression.
+        
+        Args:
+            filename: Output filename (optional, auto-generates if not provided)
+            region: (x, y, width, height) to capture (optional)
+        
+        Returns:
+            concurrent.futures.Future resolving to the saved Path
+        
+        Raises:
+            ValueError: If filename or region is invalid
+            RuntimeError: If screenshot capture fails
+        """
+        filepath = self._generate_filename(filename) if filename else None
+        timing = CaptureTiming("screen", region=region)
+        
+        try:
+            screenshot = self._grab_frame(timing, region)
+        except ValueError:
+            raise
+        except Exception as e:
+            raise RuntimeError(f"Failed to capture screenshot: {e}")
+        
+        unchanged = self._unchanged_path(screenshot, filename)
+        timing.mark("detect")
+        if unchanged is not None:
+            from concurrent.futures import Future
+            timing.skipped = True
+            timing.finish(unchanged)
+            self._emit_timing(timing)
+            future = Future()
+            future.set_result(unchanged)
+            return future
+        if filepath is None:
+            filepath = self._generate_filename()
+        self._last_saved_path = filepath
+        
+        if self._pipeline is None:
+            self._pipeline = EncodePipeline(
+                self._save_frame, self.encoder_workers, self.max_pending
+            )
+        return self._pipeline.submit(
+            screenshot, filepath, timing,
+            on_error=lambda path: self._discard_failed(path, auto_named=not filename)
+        )
+    
+    def flush(self):
+        """Wait until every capture_async() frame has been written (and synced)"""
+        if self._pipeline is not None:
+            self._pipeline.flush()
+        self.writer.sync()
+    
+    def list_monitors(self) -> list:
+        """
+        Enumerate monitors
+        
+        Returns:
+            List of dicts with index (from 1), x, y, width, height, primary
+        
+        Raises:
+            RuntimeError: If the backend cannot be opened
+        """
+        try:
+            return self.backend.monitors()
+        except Exception as e:
+            raise RuntimeError(f"Failed to enumerate monitors: {e}")
+    
+    def _monitor(self, index: int) -> dict:
+        monitors = self.list_monitors()
+        if not 1 <= index <= len(monitors):
+            raise ValueError(
+                f"Invalid monitor {index}. Must be between 1 and {len(monitors)}"
+            )
+        return monitors[index - 1]
+    
+    def capture_monitor(self, index: int, filename: Optional[str] = None) -> Path:
+        """
+        Capture a single monitor
+        
+        Args:
+            index: Monitor number from list_monitors() (starting at 1)
+            filename: Output filename (optional, auto-generates if not provided)
+        
+        Returns:
+            Path to saved screenshot
+        
+        Raises:
+            ValueError: If index or filename is invalid
+            RuntimeError: If screenshot capture fails
+        """
+        monitor = self._monitor(index)
+        # As in capture(): custom names are checked up front, auto-names
+        # reserved only once there is a frame to write
+        filepath = self._generate_filename(filename) if filename else None
+        timing = CaptureTiming("monitor", monitor=index)
+        try:
+            screenshot = self.backend.grab_monitor(monitor)
+            timing.mark("grab")
+            timing.set_image(screenshot)
+            if filepath is None:
+                filepath = self._generate_filename()
+            self._save_image(screenshot, filepath, timing)
+        except Exception as e:
+            if filepath is not None:
+                self._discard_failed(filepath, auto_named=not filename)
+            timing.finish(error=e)
+            self._emit_timing(timing)
+            raise RuntimeError(f"Failed to capture monitor {index}: {e}")
+        timing.finish(filepath)
+        self._emit_timing(timing)
+        return filepath
+    
+    def capture_all_monitors(self, prefix: Optional[str] = None) -> list:
+        """
+        Capture every monitor into its own file
+        
+        Monitors are grabbed one after another (each grab reads only that
+        monitor) and encoded in parallel, one encoder thread per monitor,
+        instead of encoding one huge stitched image on a single thread.
+        
+        Args:
+            prefix: Filename prefix (default: screenshot_<timestamp>); files
+                    are saved as <prefix>_mon1.<format>, <prefix>_mon2...
+        
+        Returns:
+            Paths in monitor order
+        
+        Raises:
+            ValueError: If prefix is invalid
+            RuntimeError: If screenshot capture fails
+        """
+        prefix = self._sequence_prefix(prefix, "screenshot")
+        monitors = self.list_monitors()
+        paths = [self._generate_filename(f"{prefix}_mon{m['index']}") for m in monitors]
+        
+        pipeline = EncodePipeline(self._save_frame, len(monitors), len(monitors))
+        try:
+            futures = []
+            for monitor, path in zip(monitors, paths):
+                timing = CaptureTiming("monitor", monitor=monitor["index"])
+                image = self._grab_frame(timing, monitor=monitor)
+                futures.append(pipeline.submit(image, path, timing))
+        except Exception as e:
+            raise RuntimeError(f"Failed to capture monitors: {e}")
+        finally:
+            pipeline.close()
+        for future in futures:
+            future.result()
+        return paths
+    
+    def capture_window(self, window_title: str, filename: Optional[str] = None,
+                       region: Optional[tuple] = None) -> Path:
+        """
+        Capture specific window (Windows only for now)
+        
+        Args:
+            window_title: Title of window to capture (substring match)
+            filename: Output filename (optional)
+            region: (x, y, width, height) within the window (optional);
+                    applies to the screen when falling back to full screen
+        
+        Returns:
+            Path to saved screenshot
+        
+        Raises:
+            NotImplementedError: If not on Windows
+            ValueError: If window not found, or filename/region is invalid
+        """
+        if region is not None:
+            region = validate_region(region)
+        
+        if self.system != "Windows":
+            # Fallback to full screen on non-Windows
+            print(f"Warning: Window capture not supported on {self.system}, capturing full screen")
+            return self._capture_screen(filename, region, window_title)
+        
+        # Windows-specific window capture
+        timing = CaptureTiming("window", window_title, region)
+        filepath = None
+        try:
+            import win32gui
+            import win32ui
+            import win32con
+            from ctypes import windll
+            from PIL import Image
+            
+            # Find window by title
+            hwnd = self._find_window(window_title)
+            if not hwnd:
+                print(f"Warning: Window '{window_title}' not found, capturing full screen")
+                return self._capture_screen(filename, region, window_title)
+            
+            # Get window dimensions
+            left, top, right, bottom = win32gui.GetWindowRect(hwnd)
+            width = right - left
+            height = bottom - top
+            
+            # Capture window
+            hwndDC = win32gui.GetWindowDC(hwnd)
+            mfcDC = win32ui.CreateDCFromHandle(hwndDC)
+            saveDC = mfcDC.CreateCompatibleDC()
+            saveBitMap = win32ui.CreateBitmap()
+            saveBitMap.CreateCompatibleBitmap(mfcDC, width, height)
+            saveDC.SelectObject(saveBitMap)
+            
+            # Copy window contents
+            result = windll.user32.PrintWindow(hwnd, saveDC.GetSafeHdc(), 3)
+            
+            # Read back the bitmap
+            bmpinfo = saveBitMap.GetInfo()
+            bmpstr = saveBitMap.GetBitmapBits(True)
+            
+            # Cleanup
+            win32gui.DeleteObject(saveBitMap.GetHandle())
+            saveDC.DeleteDC()
+            mfcDC.DeleteDC()
+            win32gui.ReleaseDC(hwnd, hwndDC)
+            timing.mark("grab")
+            
+            # Convert to PIL Image (only the region's pixels, if given)
+            x, y, width, height = region or (0, 0, bmpinfo['bmWidth'], bmpinfo['bmHeight'])
+            if x + width > bmpinfo['bmWidth'] or y + height > bmpinfo['bmHeight']:
+                raise ValueError(
+                    f"Region {region} is outside the "
+                    f"{bmpinfo['bmWidth']}x{bmpinfo['bmHeight']} window"
+                )
+            stride = bmpinfo['bmWidthBytes']
+            screenshot = Image.frombuffer(
+                'RGB',
+                (width, height),
+                memoryview(bmpstr)[y * stride + x * 4:], 'raw', 'BGRX', stride, 1
+            )
+            timing.mark("convert")
+            timing.set_image(screenshot)
+            
+            # Save screenshot
+            filepath = self._generate_filename(filename)
+            self._save_image(screenshot, filepath, timing)
+            
+            timing.finish(filepath)
+            self._emit_timing(timing)
+            return filepath
+        
+        except ImportError:
+            if filepath is not None:
+                self._discard_failed(filepath, auto_named=not filename)
+            # pywin32 not installed, fallback to full screen
+            print("Warning: pywin32 not installed, capturing full screen instead")
+            return self._capture_screen(filename, region, window_title)
+        
+        except ValueError as e:
+            if filepath is not None:
+                self._discard_failed(filepath, auto_named=not filename)
+            # Re-raise validation errors as-is
+            timing.finish(error=e)
+            self._emit_timing(timing)
+            raise
+        
+        except Exception as e:
+            if filepath is not None:
+                self._discard_failed(filepath, auto_named=not filename)
+            timing.finish(error=e)
+            self._emit_timing(timing)
+            raise RuntimeError(f"Failed to capture window: {e}")
+    
+    def open_tile_store(self, name: Optional[str] = None, **options) -> "TileStoreWriter":
+        """
+        Create a tile delta store in the output directory
+        
+        Args:
+            name: Store name (default: session_<timestamp>); the store is the
+                  directory <output_dir>/<name>.tiles
+            **options: TileStoreWriter options (tile_size, keyframe_interval, ...)
+        
+        Returns:
+            TileStoreWriter
+        
+        Raises:
+            ValueError: If name is invalid or the store already exists
+        """
+        name = self._sequence_prefix(name, "session")
+        return TileStoreWriter(self.output_dir / f"{name}.tiles", **options)
+    
+    def open_session(self, name: Optional[str] = None) -> "SessionWriter":
+        """
+        Create a session file in the output directory
+        
+        Frames are encoded in this instance's format and profile and
+        appended to <output_dir>/<name>.snapsession. Retention limits apply
+        to the session once it is closed.
+        
+        Args:
+            name: Session name (default: session_<timestamp>)
+        
+        Returns:
+            SessionWriter
+        
+        Raises:
+            ValueError: If name is invalid or the session already exists
+        """
+        name = self._sequence_prefix(name, "session")
+        return SessionWriter(self.output_dir / f"{name}{SESSION_EXTENSION}",
+                             self._encode_image, self.format,
+                             fsync=self.writer.fsync != "never",
+                             on_close=self.evictor.track if self.evictor else None)
+    
+    def export_session(self, path: Path, prefix: Optional[str] = None) -> list:
+        """
+        Write a session's frames out as individual files
+        
+        Frames already in this instance's format are copied byte for byte;
+        others are decoded and re-encoded.
+        
+        Args:
+            path: Session file
+            prefix: Filename prefix (default: the session name); frames are
+                    saved as <prefix>_0000.<format>, <prefix>_0001...
+        
+        Returns:
+            List of written paths, in frame order
+        
+        Raises:
+            ValueError: If path is not a session or prefix is invalid
+        """
+        same = {"jpg", "jpeg"} if self.format in ("jpg", "jpeg") else {self.format}
+        path = Path(path)
+        prefix = self._sequence_prefix(prefix or path.stem, "session")
+        paths = []
+        with SessionReader(path) as session:
+            for index in range(len(session)):
+                when = session.timestamp(index)
+                filepath = self._generate_filename(f"{prefix}_{index:04d}", when)
+                if session.extensions[index] in same:
+                    data = session.frame_bytes(index)
+                    try:
+                        self.writer.write(filepath, data)
+                    finally:
+                        data.release()
+                    if self.evictor is not None:
+                        self.evictor.track(filepath)
+                else:
+                    self._save_image(session.frame(index), filepath)
+                # Frame names carry no time; find_captures() falls back to mtime
+                os.utime(filepath, (when.timestamp(), when.timestamp()))
+                paths.append(filepath)
+        return paths
+    
+    def capture_burst(self, count: int, fps: float = 10.0,
+                      prefix: Optional[str] = None,
+                      max_pending: int = 32,
+                      store=None) -> BurstResult:
+        """
+        Capture a paced sequence of full-screen frames
+        
+        Grabs are scheduled on a monotonic clock at fixed slots
+        (start + i / fps), so a slow frame does not shift later ones.
+        Encoding runs on an EncodePipeline, keeping PNG/JPEG compression
+        off the grab schedule.
+        
+        Args:
+            count: Number of frames to capture
+            fps: Target frames per second
+            prefix: Filename prefix (default: burst_<timestamp>); frames
+                    are saved as <prefix>_0000.<format>, <prefix>_0001...
+            max_pending: Max grabbed-but-unsaved frames held in memory;
+                         grabbing waits when the encoder falls this far behind
+            store: Frame store with write(image, timestamp) (e.g. from
+                   open_tile_store()); frames go there instead of to files
+        
+        Returns:
+            BurstResult with saved paths (empty when using a store) and
+            pacing statistics
+        
+        Raises:
+            ValueError: If count, fps or prefix is invalid
+            RuntimeError: If grabbing or saving fails
+        """
+        import time
+        
+        if count < 1:
+            raise ValueError(f"Burst count must be at least 1, got {count}")
+        if fps <= 0:
+            raise ValueError(f"Burst fps must be positive, got {fps}")
+        
+        if store is None:
+            prefix = self._sequence_prefix(prefix, "burst")
+            # Validate all names before grabbing anything
+            paths = [self._generate_filename(f"{prefix}_{i:04d}") for i in range(count)]
+            pipeline = EncodePipeline(self._save_frame, self.encoder_workers, max_pending)
+        else:
+            import functools
+            
+            # Stores are sequential: one worker keeps frames in order, and
+            # the "path" slot carries each frame's capture time
+            paths = []
+            pipeline = EncodePipeline(functools.partial(self._save_frame, store=store),
+                                      1, max_pending)
+        futures = []
+        
+        interval = 1.0 / fps
+        grab_times = []
+        lateness = []
+        try:
+            start = time.monotonic()
+            for i in range(count):
+                slot = start + i * interval
+                delay = slot - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                now = time.monotonic()
+                grab_times.append(now)
+                lateness.append(max(0.0, now - slot))
+                timing = CaptureTiming("burst")
+                image = self._grab_frame(timing)
+                target = paths[i] if store is None else timing.timestamp
+                futures.append(pipeline.submit(image, target, timing))
+        except Exception as e:
+            raise RuntimeError(f"Failed to capture burst frame {len(grab_times) - 1}: {e}")
+        finally:
+            pipeline.close()
+        
+        for future in futures:
+            future.result()
+        
+        return BurstResult(paths, fps, grab_times, lateness)
+    
+    def capture_periodic(self, interval: float, count: Optional[int] = None,
+                         stop_event=None, on_capture=None, store=None) -> list:
+        """
+        Capture full screen every interval seconds (timer / kiosk mode)
+        
+        Ticks are scheduled on a monotonic clock; ticks missed because a
+        capture overran are skipped rather than fired back to back. Combine
+        with skip_unchanged to avoid writing identical frames.
+        
+        Args:
+            interval: Seconds between captures
+            count: Number of ticks (default: run until stop_event is set)
+            stop_event: threading.Event that ends the loop when set
+            on_capture: Callable(path) invoked for each newly written file
+            store: Frame store with write(image, timestamp); frames go there
+                   instead of to files
+        
+        Returns:
+            Paths written, in order (skipped frames are not repeated; empty
+            when using a store)
+        
+        Raises:
+            ValueError: If interval is not positive
+            RuntimeError: If a capture fails
+        """
+        import threading
+        import time
+        
+        if interval <= 0:
+            raise ValueError(f"Interval must be positive, got {interval}")
+        stop_event = stop_event or threading.Event()
+        
+        paths = []
+        start = time.monotonic()
+        tick = 0
+        while not stop_event.is_set() and (count is None or tick < count):
+            if store is not None:
+                timing = CaptureTiming("screen")
+                try:
+                    image = self._grab_frame(timing)
+                    self._save_frame(image, timing.timestamp, timing, store)
+                except Exception as e:
+                    raise RuntimeError(f"Failed to capture screenshot: {e}")
+            else:
+                filepath = self.capture()
+            if store is None and (not paths or paths[-1] != filepath):
+                paths.append(filepath)
+                if on_capture is not None:
+                    on_capture(filepath)
+            tick = max(tick + 1, int((time.monotonic() - start) / interval))
+            if count is not None and tick >= count:
+                break
+            stop_event.wait(max(0.0, start + tick * interval - time.monotonic()))
+        return paths
+    
+    def _find_window(self, title_substring: str) -> Optional[int]:
+        """
+        Find window handle by title substring (Windows only)
+        
+        Args:
+            title_substring: Substring to search for in window titles
+        
+        Returns:
+            Window handle (HWND) or None if not found
+        """
+        try:
+            import win32gui
+            
+            def callback(hwnd, results):
+                if win32gui.IsWindowVisible(hwnd):
+                    window_title = win32gui.GetWindowText(hwnd)
+                    if title_substring.lower() in window_title.lower():
+                        results.append(hwnd)
+            
+            results = []
+            win32gui.EnumWindows(callback, results)
+            
+            return results[0] if results else None
+        
+        except ImportError:
+            return None
+
+
+# ============== OFFLINE ENCODING ==============
+
+# Per-process state of encode workers (set by _init_encode_worker)
+_encode_snap = None
+_encode_sessions = {}
+
+
+def _init_encode_worker(output_dir: str, format: str, profile: Optional[str],
+                        atomic: bool):
+    """Process-pool initializer: one encoder per worker process"""
+    global _encode_snap
+    # Captures are not taken here: no index, dedup store or evictor
+    _encode_snap = ScreenSnap(output_dir=output_dir, format=format, profile=profile,
+                              atomic_writes=atomic, index=False, dedup=False,
+                              retention={})
+
+
+def _encode_task(source: str, index: Optional[int], output_path: str) -> tuple:
+    """
+    Encode one frame in a worker: a raw file, or frame index of a session
+    
+    Returns:
+        (input pixel bytes, output bytes)
+    """
+    if index is None:
+        image, when = read_raw(Path(source))
+    else:
+        # Keep each session mapped for the worker's lifetime
+        if source not in _encode_sessions:
+            _encode_sessions[source] = SessionReader(source)
+        image = _encode_sessions[source].frame(index)
+        when = _encode_sessions[source].timestamp(index)
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    _encode_snap._save_image(image, output_path)
+    # Custom and session frame names carry no time; find_captures() uses mtime
+    os.utime(output_path, (when.timestamp(), when.timestamp()))
+    return image.width * image.height * len(image.getbands()), output_path.stat().st_size
+
+
+def find_raw_frames(sources: list) -> list:
+    """
+    Raw frame and session files in sources (files, or directories searched
+    recursively; hidden files and directories are skipped)
+    
+    Returns:
+        List of (path, source root) in name order
+    """
+    suffixes = (f".{RAW_EXTENSION}", SESSION_EXTENSION)
+    frames = []
+    for source in map(Path, sources):
+        if source.is_file():
+            frames.append((source, source.parent))
+            continue
+        for directory, dirnames, filenames in os.walk(source):
+            dirnames[:] = sorted(name for name in dirnames if not name.startswith("."))
+            for name in sorted(filenames):
+                if name.endswith(suffixes) and not name.startswith("."):
+                    frames.append((Path(directory) / name, source))
+    return frames
+
+
+def encode_raw_frames(sources: list, format: str = "png", profile: Optional[str] = None,
+                      output_dir: Optional[Path] = None, workers: Optional[int] = None,
+                      keep: bool = False, atomic: bool = True, progress=None) -> dict:
+    """
+    Encode raw captures and sessions to image files in worker processes
+    
+    Outputs are named like normal captures: frame.raw becomes
+    frame.<format> beside it, or <output_dir>/frame.<format> placed by
+    _generate_filename (so a configured date or hash layout applies). Session
+    frames become <session name>_0000.<format>, ... next to the session or
+    in output_dir, as with `screensnap session export`. Outputs are placed
+    and timestamped by capture time (from the raw header or session index),
+    so find_captures() and find_capture() locate them.
+    
+    Frames whose output already exists are skipped and outputs are written
+    atomically, so an interrupted run resumes where it stopped. Raw files
+    are removed once encoded unless keep is set; sessions are kept.
+    
+    Args:
+        sources: Raw files, session files and/or directories
+        format: Output format: png, jpg, jpeg or webp
+        profile: Compression profile (default: from config, else balanced)
+        output_dir: Output directory (default: beside each source)
+        workers: Worker processes (default: one per CPU)
+        keep: Keep raw files after encoding
+        atomic: Write outputs via temp file + rename
+        progress: Callable(done, total, stats) invoked after each frame
+    
+    Returns:
+        Dict with frames, encoded, skipped, bytes_in (raw pixels),
+        bytes_out, seconds, frames_per_second, mb_per_second (raw pixels)
+    
+    Raises:
+        ValueError: If format or profile is invalid
+        RuntimeError: If frames fail to encode (the others still finish)
+    """
+    import time
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    
+    if str(format).lower() == RAW_EXTENSION:
+        raise ValueError("Encode to png, jpg, jpeg or webp, not raw")
+    start = time.perf_counter()
+    
+    # Same validation and naming as captures, for outputs beside each source
+    # (keyed by directory) or under output_dir
+    namers = {}
+    
+    def namer(directory: Path) -> ScreenSnap:
+        key = Path(output_dir) if output_dir else directory
+        if key not in namers:
+            namers[key] = ScreenSnap(output_dir=key, format=format, profile=profile,
+                                     layout=None if output_dir else "flat",
+                                     index=False, dedup=False, retention={})
+        return namers[key]
+    
+    jobs, skipped = [], 0
+    for path, _ in find_raw_frames(sources):
+        snap = namer(path.parent)
+        if path.name.endswith(SESSION_EXTENSION):
+            prefix = snap._sequence_prefix(path.name[:-len(SESSION_EXTENSION)], "session")
+            with SessionReader(path) as session:
+                targets = [(index, snap._generate_filename(f"{prefix}_{index:04d}",
+                                                           session.timestamp(index)))
+                           for index in range(len(session))]
+        else:
+            try:
+                when = raw_timestamp(path)
+            except (OSError, ValueError):
+                when = None  # Reported when the worker fails to read it
+            targets = [(None, snap._generate_filename(path.stem, when))]
+        for index, output_path in targets:
+            if output_path.exists():
+                skipped += 1  # Done by an earlier run
+                if index is None and not keep:
+                    path.unlink(missing_ok=True)
+                continue
+            jobs.append((path, index, output_path))
+    if not namers:
+        namer(Path("."))  # Validate format and profile even with nothing to do
+    first = next(iter(namers.values()))
+    for snap in namers.values():
+        snap.close()
+    
+    stats = {"frames": len(jobs) + skipped, "encoded": 0, "skipped": skipped,
+             "bytes_in": 0, "bytes_out": 0}
+    failures = []
+    if jobs:
+        if not workers:
+            # CPUs this process may run on (containers often get fewer than cpu_count)
+            workers = (len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity")
+                       else os.cpu_count() or 1)
+        with ProcessPoolExecutor(min(workers, len(jobs)), initializer=_init_encode_worker,
+                                 initargs=(str(first.output_dir), first.format,
+                                           first.profile, atomic)) as pool:
+            futures = {pool.submit(_encode_task, str(path), index, str(output_path)):
+                       (path, index) for path, index, output_path in jobs}
+            for future in as_completed(futures):
+                path, index = futures[future]
+                try:
+                    bytes_in, bytes_out = future.result()
+                except Exception as e:
+                    failures.append(f"{path}{'' if index is None else f'#{index}'}: {e}")
+                else:
+                    stats["encoded"] += 1
+                    stats["bytes_in"] += bytes_in
+                    stats["bytes_out"] += bytes_out
+                    if index is None and not keep:
+                        path.unlink()
+                if progress is not None:
+                    progress(stats["encoded"] + len(failures), len(jobs),
+                             _throughput(stats, time.perf_counter() - start))
+    
+    stats = _throughput(stats, time.perf_counter() - start)
+    if failures:
+        raise RuntimeError(f"Failed to encode {len(failures)} frame(s): "
+                           + "; ".join(failures[:3]))
+    return stats
+
+
+def _throughput(stats: dict, seconds: float) -> dict:
+    """stats plus elapsed time and encode rates"""
+    return dict(stats, seconds=round(seconds, 3),
+                frames_per_second=round(stats["encoded"] / seconds, 2) if seconds else 0.0,
+                mb_per_second=round(stats["bytes_in"] / seconds / 1e6, 2) if seconds else 0.0)
+
+
+# ============== FLIGHT RECORDER ==============
+
+class FlightRecorder:
+    """
+    Keep the last few seconds of frames in memory, ready to dump on error
+    
+    Frames are grabbed in the background and stored compressed: every
+    keyframe_interval-th frame is a zlib-compressed keyframe, the rest are
+    zlib-compressed modulo differences against their keyframe (mostly
+    zeros on a static screen, so a few KB each). Frames are evicted a
+    keyframe group at a time once they fall out of the time window or the
+    byte budget is exceeded. Besides the budget, one uncompressed reference
+    frame is held for delta encoding.
+    
+    Use a dedicated ScreenSnap instance; backends are not thread-safe.
+    """
+    
+    DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+    
+    def __init__(self, snap: ScreenSnap, seconds: float = 10.0, fps: float = 2.0,
+                 max_bytes: Optional[int] = None, keyframe_interval: int = 30):
+        """
+        Args:
+            snap: ScreenSnap instance to grab with and dump through
+            seconds: Length of history to keep
+            fps: Background grab rate
+            max_bytes: Budget for compressed frames (default: from config
+                       "recorder_max_bytes", else 64 MB)
+            keyframe_interval: Frames per keyframe group
+        
+        Raises:
+            ValueError: If any limit is not positive
+        """
+        import collections
+        import threading
+        
+        if max_bytes is None:
+            max_bytes = snap.config_manager.config.get(
+                'recorder_max_bytes', self.DEFAULT_MAX_BYTES
+            )
+        for label, value in (("seconds", seconds), ("fps", fps),
+                             ("max_bytes", max_bytes),
+                             ("keyframe_interval", keyframe_interval)):
+            if value <= 0:
+                raise ValueError(f"Recorder {label} must be positive, got {value}")
+        
+        self.snap = snap
+        self.seconds = seconds
+        self.fps = fps
+        self.max_bytes = max_bytes
+        self.keyframe_interval = keyframe_interval
+        
+        # (wall time, monotonic time, group, is_keyframe, mode, size, data)
+        self._frames = collections.deque()
+        self._lock = threading.Lock()
+        self._key_image = None
+        self._group = 0
+        self._since_key = 0
+        
+        self.memory_bytes = 0
+        self.frames_recorded = 0
+        self.frames_evicted = 0
+        self.grab_errors = 0
+        
+        self._stop_event = threading.Event()
+        self._thread = None
+    
+    @property
+    def frame_count(self) -> int:
+        """Number of frames currently buffered"""
+        return len(self._frames)
+    
+    def record_frame(self, image=None):
+        """
+        Add one frame to the buffer
+        
+        Args:
+            image: PIL Image to record (default: grab one now)
+        """
+        import time
+        import zlib
+        from PIL import ImageChops
+        
+        if image is None:
+            image = self.snap.backend.grab()
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        
+        is_key = (self._key_image is None
+                  or image.size != self._key_image.size
+                  or self._since_key >= self.keyframe_interval)
+        if is_key:
+            self._key_image = image
+            self._group += 1
+            self._since_key = 0
+            data = zlib.compress(image.tobytes(), 1)
+        else:
+            delta = ImageChops.subtract_modulo(image, self._key_image)
+            data = zlib.compress(delta.tobytes(), 1)
+        self._since_key += 1
+        
+        with self._lock:
+            self._frames.append((datetime.now(), time.monotonic(), self._group,
+                                 is_key, image.mode, image.size, data))
+            self.memory_bytes += len(data)
+            self.frames_recorded += 1
+            self._evict()
+    
+    def _evict(self):
+        """Drop whole keyframe groups that are too old or over budget"""
+        import time
+        
+        cutoff = time.monotonic() - self.seconds
+        while self._frames and self._frames[0][2] != self._group:
+            oldest_group = self._frames[0][2]
+            group_end = next(
+                (i for i, frame in enumerate(self._frames) if frame[2] != oldest_group),
+                len(self._frames)
+            )
+            newest_in_group = self._frames[group_end - 1][1]
+            if self.memory_bytes <= self.max_bytes and newest_in_group >= cutoff:
+                break
+            for _ in range(group_end):
+                frame = self._frames.popleft()
+                self.memory_bytes -= len(frame[6])
+                self.frames_evicted += 1
+        
+        # The current group alone is over budget: start a new one so the
+        # old one becomes evictable on the next frame
+        if self.memory_bytes > self.max_bytes:
+            self._since_key = self.keyframe_interval
+    
+    def start(self):
+        """Start grabbing in a background thread"""
+        import threading
+        
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name="screensnap-recorder")
+        self._thread.start()
+    
+    def _run(self):
+        import time
+        
+        interval = 1.0 / self.fps
+        start = time.monotonic()
+        tick = 0
+        while not self._stop_event.is_set():
+            try:
+                self.record_frame()
+            except Exception:
+                # Keep recording; a transient grab failure must not end history
+                self.grab_errors += 1
+            tick += 1
+            # Skip slots we already missed instead of bursting to catch up
+            tick = max(tick, int((time.monotonic() - start) / interval))
+            self._stop_event.wait(max(0.0, start + tick * interval - time.monotonic()))
+    
+    def stop(self):
+        """Stop the background thread (the buffer is kept)"""
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+    
+    def __enter__(self):
+        self.start()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+    
+    def frames(self) -> list:
+        """
+        Decode the buffered frames inside the time window
+        
+        Returns:
+            List of (capture datetime, PIL Image), oldest first
+        """
+        import zlib
+        from PIL import Image, ImageChops
+        
+        with self._lock:
+            snapshot = list(self._frames)
+        if not snapshot:
+            return []
+        
+        cutoff = snapshot[-1][1] - self.seconds
+        decoded = []
+        keyframes = {}
+        for wall_time, mono, group, is_key, mode, size, data in snapshot:
+            image = Image.frombytes(mode, size, zlib.decompress(data))
+            if is_key:
+                keyframes[group] = image
+            else:
+                image = ImageChops.add_modulo(keyframes[group], image)
+            if mono >= cutoff:
+                decoded.append((wall_time, image))
+        return decoded
+    
+    def dump(self, prefix: Optional[str] = None) -> list:
+        """
+        Write the buffered frames to the ScreenSnap output directory
+        
+        Args:
+            prefix: Filename prefix (default: flight_<timestamp>); frames
+                    are saved as <prefix>_0000.<format>, ...
+        
+        Returns:
+            Paths of the written frames, oldest first
+        
+        Raises:
+            ValueError: If prefix is invalid
+            RuntimeError: If a frame cannot be saved
+        """
+        prefix = self.snap._sequence_prefix(prefix, "flight")
+        frames = self.frames()
+        paths = [self.snap._generate_filename(f"{prefix}_{i:04d}")
+                 for i in range(len(frames))]
+        
+        pipeline = EncodePipeline(self.snap._save_frame, self.snap.encoder_workers,
+                                  self.snap.max_pending)
+        try:
+            futures = []
+            for (when, image), path in zip(frames, paths):
+                timing = CaptureTiming("recorder")
+                timing.timestamp = when
+                timing.set_image(image)
+                futures.append(pipeline.submit(image, path, timing))
+        finally:
+            pipeline.close()
+        for future in futures:
+            future.result()
+        return paths
+
+
+# ============== METRICS ==============
+
+# Histogram bucket upper bounds, in seconds
+METRICS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class CaptureMetrics:
+    """
+    Prometheus-style metrics for capture(), capture_window(), capture_monitor()
+    
+    Attach to one or more ScreenSnap instances; every finished capture's
+    CaptureTiming is folded into counters and histograms (a dict update
+    and a bisect per stage). Expose the result with render(),
+    write_textfile() (node_exporter textfile collector) or serve_http().
+    
+    Exported metrics:
+        screensnap_captures_total{kind}
+        screensnap_capture_failures_total{exception}
+        screensnap_capture_duration_seconds (histogram)
+        screensnap_stage_duration_seconds{stage} (histogram)
+        screensnap_bytes_written_total
+        screensnap_frames_skipped_total
+        screensnap_encode_queue_depth
+    """
+    
+    def __init__(self, buckets: tuple = METRICS_BUCKETS):
+        """
+        Args:
+            buckets: Histogram bucket upper bounds in seconds (ascending)
+        """
+        import threading
+        
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._snaps = []
+        self._captures = {}
+        self._failures = {}
+        self._bytes = 0
+        self._histograms = {}
+        self._server = None
+        self._writer = None
+        self._stop_writer = threading.Event()
+    
+    def attach(self, snap: "ScreenSnap") -> "CaptureMetrics":
+        """Collect metrics from a ScreenSnap instance (returns self)"""
+        snap.add_timing_hook(self.observe)
+        self._snaps.append(snap)
+        return self
+    
+    def detach(self, snap: "ScreenSnap"):
+        """Stop collecting from a ScreenSnap instance"""
+        snap.remove_timing_hook(self.observe)
+        self._snaps.remove(snap)
+    
+    def _observe_seconds(self, key: tuple, seconds: float):
+        """Add one sample to a histogram (caller holds the lock)"""
+        import bisect
+        
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+        index = bisect.bisect_left(self.buckets, seconds)
+        if index < len(self.buckets):
+            histogram[0][index] += 1
+        histogram[1] += seconds
+        histogram[2] += 1
+    
+    def observe(self, timing: CaptureTiming):
+        """Record one finished capture (used as a ScreenSnap timing hook)"""
+        with self._lock:
+            self._captures[timing.kind] = self._captures.get(timing.kind, 0) + 1
+            if timing.error is not None:
+                self._failures[timing.error] = self._failures.get(timing.error, 0) + 1
+                return
+            self._bytes += timing.bytes
+            self._observe_seconds(("capture",), timing.total)
+            for stage, seconds in timing.stages.items():
+                if seconds:
+                    self._observe_seconds(("stage", stage), seconds)
+    
+    def _histogram_lines(self, name: str, labels: str, histogram: list) -> list:
+        """Exposition lines of one histogram (cumulative buckets)"""
+        counts, total, count = histogram
+        prefix = f"{labels}," if labels else ""
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{{{prefix}le="{bound:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {count}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {total:.6f}")
+        lines.append(f"{name}_count{suffix} {count}")
+        return lines
+    
+    def render(self) -> str:
+        """Return all metrics in the Prometheus text exposition format"""
+        with self._lock:
+            captures = dict(self._captures)
+            failures = dict(self._failures)
+            bytes_written = self._bytes
+            histograms = {key: [list(h[0]), h[1], h[2]]
+                          for key, h in self._histograms.items()}
+        skipped = sum(snap.frames_skipped for snap in self._snaps)
+        queued = sum(snap.pending_encodes for snap in self._snaps)
+        
+        lines = [
+            "# HELP screensnap_captures_total Captures attempted, by kind.",
+            "# TYPE screensnap_captures_total counter",
+        ]
+        lines += [f'screensnap_captures_total{{kind="{kind}"}} {count}'
+                  for kind, count in sorted(captures.items())]
+        lines += [
+            "# HELP screensnap_capture_failures_total Failed captures, by exception type.",
+            "# TYPE screensnap_capture_failures_total counter",
+        ]
+        lines += [f'screensnap_capture_failures_total{{exception="{name}"}} {count}'
+                  for name, count in sorted(failures.items())]
+        lines += [
+            "# HELP screensnap_capture_duration_seconds End-to-end capture latency.",
+            "# TYPE screensnap_capture_duration_seconds histogram",
+        ]
+        lines += self._histogram_lines("screensnap_capture_duration_seconds", "",
+                                       histograms.get(("capture",),
+                                                      [[0] * len(self.buckets), 0.0, 0]))
+        lines += [
+            "# HELP screensnap_stage_duration_seconds Capture latency per stage.",
+            "# TYPE screensnap_stage_duration_seconds histogram",
+        ]
+        for stage in CAPTURE_STAGES:
+            if ("stage", stage) in histograms:
+                lines += self._histogram_lines("screensnap_stage_duration_seconds",
+                                               f'stage="{stage}"',
+                                               histograms[("stage", stage)])
+        lines += [
+            "# HELP screensnap_bytes_written_total Encoded bytes written to disk.",
+            "# TYPE screensnap_bytes_written_total counter",
+            f"screensnap_bytes_written_total {bytes_written}",
+            "# HELP screensnap_frames_skipped_total Frames not written because unchanged.",
+            "# TYPE screensnap_frames_skipped_total counter",
+            f"screensnap_frames_skipped_total {skipped}",
+            "# HELP screensnap_encode_queue_depth Frames waiting for a background encoder.",
+            "# TYPE screensnap_encode_queue_depth gauge",
+            f"screensnap_encode_queue_depth {queued}",
+        ]
+        return "\n".join(lines) + "\n"
+    
+    def write_textfile(self, path: Path):
+        """
+        Write metrics for node_exporter's textfile collector
+        
+        The file is replaced atomically so the collector never reads a
+        partial file.
+        """
+        path = Path(path)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(self.render())
+        os.replace(tmp_path, path)
+    
+    def start_textfile(self, path: Path, interval: float = 15.0):
+        """Rewrite the metrics textfile every interval seconds until close()"""
+        import threading
+        
+        if interval <= 0:
+            raise ValueError(f"Interval must be positive, got {interval}")
+        
+        def run():
+            while not self._stop_writer.wait(interval):
+                self.write_textfile(path)
+            self.write_textfile(path)
+        
+        self.write_textfile(path)
+        self._writer = threading.Thread(target=run, daemon=True,
+                                        name="screensnap-metrics-textfile")
+        self._writer.start()
+    
+    def serve_http(self, port: int = 9464, host: str = "127.0.0.1"):
+        """
+        Serve /metrics over HTTP from a background thread
+        
+        Args:
+            port: TCP port (0 picks a free one; see server_address)
+            host: Interface to bind (default: localhost only)
+        
+        Returns:
+            (host, port) actually bound
+        """
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        
+        metrics = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                pass  # Scrapes would flood stderr
+        
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True,
+                         name="screensnap-metrics-http").start()
+        return self._server.server_address[:2]
+    
+    def close(self):
+        """Stop the HTTP server and textfile writer (writing a final file)"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._writer is not None:
+            self._stop_writer.set()
+            self._writer.join()
+            self._writer = None
+
+
+# ============== CAPTURE INDEX ==============
+
+DEFAULT_INDEX_NAME = ".screensnap-index.db"
+
+_INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS captures (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    kind TEXT NOT NULL,
+    window TEXT,
+    monitor INTEGER,
+    width INTEGER,
+    height INTEGER,
+    bytes INTEGER,
+    sha256 TEXT,
+    total_ms REAL,
+    grab_ms REAL,
+    convert_ms REAL,
+    detect_ms REAL,
+    encode_ms REAL,
+    write_ms REAL
+);
+CREATE INDEX IF NOT EXISTS captures_timestamp ON captures (timestamp);
+CREATE INDEX IF NOT EXISTS captures_sha256 ON captures (sha256);
+CREATE INDEX IF NOT EXISTS captures_window ON captures (window);
+"""
+
+
+class CaptureIndex:
+    """
+    SQLite index of captures: path, time, window, monitor, size, hash, timings
+    
+    Attach to a ScreenSnap instance; each saved frame's CaptureTiming is
+    queued by its timing hook (an append), and a background thread hashes
+    the files and inserts them in batches, one transaction per batch.
+    Frames written to a session or tile store are indexed under the
+    store's path, without a hash. Skipped (unchanged) and failed captures
+    are not indexed.
+    """
+    
+    def __init__(self, path: Path, batch_size: int = 64, flush_seconds: float = 1.0):
+        """
+        Args:
+            path: SQLite database file (created if missing)
+            batch_size: Max records per insert transaction
+            flush_seconds: Max delay before a queued record is written
+        
+        Raises:
+            ValueError: If batch_size or flush_seconds is not positive
+        """
+        import queue
+        import sqlite3
+        import threading
+        
+        if batch_size < 1 or flush_seconds <= 0:
+            raise ValueError("batch_size and flush_seconds must be positive")
+        self.path = Path(path)
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        
+        with sqlite3.connect(self.path) as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(_INDEX_SCHEMA)
+        db.close()
+        
+        self._queue = queue.Queue()
+        self._snaps = []
+        self._thread = threading.Thread(target=self._writer, daemon=True,
+                                        name="screensnap-index")
+        self._thread.start()
+    
+    def attach(self, snap: "ScreenSnap") -> "CaptureIndex":
+        """Index every capture saved by a ScreenSnap instance (returns self)"""
+        snap.add_timing_hook(self.observe)
+        self._snaps.append(snap)
+        return self
+    
+    def observe(self, timing: CaptureTiming):
+        """Queue a finished capture (used as a ScreenSnap timing hook)"""
+        if timing.error is None and not timing.skipped and timing.path is not None:
+            self._queue.put(timing)
+    
+    def flush(self):
+        """Block until every queued capture is in the database"""
+        self._queue.join()
+    
+    def close(self):
+        """Write queued captures and stop the writer thread"""
+        for snap in self._snaps:
+            snap.remove_timing_hook(self.observe)
+        self._snaps = []
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+    
+    @staticmethod
+    def _row(timing: CaptureTiming) -> tuple:
+        """Database row for a timing record (hashes the written file)"""
+        import hashlib
+        
+        path = Path(timing.path)
+        size = timing.bytes  # 0 when a deduplicated capture reused stored data
+        sha256 = None
+        # A frame inside a store is not hashed: the container isn't its data
+        if not (path.is_dir() or path.name.endswith(SESSION_EXTENSION)):
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                size, sha256 = len(data), hashlib.sha256(data).hexdigest()
+            except OSError:
+                pass  # Already replaced or evicted
+        stages = [round(timing.stages[stage] * 1000, 3) for stage in CAPTURE_STAGES]
+        return (str(path.absolute()), timing.timestamp.timestamp(), timing.kind,
+                timing.window, timing.monitor, timing.width, timing.height,
+                size, sha256, round(timing.total * 1000, 3), *stages)
+    
+    def _writer(self):
+        import queue
+        import sqlite3
+        
+        db = sqlite3.connect(self.path)
+        db.execute("PRAGMA synchronous=NORMAL")
+        try:
+            running = True
+            while running:
+                batch = [self._queue.get()]
+                # Gather what arrives within flush_seconds into one transaction
+                while len(batch) < self.batch_size and batch[-1] is not None:
+                    try:
+                        batch.append(self._queue.get(timeout=self.flush_seconds))
+                    except queue.Empty:
+                        break
+                running = batch[-1] is not None
+                rows = []
+                for timing in batch:
+                    if timing is not None:
+                        try:
+                            rows.append(self._row(timing))
+                        except Exception as e:
+                            print(f"Warning: could not index {timing.path}: {e}",
+                                  file=sys.stderr)
+                try:
+                    with db:
+                        db.executemany(
+                            "INSERT INTO captures (path, timestamp, kind, window, monitor, "
+                            "width, height, bytes, sha256, total_ms, grab_ms, convert_ms, "
+                            "detect_ms, encode_ms, write_ms) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+                        )
+                except sqlite3.Error as e:
+                    print(f"Warning: capture index write failed: {e}", file=sys.stderr)
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+        finally:
+            db.close()
+    
+    def query(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+              window: Optional[str] = None, sha256: Optional[str] = None,
+              around: Optional[datetime] = None, limit: Optional[int] = None) -> list:
+        """
+        Search the index
+        
+        Args:
+            start: Earliest capture time
+            end: Latest capture time
+            window: Window title substring (case-insensitive)
+            sha256: Content hash or hash prefix
+            around: Order results by distance from this time (default:
+                    order by time)
+            limit: Max results
+        
+        Returns:
+            List of dicts with the indexed columns (timestamp as datetime)
+        """
+        import sqlite3
+        
+        clauses, params = [], []
+        if start is not None:
+            clauses.append("timestamp >= ?")
+            params.append(start.timestamp())
+        if end is not None:
+            clauses.append("timestamp <= ?")
+            params.append(end.timestamp())
+        if window:
+            clauses.append("window LIKE ? ESCAPE '\\'")
+            escaped = window.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            params.append(f"%{escaped}%")
+        if sha256:
+            clauses.append("sha256 LIKE ?")
+            params.append(f"{sha256.lower()}%")
+        
+        sql = "SELECT * FROM captures"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        if around is not None:
+            sql += " ORDER BY ABS(timestamp - ?)"
+            params.append(around.timestamp())
+        else:
+            sql += " ORDER BY timestamp"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        
+        db = sqlite3.connect(self.path)
+        try:
+            db.row_factory = sqlite3.Row
+            rows = [dict(row) for row in db.execute(sql, params)]
+        finally:
+            db.close()
+        for row in rows:
+            row["timestamp"] = datetime.fromtimestamp(row["timestamp"])
+        return rows
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# ============== DAEMON ==============
+
+class ScreenSnapDaemon:
+    """
+    Serve captures from one warm ScreenSnap instance over a Unix socket
+    
+    Config, output directory, PIL and the capture backend are set up once,
+    so each request costs one round trip plus the capture itself.
+    
+    Protocol: one JSON object per line in each direction.
+        {"cmd": "capture", "filename": null, "window": null, "region": null}
+        -> {"ok": true, "path": "/abs/path/screenshot.png"}
+        -> {"ok": false, "error": "...", "error_type": "ValueError"}
+    Other commands: {"cmd": "ping"}, {"cmd": "shutdown"}
+    """
+    
+    def __init__(self, snap: ScreenSnap, socket_path: Optional[Path] = None):
+        """
+        Initialize daemon
+        
+        Args:
+            snap: ScreenSnap instance to capture with
+            socket_path: Unix socket path (default: from config, else
+                         ~/.screensnap.sock)
+        """
+        import threading
+        
+        self.snap = snap
+        self.socket_path = Path(
+            socket_path
+            or snap.config_manager.config.get('socket_path')
+            or DEFAULT_SOCKET_PATH
+        ).expanduser()
+        self._capture_lock = threading.Lock()
+        self._server = None
+    
+    def handle_request(self, request: dict) -> dict:
+        """
+        Execute one protocol request
+        
+        Args:
+            request: Decoded request object
+        
+        Returns:
+            Response object
+        """
+        cmd = request.get("cmd", "capture")
+        try:
+            if cmd == "ping":
+                return {"ok": True, "version": VERSION,
+                        "frames_skipped": self.snap.frames_skipped}
+            
+            if cmd == "shutdown":
+                import threading
+                threading.Thread(target=self.shutdown, daemon=True).start()
+                return {"ok": True}
+            
+            if cmd == "capture":
+                # Backends are not thread-safe; serialize grabs
+                with self._capture_lock:
+                    if request.get("window"):
+                        filepath = self.snap.capture_window(
+                            request["window"], request.get("filename"),
+                            request.get("region")
+                        )
+                    else:
+                        filepath = self.snap.capture(request.get("filename"),
+                                                     request.get("region"))
+                    timing = self.snap.last_timing
+                return {"ok": True, "path": str(filepath.absolute()),
+                        "timing": timing.to_dict() if timing else None}
+            
+            raise ValueError(f"Unknown command '{cmd}'")
+        
+        except Exception as e:
+            return {"ok": False, "error": str(e), "error_type": type(e).__name__}
+    
+    def serve_forever(self):
+        """
+        Listen on the socket until shutdown() or KeyboardInterrupt
+        
+        Raises:
+            RuntimeError: If Unix sockets are unavailable or another daemon
+                          is already listening on the socket
+        """
+        import json
+        import socket
+        import socketserver
+        
+        if not hasattr(socketserver, "ThreadingUnixStreamServer"):
+            raise RuntimeError("Daemon mode requires Unix domain sockets")
+        
+        if self.socket_path.exists():
+            if ScreenSnapClient(self.socket_path, timeout=1.0).ping():
+                raise RuntimeError(
+                    f"ScreenSnap daemon already running at {self.socket_path}"
+                )
+            # Stale socket from a daemon that did not shut down cleanly
+            self.socket_path.unlink()
+        
+        daemon = self
         
-        except ValueError:
-            # Re-raise validation errors as-is
-            raise
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    try:
+                        request = json.loads(line)
+                    except json.JSONDecodeError as e:
+                        response = {"ok": False, "error": f"Invalid request: {e}",
+                                    "error_type": "ValueError"}
+                    else:
+                        response = daemon.handle_request(request)
+                    self.wfile.write(json.dumps(response).encode() + b"\n")
+                    self.wfile.flush()
         
-        except Exception as e:
-            raise RuntimeError(f"Failed to capture screenshot: {e}")
+        # Only the owning user may connect
+        old_umask = os.umask(0o077)
+        try:
+            self._server = socketserver.ThreadingUnixStreamServer(
+                str(self.socket_path), Handler
+            )
+        finally:
+            os.umask(old_umask)
+        self._server.daemon_threads = True
+        
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._server.server_close()
+            try:
+                self.socket_path.unlink()
+            except (FileNotFoundError, socket.error):
+                pass
+            self.snap.close()
+    
+    def shutdown(self):
+        """Stop serve_forever() (safe to call from any thread)"""
+        if self._server is not None:
+            self._server.shutdown()
+
+
+class ScreenSnapClient:
+    """
+    Thin client for ScreenSnapDaemon
+    
+    Needs neither PIL nor a capture backend, so it starts fast.
+    """
     
-    def capture_window(self, window_title: str, filename: Optional[str] = None) -> Path:
+    def __init__(self, socket_path: Optional[Path] = None, timeout: float = 30.0):
         """
-        Capture specific window (Windows only for now)
+        Initialize client
         
         Args:
-            window_title: Title of window to capture (substring match)
-            filename: Output filename (optional)
-        
-        Returns:
-            Path to saved screenshot
+            socket_path: Daemon socket (default: from config, else
+                         ~/.screensnap.sock)
+            timeout: Seconds to wait for a response
+        """
+        if socket_path is None:
+            socket_path = ScreenSnapConfig().config.get('socket_path') or DEFAULT_SOCKET_PATH
+        self.socket_path = Path(socket_path).expanduser()
+        self.timeout = timeout
+        # Timing record (CaptureTiming.to_dict()) of the last daemon capture
+        self.last_timing = None
+    
+    def request(self, **message) -> dict:
+        """
+        Send one request and return the decoded response
         
         Raises:
-            NotImplementedError: If not on Windows
-            ValueError: If window not found
+            RuntimeError: If the daemon is not reachable
         """
-        if self.system != "Windows":
-            # Fallback to full screen on non-Windows
-            print(f"Warning: Window capture not supported on {self.system}, capturing full screen")
-            return self.capture(filename)
+        import json
+        import socket
         
-        # Windows-specific window capture
         try:
-            import win32gui
-            import win32ui
-            import win32con
-            from ctypes import windll
-            from PIL import Image
-            
-            # Find window by title
-            hwnd = self._find_window(window_title)
-            if not hwnd:
-                print(f"Warning: Window '{window_title}' not found, capturing full screen")
-                return self.capture(filename)
-            
-            # Get window dimensions
-            left, top, right, bottom = win32gui.GetWindowRect(hwnd)
-            width = right - left
-            height = bottom - top
-            
-            # Capture window
-            hwndDC = win32gui.GetWindowDC(hwnd)
-            mfcDC = win32ui.CreateDCFromHandle(hwndDC)
-            saveDC = mfcDC.CreateCompatibleDC()
-            saveBitMap = win32ui.CreateBitmap()
-            saveBitMap.CreateCompatibleBitmap(mfcDC, width, height)
-            saveDC.SelectObject(saveBitMap)
-            
-            # Copy window contents
-            result = windll.user32.PrintWindow(hwnd, saveDC.GetSafeHdc(), 3)
-            
-            # Convert to PIL Image
-            bmpinfo = saveBitMap.GetInfo()
-            bmpstr = saveBitMap.GetBitmapBits(True)
-            screenshot = Image.frombuffer(
-                'RGB',
-                (bmpinfo['bmWidth'], bmpinfo['bmHeight']),
-                bmpstr, 'raw', 'BGRX', 0, 1
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(self.timeout)
+                sock.connect(str(self.socket_path))
+                sock.sendall(json.dumps(message).encode() + b"\n")
+                with sock.makefile('rb') as reader:
+                    line = reader.readline()
+        except (OSError, AttributeError) as e:
+            raise RuntimeError(
+                f"ScreenSnap daemon not reachable at {self.socket_path} "
+                f"(start it with: screensnap --daemon): {e}"
             )
-            
-            # Cleanup
-            win32gui.DeleteObject(saveBitMap.GetHandle())
-            saveDC.DeleteDC()
-            mfcDC.DeleteDC()
-            win32gui.ReleaseDC(hwnd, hwndDC)
-            
-            # Save screenshot
-            filepath = self._generate_filename(filename)
-            screenshot.save(filepath, self.format.upper())
-            
-            return filepath
+        if not line:
+            raise RuntimeError("ScreenSnap daemon closed the connection")
+        return json.loads(line)
+    
+    def _capture_request(self, **message) -> Path:
+        response = self.request(cmd="capture", **message)
+        if response.get("ok"):
+            self.last_timing = response.get("timing")
+            return Path(response["path"])
+        if response.get("error_type") == "ValueError":
+            raise ValueError(response["error"])
+        raise RuntimeError(response.get("error", "Unknown daemon error"))
+    
+    def capture(self, filename: Optional[str] = None,
+                region: Optional[tuple] = None) -> Path:
+        """
+        Capture full screen (or a region) via the daemon
         
-        except ImportError:
-            # pywin32 not installed, fallback to full screen
-            print("Warning: pywin32 not installed, capturing full screen instead")
-            return self.capture(filename)
+        Returns:
+            Path to saved screenshot (daemon's output directory)
         
-        except Exception as e:
-            raise RuntimeError(f"Failed to capture window: {e}")
+        Raises:
+            ValueError: If filename or region is invalid
+            RuntimeError: If the daemon is unreachable or capture fails
+        """
+        if region is not None:
+            region = validate_region(region)
+        return self._capture_request(filename=filename, region=region)
     
-    def _find_window(self, title_substring: str) -> Optional[int]:
+    def capture_window(self, window_title: str, filename: Optional[str] = None,
+                       region: Optional[tuple] = None) -> Path:
         """
-        Find window handle by title substring (Windows only)
-        
-        Args:
-            title_substring: Substring to search for in window titles
+        Capture a window via the daemon (same fallbacks as ScreenSnap)
         
         Returns:
-            Window handle (HWND) or None if not found
+            Path to saved screenshot (daemon's output directory)
         """
+        if region is not None:
+            region = validate_region(region)
+        return self._capture_request(window=window_title, filename=filename,
+                                     region=region)
+    
+    def ping(self) -> bool:
+        """Return True if a daemon answers on the socket"""
         try:
-            import win32gui
-            
-            def callback(hwnd, results):
-                if win32gui.IsWindowVisible(hwnd):
-                    window_title = win32gui.GetWindowText(hwnd)
-                    if title_substring.lower() in window_title.lower():
-                        results.append(hwnd)
-            
-            results = []
-            win32gui.EnumWindows(callback, results)
-            
-            return results[0] if results else None
-        
-        except ImportError:
-            return None
+            return bool(self.request(cmd="ping").get("ok"))
+        except RuntimeError:
+            return False
+    
+    def shutdown(self):
+        """Ask the daemon to exit"""
+        self.request(cmd="shutdown")
 
 
 # ============== CLI INTERFACE ==============
 
-def main():
+def _print_store_summary(store):
+    """Print what a tile store or session run wrote"""
+    if isinstance(store, SessionWriter):
+        print(f"✅ Stored {store.frames_written} frames in: {store.path.absolute()} "
+              f"({store.bytes_written} bytes)")
+        return
+    ratio = store.tiles_written / store.tiles_total if store.tiles_total else 0.0
+    print(f"✅ Stored {store.frames_written} frames in: {store.path.absolute()}")
+    print(f"   {store.keyframes_written} keyframes, {store.tiles_written}/{store.tiles_total} "
+          f"tiles written ({ratio:.1%}), {store.bytes_written} bytes")
+
+
+def _parse_time_arg(text: str) -> datetime:
+    """Parse a CLI time: ISO date/time, or HH:MM[:SS] meaning today"""
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        pass
+    for pattern in ("%H:%M:%S", "%H:%M"):
+        try:
+            parsed = datetime.strptime(text, pattern).time()
+        except ValueError:
+            continue
+        return datetime.combine(datetime.now().date(), parsed)
+    raise ValueError(f"Invalid time '{text}'. Use YYYY-MM-DD[THH:MM[:SS]] or HH:MM[:SS]")
+
+
+def _query_main(argv: list) -> int:
+    """`screensnap query`: search the capture index"""
+    import argparse
+    
+    def time_arg(text):
+        try:
+            return _parse_time_arg(text)
+        except ValueError as e:
+            raise argparse.ArgumentTypeError(str(e))
+    
+    parser = argparse.ArgumentParser(
+        prog="screensnap query",
+        description="Search captures recorded with --index (or \"index\": true in "
+                    "~/.screensnaprc)"
+    )
+    parser.add_argument("--since", type=time_arg, metavar="TIME",
+                        help="Captures at or after TIME (ISO, or HH:MM[:SS] today)")
+    parser.add_argument("--until", type=time_arg, metavar="TIME",
+                        help="Captures at or before TIME")
+    parser.add_argument("--around", type=time_arg, metavar="TIME",
+                        help="Captures nearest TIME first (within --tolerance)")
+    parser.add_argument("--tolerance", type=float, default=60.0, metavar="SECONDS",
+                        help="Window for --around (default: 60)")
+    parser.add_argument("--window", "-w", metavar="TITLE",
+                        help="Window title substring (case-insensitive)")
+    parser.add_argument("--hash", metavar="SHA256",
+                        help="Content hash or hash prefix")
+    parser.add_argument("--limit", "-n", type=int, metavar="N",
+                        help="Show at most N captures")
+    parser.add_argument("--index", metavar="PATH",
+                        help="Index database (default: index_path from config, else "
+                             f"<output-dir>/{DEFAULT_INDEX_NAME})")
+    parser.add_argument("--output-dir", "-o", metavar="DIR",
+                        help="Output directory holding the default index")
+    parser.add_argument("--json", action="store_true",
+                        help="Print one JSON object per capture")
+    args = parser.parse_args(argv)
+    
+    config = ScreenSnapConfig().config
+    index_path = Path(args.index or config.get('index_path') or
+                      Path(args.output_dir or config['output_dir']) / DEFAULT_INDEX_NAME)
+    index_path = index_path.expanduser()
+    if not index_path.exists():
+        print(f"❌ Error: No capture index at {index_path}", file=sys.stderr)
+        return 1
+    
+    start, end = args.since, args.until
+    if args.around is not None:
+        from datetime import timedelta
+        window = timedelta(seconds=args.tolerance)
+        start = max(filter(None, (start, args.around - window)))
+        end = min(filter(None, (end, args.around + window)))
+    
+    with CaptureIndex(index_path) as index:
+        rows = index.query(start, end, window=args.window, sha256=args.hash,
+                           around=args.around, limit=args.limit)
+    
+    if args.json:
+        import json
+        for row in rows:
+            print(json.dumps(dict(row, timestamp=row["timestamp"].isoformat())))
+        return 0
+    for row in rows:
+        digest = (row["sha256"] or "-")[:12]
+        window = f"  [{row['window']}]" if row["window"] else ""
+        print(f"{row['timestamp'].isoformat(sep=' ', timespec='milliseconds')}  "
+              f"{row['width']}x{row['height']}  {row['bytes']:>9}  {digest}  "
+              f"{row['path']}{window}")
+    print(f"{len(rows)} capture(s)", file=sys.stderr)
+    return 0
+
+
+def _gc_main(argv: list) -> int:
+    """`screensnap gc`: remove deduplicated frames no capture links to"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        prog="screensnap gc",
+        description="Garbage-collect the --dedup object store after captures were "
+                    "deleted. Run it while nothing captures into the directory."
+    )
+    parser.add_argument("--output-dir", "-o", metavar="DIR",
+                        help="Output directory holding the store (default: from config)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Report what would be removed")
+    args = parser.parse_args(argv)
+    
+    output_dir = Path(args.output_dir or ScreenSnapConfig().config['output_dir'])
+    root = output_dir.expanduser() / DEFAULT_STORE_NAME
+    if not root.is_dir():
+        print(f"❌ Error: No deduplicated store at {root}", file=sys.stderr)
+        return 1
+    result = ContentStore(root).collect(dry_run=args.dry_run)
+    verb = "Would remove" if args.dry_run else "Removed"
+    print(f"✅ {verb} {result['removed']} objects ({result['bytes_freed']} bytes), "
+          f"{result['objects']} still referenced")
+    return 0
+
+
+def _session_main(argv: list) -> int:
+    """`screensnap session`: list or export a session file"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        prog="screensnap session",
+        description="Work with session files written by --burst/--interval --session"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    info = commands.add_parser("info", help="List the frames in a session")
+    info.add_argument("session", help="Session file")
+    export = commands.add_parser("export", help="Write frames out as individual files")
+    export.add_argument("session", help="Session file")
+    export.add_argument("--output-dir", "-o", metavar="DIR",
+                        help="Output directory (default: from config)")
+    export.add_argument("--format", "-f", default="png",
+                        help="Image format: png, jpg (default: png; frames stored in "
+                             "this format are copied without re-encoding)")
+    export.add_argument("--prefix", help="Filename prefix (default: session name)")
+    args = parser.parse_args(argv)
+    
+    try:
+        if args.command == "info":
+            with SessionReader(args.session) as session:
+                for index in range(len(session)):
+                    offset, length, _, width, height = session.entries[index]
+                    print(f"{index:6d}  {session.timestamp(index).isoformat(sep=' ')}  "
+                          f"{width}x{height}  {session.extensions[index]}  {length} bytes")
+                state = "complete" if session.complete else "no index (recovered by scan)"
+                print(f"{len(session)} frames, {state}", file=sys.stderr)
+            return 0
+        
+        with ScreenSnap(output_dir=args.output_dir, format=args.format) as snap:
+            paths = snap.export_session(args.session, args.prefix)
+        print(f"✅ Exported {len(paths)} frames to: {snap.output_dir.absolute()}")
+        return 0
+    except Exception as e:
+        print(f"❌ Error: {e}", file=sys.stderr)
+        return 1
+
+
+def _encode_main(argv: list) -> int:
+    """`screensnap encode`: turn raw captures into PNG/JPEG/WebP files"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        prog="screensnap encode",
+        description="Encode captures taken with --format raw (files or --session "
+                    "files) in parallel worker processes. Raw files are removed once "
+                    "encoded; frames already encoded are skipped, so rerun to resume."
+    )
+    parser.add_argument("sources", nargs="+", metavar="PATH",
+                        help="Raw files, session files or directories (searched "
+                             "recursively)")
+    parser.add_argument("--format", "-f", default="png",
+                        help="Output format: png, jpg or webp (default: png)")
+    parser.add_argument("--profile", "-p", choices=list(COMPRESSION_PROFILES),
+                        help="Compression profile (default: from config, else balanced)")
+    parser.add_argument("--output-dir", "-o", metavar="DIR",
+                        help="Write outputs to DIR (default: beside each source)")
+    parser.add_argument("--workers", "-j", type=int, metavar="N",
+                        help="Worker processes (default: one per available CPU)")
+    parser.add_argument("--keep", action="store_true",
+                        help="Keep raw files after encoding")
+    parser.add_argument("--json", action="store_true",
+                        help="Print the throughput report as JSON")
+    args = parser.parse_args(argv)
+    
+    def show_progress(done, total, stats):
+        print(f"\r  {done}/{total} frames ({done / total:.0%}), "
+              f"{stats['frames_per_second']:.1f} frames/s, "
+              f"{stats['mb_per_second']:.1f} MB/s", end="", file=sys.stderr, flush=True)
+    
+    try:
+        result = encode_raw_frames(args.sources, args.format, args.profile,
+                                   args.output_dir, args.workers, args.keep,
+                                   progress=show_progress if sys.stderr.isatty() else None)
+    except Exception as e:
+        if sys.stderr.isatty():
+            print(file=sys.stderr)
+        print(f"❌ Error: {e}", file=sys.stderr)
+        return 1
+    if sys.stderr.isatty() and result["frames"] > result["skipped"]:
+        print(file=sys.stderr)
+    
+    if args.json:
+        import json
+        print(json.dumps(result))
+        return 0
+    ratio = result["bytes_out"] / result["bytes_in"] if result["bytes_in"] else 0.0
+    print(f"✅ Encoded {result['encoded']} frames in {result['seconds']:.2f}s "
+          f"({result['skipped']} already done)")
+    print(f"   {result['frames_per_second']} frames/s, {result['mb_per_second']} MB/s of "
+          f"pixels, {result['bytes_in']} -> {result['bytes_out']} bytes ({ratio:.2%})")
+    return 0
+
+
+def main(argv: Optional[list] = None):
     """CLI entry point"""
+    argv = sys.argv[1:] if argv is None else argv
+    
+    # Agents poll --version; answer before building the parser
+    if argv in (["--version"], ["-v"]):
+        print(f"ScreenSnap {VERSION}")
+        return 0
+    
+    # Subcommands parse their own options
+    if argv and argv[0] == "bench":
+        from screensnap_bench import main as bench_main
+        return bench_main(argv[1:])
+    if argv and argv[0] == "query":
+        return _query_main(argv[1:])
+    if argv and argv[0] == "gc":
+        return _gc_main(argv[1:])
+    if argv and argv[0] == "session":
+        return _session_main(argv[1:])
+    if argv and argv[0] == "encode":
+        return _encode_main(argv[1:])
+    
     import argparse
     
+    def region_arg(text):
+        try:
+            return validate_region(text)
+        except ValueError as e:
+            raise argparse.ArgumentTypeError(str(e))
+    
     parser = argparse.ArgumentParser(
         description="ScreenSnap - Simple cross-platform screenshot tool",
         epilog="Examples:\n"
                "  screensnap                    # Capture full screen with timestamp\n"
                "  screensnap myscreen.png        # Capture to specific file\n"
-               "  screensnap --window Chrome     # Capture Chrome window (Windows only)\n",
+               "  screensnap --window Chrome     # Capture Chrome window (Windows only)\n"
+               "  screensnap bench --help        # Benchmark backends and encoders\n"
+               "  screensnap query --help        # Search indexed captures\n"
+               "  screensnap gc --help           # Remove unreferenced --dedup data\n"
+               "  screensnap session --help      # List or export --session files\n"
+               "  screensnap encode --help       # Encode --format raw captures later\n",
         formatter_class=argparse.RawDescriptionHelpFormatter
     )
     
@@ -336,6 +5290,32 @@ def main():
         help="Capture specific window by title substring (Windows only)"
     )
     
+    parser.add_argument(
+        "--region", "-r",
+        metavar="X,Y,W,H",
+        type=region_arg,
+        help="Capture only this rectangle (e.g. 100,200,400,300)"
+    )
+    
+    parser.add_argument(
+        "--monitor", "-m",
+        type=int,
+        metavar="N",
+        help="Capture only monitor N (see --list-monitors)"
+    )
+    
+    parser.add_argument(
+        "--all-monitors-separately",
+        action="store_true",
+        help="Capture each monitor to its own file, encoded in parallel"
+    )
+    
+    parser.add_argument(
+        "--list-monitors",
+        action="store_true",
+        help="List monitors and exit"
+    )
+    
     parser.add_argument(
         "--output-dir", "-o",
         metavar="DIR",
@@ -344,9 +5324,154 @@ def main():
     
     parser.add_argument(
         "--format", "-f",
-        choices=["png", "jpg", "jpeg"],
+        choices=OUTPUT_FORMATS,
         default="png",
-        help="Image format (default: png)"
+        help="Image format (default: png; raw skips encoding, see `screensnap encode`)"
+    )
+    
+    parser.add_argument(
+        "--encoder",
+        choices=PNG_ENCODERS,
+        help="PNG encoder: pillow, or parallel to deflate strips on all cores "
+             "(default: from ~/.screensnaprc, else pillow)"
+    )
+    
+    parser.add_argument(
+        "--profile", "-p",
+        choices=list(COMPRESSION_PROFILES),
+        help="Compression profile: fast, balanced or small "
+             f"(default: from ~/.screensnaprc, else {DEFAULT_PROFILE})"
+    )
+    
+    parser.add_argument(
+        "--backend", "-b",
+        choices=["auto"] + list(CAPTURE_BACKENDS),
+        help=f"Capture backend (default: from ~/.screensnaprc, else {DEFAULT_BACKEND})"
+    )
+    
+    parser.add_argument(
+        "--burst",
+        type=int,
+        metavar="N",
+        help="Capture N frames in a paced burst (filename is used as prefix)"
+    )
+    
+    parser.add_argument(
+        "--fps",
+        type=float,
+        default=10.0,
+        help="Target frame rate for --burst/--record (default: 10)"
+    )
+    
+    parser.add_argument(
+        "--interval",
+        type=float,
+        metavar="SECONDS",
+        help="Capture every SECONDS until Ctrl+C (timer mode)"
+    )
+    
+    parser.add_argument(
+        "--skip-unchanged",
+        action="store_true",
+        default=None,
+        help="Don't write frames identical to the last saved one"
+    )
+    
+    parser.add_argument(
+        "--tiles",
+        action="store_true",
+        help="With --burst/--interval: store frames as keyframes plus "
+             "changed tiles in a <name>.tiles directory"
+    )
+    
+    parser.add_argument(
+        "--session",
+        action="store_true",
+        help="With --burst/--interval: append encoded frames to a single "
+             "<name>.snapsession file (see `screensnap session`)"
+    )
+    
+    parser.add_argument(
+        "--record",
+        type=float,
+        metavar="SECONDS",
+        help="Flight recorder: keep the last SECONDS of frames in memory at "
+             "--fps and dump them on Ctrl+C"
+    )
+    
+    parser.add_argument(
+        "--layout",
+        choices=OUTPUT_LAYOUTS,
+        help="Output layout: flat (default), date (YYYY-MM-DD/HH/ subdirs) or "
+             "hash (256 shard subdirs)"
+    )
+    
+    parser.add_argument(
+        "--atomic",
+        action="store_true",
+        default=None,
+        help="Write via temp file + rename so readers never see partial files"
+    )
+    
+    parser.add_argument(
+        "--fsync",
+        choices=FSYNC_POLICIES,
+        help="Durability: never (default), per-file or batched"
+    )
+    
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        default=None,
+        help="Store identical frames once; capture files become hardlinks "
+             "(see `screensnap gc`)"
+    )
+    
+    parser.add_argument(
+        "--index",
+        action="store_true",
+        default=None,
+        help="Record captures in the SQLite index searched by `screensnap query`"
+    )
+    
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        default=None,
+        help="Print per-stage capture timings (grab, convert, encode, write) to stderr"
+    )
+    
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        metavar="PORT",
+        help="With --daemon/--interval: serve Prometheus metrics on "
+             "http://127.0.0.1:PORT/metrics"
+    )
+    
+    parser.add_argument(
+        "--metrics-file",
+        metavar="PATH",
+        help="With --daemon/--interval: keep Prometheus metrics in PATH "
+             "(node_exporter textfile collector)"
+    )
+    
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Run as a long-lived capture service on a Unix socket"
+    )
+    
+    parser.add_argument(
+        "--client",
+        action="store_true",
+        help="Capture through a running daemon instead of in-process"
+    )
+    
+    parser.add_argument(
+        "--socket",
+        metavar="PATH",
+        help="Daemon socket path (default: ~/.screensnap.sock)"
     )
     
     parser.add_argument(
@@ -355,20 +5480,183 @@ def main():
         version=f"ScreenSnap {VERSION}"
     )
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    
+    if args.daemon and args.client:
+        parser.error("--daemon and --client are mutually exclusive")
+    modes = [flag for flag, value in (("--burst", args.burst), ("--record", args.record),
+                                      ("--interval", args.interval)) if value is not None]
+    for flag, value in (("--burst", args.burst), ("--record", args.record),
+                        ("--interval", args.interval), ("--fps", args.fps)):
+        if value is not None and value <= 0:
+            parser.error(f"{flag} must be positive, got {value:g}")
+    if modes and (args.daemon or args.client or args.window or args.region):
+        parser.error(f"{modes[0]} cannot be combined with --daemon, --client, --window "
+                     "or --region")
+    if len(modes) > 1:
+        parser.error(f"{' and '.join(modes)} are mutually exclusive")
+    targets = [flag for flag, value in (("--window", args.window), ("--region", args.region),
+                                        ("--monitor", args.monitor is not None),
+                                        ("--all-monitors-separately",
+                                         args.all_monitors_separately)) if value]
+    if len(targets) > 1:
+        parser.error(f"{' and '.join(targets)} are mutually exclusive")
+    if (args.monitor is not None or args.all_monitors_separately) and (modes or args.client):
+        parser.error("Monitor selection works only with single captures")
+    if (args.metrics_port or args.metrics_file) and not (args.daemon
+                                                         or args.interval is not None):
+        parser.error("--metrics-port and --metrics-file require --daemon or --interval")
+    if args.tiles and args.burst is None and args.interval is None:
+        parser.error("--tiles requires --burst or --interval")
+    if args.session and args.burst is None and args.interval is None:
+        parser.error("--session requires --burst or --interval")
+    if args.session and args.tiles:
+        parser.error("--session and --tiles are mutually exclusive")
+    if args.client and (args.output_dir or args.backend or args.encoder or args.profile
+                        or args.atomic or args.fsync or args.layout or args.index
+                        or args.dedup):
+        parser.error("--output-dir, --backend, --encoder, --profile, --atomic, "
+                     "--fsync, --layout, --index and --dedup are set when starting "
+                     "the daemon")
+    
+    # Thin client: one round trip to the daemon, no PIL import
+    if args.client:
+        try:
+            client = ScreenSnapClient(args.socket)
+            if args.window:
+                filepath = client.capture_window(args.window, args.filename, args.region)
+            else:
+                filepath = client.capture(args.filename, args.region)
+            print(f"✅ Screenshot saved to: {filepath}")
+            if args.timings and client.last_timing:
+                import json
+                print(f"Timing: {json.dumps(client.last_timing)}", file=sys.stderr)
+            return 0
+        except Exception as e:
+            print(f"❌ Error: {e}", file=sys.stderr)
+            return 1
     
     # Create ScreenSnap instance
+    metrics = None
     try:
         snap = ScreenSnap(
             output_dir=args.output_dir,
-            format=args.format
+            format=args.format,
+            backend=args.backend,
+            skip_unchanged=args.skip_unchanged,
+            encoder=args.encoder,
+            profile=args.profile,
+            log_timings=args.timings,
+            atomic_writes=args.atomic,
+            fsync=args.fsync,
+            layout=args.layout,
+            index=args.index,
+            dedup=args.dedup
         )
         
+        if args.list_monitors:
+            with snap:
+                for monitor in snap.list_monitors():
+                    primary = " (primary)" if monitor["primary"] else ""
+                    print(f"{monitor['index']}: {monitor['width']}x{monitor['height']} "
+                          f"at {monitor['x']},{monitor['y']}{primary}")
+            return 0
+        
+        if args.all_monitors_separately:
+            with snap:
+                paths = snap.capture_all_monitors(args.filename)
+            for path in paths:
+                print(f"✅ Screenshot saved to: {path.absolute()}")
+            return 0
+        
+        if args.daemon or args.interval is not None:
+            # Long-running service modes export metrics
+            config = snap.config_manager.config
+            metrics_port = args.metrics_port or config.get('metrics_port')
+            metrics_file = args.metrics_file or config.get('metrics_file')
+            if metrics_port or metrics_file:
+                metrics = CaptureMetrics().attach(snap)
+                if metrics_port:
+                    host, port = metrics.serve_http(metrics_port)
+                    print(f"Metrics at http://{host}:{port}/metrics")
+                if metrics_file:
+                    metrics.start_textfile(Path(metrics_file).expanduser())
+        
+        if args.daemon:
+            daemon = ScreenSnapDaemon(snap, args.socket)
+            print(f"ScreenSnap daemon listening on {daemon.socket_path}")
+            daemon.serve_forever()
+            return 0
+        
+        store = None
+        if args.tiles:
+            store = snap.open_tile_store(args.filename)
+        elif args.session:
+            store = snap.open_session(args.filename)
+        
+        if args.interval is not None:
+            print(f"Capturing every {args.interval:g}s, Ctrl+C to stop...")
+            # Collect as we go so Ctrl+C still reports what was written
+            paths = []
+            with snap:
+                try:
+                    snap.capture_periodic(args.interval, on_capture=paths.append,
+                                          store=store)
+                except KeyboardInterrupt:
+                    pass
+                finally:
+                    # Before snap closes, so retention still sees the store
+                    if store is not None:
+                        store.close()
+            if store is not None:
+                _print_store_summary(store)
+                return 0
+            print(f"✅ Saved {len(paths)} screenshots to: {snap.output_dir.absolute()} "
+                  f"({snap.frames_skipped} unchanged frames skipped)")
+            return 0
+        
+        if args.record is not None:
+            recorder = FlightRecorder(snap, seconds=args.record, fps=args.fps)
+            print(f"Recording last {args.record:g}s at {args.fps:g} fps, Ctrl+C to dump...")
+            recorder.start()
+            try:
+                import time
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                pass
+            recorder.stop()
+            with snap:
+                paths = recorder.dump(args.filename)
+            print(f"✅ Dumped {len(paths)} frames to: {snap.output_dir.absolute()}")
+            return 0
+        
+        if args.burst is not None:
+            with snap:
+                try:
+                    result = snap.capture_burst(args.burst, args.fps, args.filename,
+                                                store=store)
+                finally:
+                    # Before snap closes, so retention still sees the store
+                    if store is not None:
+                        store.close()
+            stats = result.summary()
+            if store is not None:
+                _print_store_summary(store)
+            else:
+                print(f"✅ Captured {stats['frames']} frames to: {snap.output_dir.absolute()}")
+            print(f"   Target {stats['target_fps']} fps, achieved {stats['achieved_fps']} fps, "
+                  f"jitter {stats['jitter_ms']} ms, max lateness {stats['max_lateness_ms']} ms")
+            return 0
+        
         # Capture screenshot
-        if args.window:
-            filepath = snap.capture_window(args.window, args.filename)
-        else:
-            filepath = snap.capture(args.filename)
+        with snap:
+            if args.window:
+                filepath = snap.capture_window(args.window, args.filename, args.region)
+            elif args.monitor is not None:
+                filepath = snap.capture_monitor(args.monitor, args.filename)
+            else:
+                filepath = snap.capture(args.filename, args.region)
         
         # Success message
         print(f"✅ Screenshot saved to: {filepath.absolute()}")
@@ -377,6 +5665,10 @@ def main():
     except Exception as e:
         print(f"❌ Error: {e}", file=sys.stderr)
         return 1
+    
+    finally:
+        if metrics is not None:
+            metrics.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,385 @@
+"""
+ScreenSnap Bench - Reproducible capture performance benchmarks
+
+Measures grab, convert, encode and write latency for every combination of
+scene, backend, format, encoder and compression profile. Scenes come from
+the deterministic synthetic backend, so results are comparable across
+hosts and runs without a display. Results are printed as JSON for
+regression tracking.
+
+Usage:
+    screensnap bench
+    screensnap bench --scenes 4k multi --formats png --encoders pillow parallel
+    screensnap bench --backends xshm --iterations 20 --output bench.json
+    screensnap bench --startup
+
+Author: Atlas (Team Brain)
+Created: 2026-01-18
+License: MIT
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+from screensnap import (VERSION, COMPRESSION_PROFILES, PNG_ENCODERS,
+                        ScreenSnap, validate_profile)
+
+# Synthetic backend options per named scene
+BENCH_SCENES = {
+    "1080p": {"width": 1920, "height": 1080},
+    "4k": {"width": 3840, "height": 2160},
+    "multi": {"monitors": [[3840, 2160], [3840, 2160], [3840, 2160]]},
+}
+BENCH_STAGES = ["grab", "convert", "encode", "write"]
+BENCH_FORMATS = ["png", "jpg"]
+DEFAULT_ITERATIONS = 5
+
+# Cold-start paths timed by bench_startup(), as `python -c` programs
+STARTUP_CASES = {
+    "import": "import screensnap",
+    "version": "import screensnap\nscreensnap.main(['--version'])",
+    "help": "import screensnap\ntry:\n    screensnap.main(['--help'])\nexcept SystemExit:\n    pass",
+}
+# Modules each start-up path must leave unloaded: only capture, storage
+# and daemon code paths import these
+_STARTUP_HEAVY_MODULES = ["PIL", "json", "platform", "socket", "sqlite3",
+                          "concurrent.futures", "ctypes", "mmap", "hashlib", "subprocess"]
+STARTUP_LAZY_MODULES = {
+    "import": _STARTUP_HEAVY_MODULES + ["argparse", "threading"],
+    "version": _STARTUP_HEAVY_MODULES + ["argparse", "threading"],
+    "help": _STARTUP_HEAVY_MODULES + ["threading"],
+}
+# Target start-up cost above a bare interpreter, in milliseconds (reported
+# as within_budget; timings depend on the host, so nothing fails on it)
+STARTUP_BUDGET_MS = 100.0
+
+
+def parse_scene(scene: str) -> dict:
+    """
+    Resolve a scene name or WIDTHxHEIGHT to synthetic backend options
+    
+    Raises:
+        ValueError: If the scene is unknown or malformed
+    """
+    if scene in BENCH_SCENES:
+        return BENCH_SCENES[scene]
+    try:
+        width, height = (int(part) for part in scene.lower().split("x"))
+        if width > 0 and height > 0:
+            return {"width": width, "height": height}
+    except ValueError:
+        pass
+    raise ValueError(
+        f"Invalid scene '{scene}'. Must be WIDTHxHEIGHT or one of: "
+        f"{', '.join(BENCH_SCENES)}"
+    )
+
+
+def _stage_stats(samples: list) -> dict:
+    """Summarize stage durations (seconds) in milliseconds"""
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return {
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "median_ms": round(ordered[len(ordered) // 2] * 1000, 3),
+        "min_ms": round(ordered[0] * 1000, 3),
+        "p95_ms": round(p95 * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def bench_case(snap: ScreenSnap, iterations: int) -> dict:
+    """
+    Time the capture stages of one configured ScreenSnap instance
+    
+    One untimed warm-up round opens the backend and fills caches.
+    
+    Args:
+        snap: Instance whose backend, format, encoder and profile are measured
+        iterations: Timed rounds
+    
+    Returns:
+        Per-stage statistics, frame size, output bytes and throughput
+    """
+    samples = {stage: [] for stage in BENCH_STAGES}
+    filepath = snap.output_dir / f"bench.{snap.format}"
+    size = 0
+    
+    for round_number in range(iterations + 1):
+        start = time.perf_counter()
+        frame = snap.backend.grab()
+        grabbed = time.perf_counter()
+        # Encoders take RGB; native BGRX/RGBA frames pay for conversion
+        if frame.mode != "RGB":
+            frame = frame.convert("RGB")
+        converted = time.perf_counter()
+        data = snap._encode_image(frame)
+        encoded = time.perf_counter()
+        with open(filepath, 'wb') as f:
+            f.write(data)
+        written = time.perf_counter()
+        
+        if round_number == 0:
+            continue
+        size = len(data)
+        for stage, duration in zip(BENCH_STAGES, (grabbed - start, converted - grabbed,
+                                                  encoded - converted, written - encoded)):
+            samples[stage].append(duration)
+    
+    width, height = frame.size
+    total = sum(sum(values) for values in samples.values())
+    encode_total = sum(samples["encode"]) or float("inf")
+    return {
+        "width": width,
+        "height": height,
+        "iterations": iterations,
+        "bytes": size,
+        "stages": {stage: _stage_stats(values) for stage, values in samples.items()},
+        "frames_per_s": round(iterations / total, 3) if total else 0.0,
+        "encode_mpixels_per_s": round(width * height * iterations / encode_total / 1e6, 3),
+    }
+
+
+def _run_python(code: str) -> tuple:
+    """Run code in a fresh interpreter next to screensnap.py; (seconds, stdout)"""
+    import subprocess
+    
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True,
+                            text=True, cwd=Path(__file__).resolve().parent,
+                            check=True)
+    return time.perf_counter() - start, result.stdout
+
+
+def startup_modules(case: str) -> list:
+    """
+    Modules from STARTUP_LAZY_MODULES that a start-up path loads
+    
+    Runs the case in a fresh interpreter and inspects sys.modules.
+    
+    Args:
+        case: Key of STARTUP_CASES
+    
+    Returns:
+        Eagerly loaded module names (should be empty)
+    """
+    lazy = STARTUP_LAZY_MODULES[case]
+    probe = (f"{STARTUP_CASES[case]}\nimport sys\n"
+             f"print('LOADED:' + ','.join(m for m in {lazy!r} if m in sys.modules))")
+    loaded = _run_python(probe)[1].strip().splitlines()[-1][len("LOADED:"):]
+    return loaded.split(",") if loaded else []
+
+
+def bench_startup(runs: int = DEFAULT_ITERATIONS) -> dict:
+    """
+    Time CLI cold start and check that heavy modules stay unloaded
+    
+    Each case runs in a fresh interpreter. overhead_ms compares the fastest
+    run with the fastest bare interpreter start, so it tracks ScreenSnap's
+    own cost rather than the host's Python or scheduling noise.
+    
+    Args:
+        runs: Interpreter launches per case
+    
+    Returns:
+        JSON-serializable dict; each case lists eagerly loaded modules
+        under "unexpected_modules" (should be empty)
+    
+    Raises:
+        ValueError: If runs is not positive
+    """
+    import statistics
+    
+    if runs < 1:
+        raise ValueError(f"Runs must be at least 1, got {runs}")
+    # Installed copies start from bytecode; don't time compiling the source
+    import py_compile
+    py_compile.compile(str(Path(__file__).resolve().parent / "screensnap.py"))
+    
+    baseline = min(_run_python("pass")[0] for _ in range(runs))
+    
+    cases = {}
+    for case, code in STARTUP_CASES.items():
+        durations = [_run_python(code)[0] for _ in range(runs)]
+        median = statistics.median(durations)
+        overhead = (min(durations) - baseline) * 1000
+        cases[case] = {
+            "median_ms": round(median * 1000, 3),
+            "min_ms": round(min(durations) * 1000, 3),
+            "overhead_ms": round(overhead, 3),
+            "within_budget": overhead < STARTUP_BUDGET_MS,
+            "unexpected_modules": startup_modules(case),
+        }
+    return {
+        "runs": runs,
+        "interpreter_ms": round(baseline * 1000, 3),
+        "budget_ms": STARTUP_BUDGET_MS,
+        "cases": cases,
+    }
+
+
+def run_benchmark(scenes: Optional[list] = None, backends: Optional[list] = None,
+                  formats: Optional[list] = None, encoders: Optional[list] = None,
+                  profiles: Optional[list] = None,
+                  iterations: int = DEFAULT_ITERATIONS,
+                  progress=None) -> dict:
+    """
+    Run the benchmark matrix
+    
+    Synthetic cases render each scene; any other backend captures the live
+    display once per format/encoder/profile (the scene does not apply).
+    The parallel encoder is PNG-only and is skipped for JPEG.
+    
+    Args:
+        scenes: Scene names or WIDTHxHEIGHT (default: all named scenes)
+        backends: Capture backends (default: synthetic)
+        formats: Output formats (default: png, jpg)
+        encoders: PNG encoders (default: pillow)
+        profiles: Compression profiles (default: balanced)
+        iterations: Timed rounds per case
+        progress: Optional callable(case_dict) called after each case
+    
+    Returns:
+        JSON-serializable dict with host info and one result per case
+    
+    Raises:
+        ValueError: If any option is invalid
+    """
+    import PIL
+    
+    if iterations < 1:
+        raise ValueError(f"Iterations must be at least 1, got {iterations}")
+    scenes = scenes or list(BENCH_SCENES)
+    scene_options = {scene: parse_scene(scene) for scene in scenes}
+    backends = backends or ["synthetic"]
+    formats = formats or ["png", "jpg"]
+    encoders = encoders or ["pillow"]
+    profiles = [validate_profile(p) for p in (profiles or ["balanced"])]
+    
+    results = []
+    with tempfile.TemporaryDirectory(prefix="screensnap-bench-") as tmp:
+        for backend in backends:
+            backend_scenes = scenes if backend == "synthetic" else ["display"]
+            for scene in backend_scenes:
+                for fmt in formats:
+                    for encoder in encoders:
+                        if encoder != "pillow" and fmt != "png":
+                            continue
+                        for profile in profiles:
+                            # Point at a missing config so ~/.screensnaprc cannot skew results
+                            with ScreenSnap(output_dir=tmp, format=fmt,
+                                            config_path=Path(tmp) / ".screensnaprc",
+                                            backend=backend,
+                                            backend_options=scene_options.get(scene, {}),
+                                            encoder=encoder, profile=profile) as snap:
+                                case = {"scene": scene, "backend": backend,
+                                        "format": fmt, "encoder": encoder,
+                                        "profile": profile}
+                                case.update(bench_case(snap, iterations))
+                            results.append(case)
+                            if progress:
+                                progress(case)
+    
+    return {
+        "screensnap": VERSION,
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+
+def main(argv: Optional[list] = None):
+    """Entry point for ``screensnap bench``"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        prog="screensnap bench",
+        description="Benchmark ScreenSnap grab/convert/encode/write stages",
+    )
+    parser.add_argument(
+        "--scenes",
+        nargs="+",
+        metavar="SCENE",
+        help=f"Scenes: {', '.join(BENCH_SCENES)} or WIDTHxHEIGHT (default: all named)"
+    )
+    parser.add_argument(
+        "--backends",
+        nargs="+",
+        metavar="BACKEND",
+        help="Capture backends (default: synthetic; others need a display)"
+    )
+    parser.add_argument(
+        "--formats",
+        nargs="+",
+        choices=BENCH_FORMATS,
+        help="Output formats (default: png jpg)"
+    )
+    parser.add_argument(
+        "--encoders",
+        nargs="+",
+        choices=PNG_ENCODERS,
+        help="PNG encoders (default: pillow)"
+    )
+    parser.add_argument(
+        "--profiles",
+        nargs="+",
+        choices=list(COMPRESSION_PROFILES),
+        help="Compression profiles (default: balanced)"
+    )
+    parser.add_argument(
+        "--iterations", "-n",
+        type=int,
+        default=DEFAULT_ITERATIONS,
+        help=f"Timed rounds per case (default: {DEFAULT_ITERATIONS})"
+    )
+    parser.add_argument(
+        "--startup",
+        action="store_true",
+        help="Benchmark CLI cold start (import, --version, --help) instead"
+    )
+    parser.add_argument(
+        "--output", "-o",
+        metavar="FILE",
+        help="Write JSON results to FILE instead of stdout"
+    )
+    args = parser.parse_args(argv)
+    
+    def report(case):
+        stages = "  ".join(f"{stage} {case['stages'][stage]['median_ms']:.1f}ms"
+                           for stage in BENCH_STAGES)
+        print(f"{case['scene']:>8} {case['backend']:<10} {case['format']:<4} "
+              f"{case['encoder']:<8} {case['profile']:<8} {stages}  "
+              f"{case['bytes']} bytes", file=sys.stderr)
+    
+    try:
+        if args.startup:
+            results = bench_startup(args.iterations)
+            results.update({"screensnap": VERSION, "python": platform.python_version()})
+        else:
+            results = run_benchmark(args.scenes, args.backends, args.formats,
+                                    args.encoders, args.profiles, args.iterations,
+                                    progress=report)
+    except Exception as e:
+        print(f"❌ Error: {e}", file=sys.stderr)
+        return 1
+    
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+        print(f"✅ Results saved to: {Path(args.output).absolute()}", file=sys.stderr)
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
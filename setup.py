@@ -12,7 +12,7 @@ setup(
     long_description=long_description,
     long_description_content_type="text/markdown",
     url="https://github.com/DonkRonk17/ScreenSnap",
-    py_modules=["screensnap"],
+    py_modules=["screensnap", "screensnap_bench"],
     classifiers=[
         "Programming Language :: Python :: 3",
         "Programming Language :: Python :: 3.8",
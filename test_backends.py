@@ -0,0 +1,286 @@
+"""
+Capture backend tests for ScreenSnap
+Purpose: Confirm backend selection works without a real display
+"""
+
+import sys
+sys.path.insert(0, '.')
+
+import json
+import tempfile
+from pathlib import Path
+
+
+def test_synthetic_capture():
+    """Test capture through the synthetic backend"""
+    from screensnap import ScreenSnap
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        with ScreenSnap(output_dir=tmp, backend="synthetic",
+                        backend_options={"width": 320, "height": 200},
+                        config_path=Path(tmp) / ".screensnaprc") as snap:
+            filepath = snap.capture("synthetic.png")
+            assert filepath.exists() and filepath.stat().st_size > 0
+            
+            from PIL import Image
+            with Image.open(filepath) as image:
+                assert image.size == (320, 200)
+    print("[OK] Synthetic backend capture works")
+
+
+def test_synthetic_deterministic():
+    """Test synthetic frames are reproducible and change per grab"""
+    from screensnap import create_backend
+    
+    first = create_backend("synthetic", width=200, height=150, seed=7)
+    second = create_backend("synthetic", width=200, height=150, seed=7)
+    frame_a = first.grab()
+    frame_b = second.grab()
+    assert frame_a.tobytes() == frame_b.tobytes()
+    assert first.grab().tobytes() != frame_a.tobytes()
+    print("[OK] Synthetic frames are deterministic")
+
+
+def test_invalid_backend():
+    """Test unknown backend names are rejected"""
+    from screensnap import ScreenSnap
+    
+    try:
+        ScreenSnap(backend="does_not_exist")
+    except ValueError as e:
+        assert "invalid backend" in str(e).lower()
+        print("[OK] Invalid backend rejected")
+        return
+    raise AssertionError("Invalid backend accepted")
+
+
+def test_backend_from_config():
+    """Test backend is read from the config file"""
+    from screensnap import ScreenSnap, SyntheticBackend
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        config_path = Path(tmp) / ".screensnaprc"
+        config_path.write_text(json.dumps({
+            "output_dir": tmp,
+            "backend": "synthetic",
+            "backend_options": {"width": 64, "height": 48}
+        }))
+        snap = ScreenSnap(config_path=config_path)
+        assert isinstance(snap.backend, SyntheticBackend)
+        assert snap.backend.grab().size == (64, 48)
+        snap.close()
+    print("[OK] Backend loaded from config")
+
+
+def test_xshm_without_display():
+    """Test the MIT-SHM backend fails cleanly when no X server is reachable"""
+    from screensnap import create_backend
+    
+    backend = create_backend("xshm", display=":4242")
+    try:
+        backend.grab()
+    except (RuntimeError, ImportError) as e:
+        print(f"[OK] xshm without display rejected: {type(e).__name__}")
+        return
+    # A real X server answered on :4242 - still a successful grab
+    backend.close()
+    print("[OK] xshm captured from live display")
+
+
+def test_xshm_error_handler():
+    """Test the shared X error handler is restored when the last user closes"""
+    import ctypes
+    from screensnap import XShmBackend
+    
+    try:
+        x11 = XShmBackend._load_libraries()[0]
+    except (ImportError, OSError):
+        print("[SKIP] X11 client libraries not installed")
+        return
+    original = x11.XSetErrorHandler(None)
+    x11.XSetErrorHandler(original)
+    
+    first = XShmBackend._acquire_error_handler(x11, 1)
+    second = XShmBackend._acquire_error_handler(x11, 2)
+    assert first is not second
+    ours = ctypes.cast(XShmBackend._error_handler, ctypes.c_void_p).value
+    XShmBackend._release_error_handler(x11, 1)
+    assert x11.XSetErrorHandler(XShmBackend._error_handler) == ours
+    XShmBackend._release_error_handler(x11, 2)
+    assert x11.XSetErrorHandler(original) == original
+    assert XShmBackend._error_handler is None and not XShmBackend._errors_by_display
+    print("[OK] X error handler restored")
+
+
+def test_region_capture():
+    """Test region capture returns only the requested pixels"""
+    from screensnap import ScreenSnap, create_backend
+    from PIL import Image
+    
+    full = create_backend("synthetic", width=320, height=200).grab()
+    with tempfile.TemporaryDirectory() as tmp:
+        with ScreenSnap(output_dir=tmp, backend="synthetic",
+                        backend_options={"width": 320, "height": 200},
+                        config_path=Path(tmp) / ".screensnaprc") as snap:
+            filepath = snap.capture("region.png", region=(10, 20, 100, 50))
+            with Image.open(filepath) as image:
+                # Frame 1 in both backends; the clock area lies outside the region
+                assert image.size == (100, 50)
+                assert image.tobytes() == full.crop((10, 20, 110, 70)).tobytes()
+            
+            for bad in ((0, 0, 0, 10), (-1, 0, 5, 5), (300, 0, 50, 50), "1,2,3"):
+                try:
+                    snap.capture(region=bad)
+                    raise AssertionError(f"Accepted region {bad}")
+                except ValueError:
+                    pass
+    print("[OK] Region capture works")
+
+
+def test_framebuffer_region():
+    """Test the framebuffer backend reads a region from a raw device"""
+    from screensnap import create_backend
+    from PIL import Image
+    
+    source = create_backend("synthetic", width=64, height=40).grab()
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        stride = 64 * 4 + 32  # Padded rows, like real framebuffers
+        rows = source.convert('RGBA').tobytes('raw', 'BGRA')
+        with open(tmp / "fb", 'wb') as f:
+            for y in range(40):
+                f.write(rows[y * 256:(y + 1) * 256] + b"\0" * 32)
+        sysfs = tmp / "sysfs"
+        sysfs.mkdir()
+        (sysfs / "virtual_size").write_text("64,40\n")
+        (sysfs / "bits_per_pixel").write_text("32\n")
+        (sysfs / "stride").write_text(f"{stride}\n")
+        
+        backend = create_backend("framebuffer", device=str(tmp / "fb"), sysfs=str(sysfs))
+        try:
+            assert backend.grab().tobytes() == source.tobytes()
+            region = backend.grab((5, 7, 20, 10))
+            assert region.tobytes() == source.crop((5, 7, 25, 17)).tobytes()
+        finally:
+            backend.close()
+    print("[OK] Framebuffer region capture works")
+
+
+def test_monitor_capture():
+    """Test monitor enumeration and per-monitor capture"""
+    from screensnap import ScreenSnap, main
+    from PIL import Image
+    
+    layout = [[320, 200], [400, 240]]
+    with tempfile.TemporaryDirectory() as tmp:
+        with ScreenSnap(output_dir=tmp, backend="synthetic",
+                        backend_options={"monitors": layout},
+                        config_path=Path(tmp) / ".screensnaprc") as snap:
+            monitors = snap.list_monitors()
+            assert [(m["x"], m["width"], m["height"]) for m in monitors] == [
+                (0, 320, 200), (320, 400, 240)
+            ]
+            assert monitors[0]["primary"] and not monitors[1]["primary"]
+            
+            paths = snap.capture_all_monitors("multi")
+            assert [p.name for p in paths] == ["multi_mon1.png", "multi_mon2.png"]
+            sizes = []
+            for path in paths:
+                with Image.open(path) as image:
+                    sizes.append(image.size)
+            assert sizes == [(320, 200), (400, 240)]
+            
+            with Image.open(snap.capture_monitor(2, "second.png")) as image:
+                assert image.size == (400, 240)
+            try:
+                snap.capture_monitor(3)
+                raise AssertionError("Accepted monitor 3 of 2")
+            except ValueError:
+                pass
+        
+        # Monitors count from 1: --monitor 0 is an error, not the full screen
+        out = Path(tmp) / "cli"
+        assert main(["--backend", "synthetic", "--output-dir", str(out),
+                     "--monitor", "0"]) == 1
+        assert not out.exists() or not any(out.iterdir())
+        assert main(["--backend", "synthetic", "--output-dir", str(out),
+                     "--monitor", "1"]) == 0
+    print("[OK] Monitor capture works")
+
+
+def test_register_backend():
+    """Test third-party backends can be registered"""
+    from screensnap import (CaptureBackend, CAPTURE_BACKENDS,
+                            register_backend, create_backend)
+    
+    @register_backend
+    class SolidBackend(CaptureBackend):
+        name = "solid_test"
+        
+        def _grab(self):
+            from PIL import Image
+            return Image.new('RGB', (8, 8), (255, 0, 0))
+    
+    try:
+        assert create_backend("solid_test").grab().getpixel((0, 0)) == (255, 0, 0)
+    finally:
+        del CAPTURE_BACKENDS["solid_test"]
+    print("[OK] Custom backend registration works")
+
+
+def test_auto_backend_fallback():
+    """Test "auto" moves on when an available backend fails to open"""
+    import screensnap
+    from screensnap import (CaptureBackend, CAPTURE_BACKENDS, SyntheticBackend,
+                            register_backend, create_backend)
+    
+    @register_backend
+    class RemoteOnlyBackend(CaptureBackend):
+        name = "remote_test"
+        
+        def open(self):
+            raise RuntimeError("XShmAttach failed (is the X server remote?)")
+    
+    order = screensnap.AUTO_BACKEND_ORDER
+    screensnap.AUTO_BACKEND_ORDER = ["remote_test", "synthetic"]
+    try:
+        backend = create_backend("auto", width=32, height=16)
+        assert isinstance(backend, SyntheticBackend)
+        assert backend.grab().size == (32, 16)
+    finally:
+        screensnap.AUTO_BACKEND_ORDER = order
+        del CAPTURE_BACKENDS["remote_test"]
+    print("[OK] Auto backend falls back when open fails")
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("ScreenSnap - Backend Tests")
+    print("=" * 60)
+    
+    tests = [
+        test_synthetic_capture,
+        test_synthetic_deterministic,
+        test_invalid_backend,
+        test_backend_from_config,
+        test_xshm_without_display,
+        test_xshm_error_handler,
+        test_region_capture,
+        test_framebuffer_region,
+        test_monitor_capture,
+        test_register_backend,
+        test_auto_backend_fallback
+    ]
+    
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"[FAIL] {test.__name__}: {e}")
+    
+    print("=" * 60)
+    print(f"Results: {passed}/{len(tests)} tests passed")
+    print("=" * 60)
+    sys.exit(0 if passed == len(tests) else 1)
@@ -0,0 +1,108 @@
+"""
+Benchmark tests for ScreenSnap
+Purpose: Confirm the benchmark runs without a display and emits valid JSON
+"""
+
+import sys
+sys.path.insert(0, '.')
+
+import io
+import json
+import tempfile
+from contextlib import redirect_stdout, redirect_stderr
+from pathlib import Path
+
+
+def test_run_benchmark():
+    """Test the benchmark matrix and per-stage statistics"""
+    from screensnap_bench import run_benchmark, BENCH_STAGES
+    
+    seen = []
+    report = run_benchmark(scenes=["320x200"], formats=["png", "jpg"],
+                           encoders=["pillow", "parallel"], iterations=2,
+                           progress=seen.append)
+    cases = [(r["format"], r["encoder"]) for r in report["results"]]
+    # The parallel encoder is PNG-only
+    assert cases == [("png", "pillow"), ("png", "parallel"), ("jpg", "pillow")]
+    assert len(seen) == 3
+    for result in report["results"]:
+        assert (result["width"], result["height"]) == (320, 200)
+        assert result["bytes"] > 0 and result["iterations"] == 2
+        assert list(result["stages"]) == BENCH_STAGES
+        for stats in result["stages"].values():
+            assert 0 <= stats["min_ms"] <= stats["median_ms"] <= stats["max_ms"]
+    json.dumps(report)
+    print("[OK] Benchmark matrix runs")
+
+
+def test_bench_validation():
+    """Test invalid scenes and iteration counts are rejected"""
+    from screensnap_bench import run_benchmark, parse_scene
+    
+    assert parse_scene("multi")["monitors"][2] == [3840, 2160]
+    for bad in ({"scenes": ["8k"]}, {"scenes": ["0x10"]}, {"iterations": 0}):
+        try:
+            run_benchmark(**bad)
+            raise AssertionError(f"Accepted {bad}")
+        except ValueError:
+            pass
+    print("[OK] Benchmark options validated")
+
+
+def test_bench_cli():
+    """Test `screensnap bench` writes machine-readable JSON"""
+    from screensnap import main
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        output = Path(tmp) / "bench.json"
+        with redirect_stderr(io.StringIO()):
+            code = main(["bench", "--scenes", "160x120", "--formats", "jpg",
+                         "--iterations", "1", "--output", str(output)])
+        assert code == 0
+        report = json.loads(output.read_text())
+        assert report["results"][0]["scene"] == "160x120"
+    
+    stdout = io.StringIO()
+    with redirect_stdout(stdout), redirect_stderr(io.StringIO()):
+        assert main(["bench", "--scenes", "64x48", "--formats", "png", "-n", "1"]) == 0
+    assert json.loads(stdout.getvalue())["results"][0]["format"] == "png"
+    print("[OK] Bench CLI emits JSON")
+
+
+def test_cold_start_guard():
+    """Test CLI start-up leaves capture, storage and daemon modules unloaded"""
+    from screensnap_bench import bench_startup, STARTUP_BUDGET_MS
+    
+    report = bench_startup(runs=1)
+    for case, result in report["cases"].items():
+        assert result["unexpected_modules"] == [], (case, result)
+    # Timing is host-dependent: reported, not asserted
+    overhead = report["cases"]["version"]["overhead_ms"]
+    print(f"[OK] Cold start stays lazy "
+          f"(--version +{overhead:.0f} ms, budget {STARTUP_BUDGET_MS:.0f} ms)")
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("ScreenSnap - Benchmark Tests")
+    print("=" * 60)
+    
+    tests = [
+        test_run_benchmark,
+        test_bench_validation,
+        test_bench_cli,
+        test_cold_start_guard
+    ]
+    
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"[FAIL] {test.__name__}: {e}")
+    
+    print("=" * 60)
+    print(f"Results: {passed}/{len(tests)} tests passed")
+    print("=" * 60)
+    sys.exit(0 if passed == len(tests) else 1)
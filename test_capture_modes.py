@@ -0,0 +1,340 @@
+"""
+Capture mode tests for ScreenSnap
+Purpose: Confirm burst and other multi-frame capture modes work headless
+"""
+
+import sys
+sys.path.insert(0, '.')
+
+import tempfile
+from pathlib import Path
+
+
+def _synthetic_snap(tmp, **kwargs):
+    from screensnap import ScreenSnap
+    # A config path that doesn't exist: defaults, not ~/.screensnaprc
+    return ScreenSnap(output_dir=tmp, backend="synthetic",
+                      config_path=Path(tmp) / ".screensnaprc",
+                      backend_options={"width": 160, "height": 120}, **kwargs)
+
+
+def test_burst_capture():
+    """Test burst saves every frame and reports pacing"""
+    with tempfile.TemporaryDirectory() as tmp:
+        with _synthetic_snap(tmp) as snap:
+            result = snap.capture_burst(5, fps=50, prefix="glitch.png")
+        
+        assert [p.name for p in result.paths] == [
+            f"glitch_{i:04d}.png" for i in range(5)
+        ]
+        assert all(p.exists() and p.stat().st_size > 0 for p in result.paths)
+        
+        stats = result.summary()
+        assert stats["frames"] == 5
+        # Paced on fixed slots: 4 intervals of 20 ms can't finish much faster
+        assert 0 < stats["achieved_fps"] < 60
+        assert stats["jitter_ms"] >= 0
+    print(f"[OK] Burst capture works ({stats['achieved_fps']} fps)")
+
+
+def test_burst_validation():
+    """Test invalid burst parameters are rejected before grabbing"""
+    import contextlib
+    import io
+    from screensnap import main
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        with _synthetic_snap(tmp) as snap:
+            for kwargs in ({"count": 0}, {"count": 3, "fps": 0},
+                           {"count": 3, "prefix": "../escape"}):
+                try:
+                    snap.capture_burst(**kwargs)
+                    raise AssertionError(f"Accepted invalid burst {kwargs}")
+                except ValueError:
+                    pass
+            assert not snap.backend._opened
+        
+        # Multi-frame modes capture the full screen; a region is refused
+        # rather than silently ignored. Zero counts and intervals are
+        # errors, not a single normal screenshot.
+        bad_args = [["--region", "0,0,10,10", *mode]
+                    for mode in (["--burst", "2"], ["--interval", "1"], ["--record", "1"],
+                                 ["--burst", "0"])]
+        bad_args += [["--burst", "0"], ["--interval", "0"], ["--record", "-1"],
+                     ["--burst", "3", "--fps", "0"], ["--burst", "0", "--session"]]
+        for args in bad_args:
+            try:
+                with contextlib.redirect_stderr(io.StringIO()):
+                    main(["--backend", "synthetic", "--output-dir", tmp, *args])
+                raise AssertionError(f"Accepted {' '.join(args)}")
+            except SystemExit as e:
+                assert e.code == 2
+        assert not any(Path(tmp).iterdir())
+    print("[OK] Invalid burst parameters rejected")
+
+
+def test_capture_async():
+    """Test background encoding returns futures for the saved paths"""
+    with tempfile.TemporaryDirectory() as tmp:
+        with _synthetic_snap(tmp, encoder_workers=2, max_pending=2) as snap:
+            futures = [snap.capture_async(f"async_{i}.png") for i in range(6)]
+            snap.flush()
+            assert all(f.done() for f in futures)
+            paths = [f.result() for f in futures]
+        assert [p.name for p in paths] == [f"async_{i}.png" for i in range(6)]
+        assert all(p.exists() and p.stat().st_size > 0 for p in paths)
+    print("[OK] Async capture pipeline works")
+
+
+def test_capture_async_validation():
+    """Test filename errors are raised synchronously"""
+    with tempfile.TemporaryDirectory() as tmp:
+        with _synthetic_snap(tmp) as snap:
+            try:
+                snap.capture_async("bad:name.png")
+                raise AssertionError("Invalid filename accepted")
+            except ValueError:
+                pass
+    print("[OK] Async capture validates filenames up front")
+
+
+def test_pipeline_save_errors():
+    """Test encoder failures surface through the future"""
+    from pathlib import Path
+    from PIL import Image
+    from screensnap import EncodePipeline
+    
+    def failing_save(image, filepath):
+        raise OSError("disk full")
+    
+    pipeline = EncodePipeline(failing_save, workers=1, max_pending=1)
+    future = pipeline.submit(Image.new('RGB', (4, 4)), Path("never.png"))
+    pipeline.close()
+    try:
+        future.result()
+        raise AssertionError("Save error swallowed")
+    except RuntimeError as e:
+        assert "disk full" in str(e)
+    print("[OK] Encoder errors reach the caller")
+
+
+def test_flight_recorder_dump():
+    """Test the recorder reconstructs buffered frames exactly"""
+    from screensnap import FlightRecorder
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        with _synthetic_snap(tmp) as snap:
+            recorder = FlightRecorder(snap, seconds=60, keyframe_interval=3)
+            originals = []
+            for _ in range(7):
+                frame = snap.backend.grab()
+                originals.append(frame)
+                recorder.record_frame(frame)
+            
+            decoded = [image for _, image in recorder.frames()]
+            assert [im.tobytes() for im in decoded] == [im.tobytes() for im in originals]
+            
+            paths = recorder.dump("incident")
+            assert [p.name for p in paths] == [f"incident_{i:04d}.png" for i in range(7)]
+            assert all(p.exists() for p in paths)
+    print("[OK] Flight recorder dump works")
+
+
+def test_flight_recorder_budget():
+    """Test the recorder stays within its byte budget"""
+    from screensnap import FlightRecorder
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        with _synthetic_snap(tmp) as snap:
+            # Room for about two keyframe groups
+            recorder = FlightRecorder(snap, seconds=60, max_bytes=5000,
+                                      keyframe_interval=4)
+            largest_frame = 0
+            for _ in range(40):
+                recorder.record_frame()
+                largest_frame = max(largest_frame, len(recorder._frames[-1][6]))
+                assert recorder.memory_bytes <= recorder.max_bytes + 2 * largest_frame
+            assert recorder.frames_evicted > 0
+            assert recorder.frames()[-1][1].size == (160, 120)
+    print(f"[OK] Flight recorder capped at {recorder.memory_bytes} bytes")
+
+
+def test_flight_recorder_background():
+    """Test background recording keeps grabbing until stopped"""
+    import time
+    from screensnap import FlightRecorder
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        with _synthetic_snap(tmp) as snap:
+            with FlightRecorder(snap, seconds=5, fps=50) as recorder:
+                time.sleep(0.2)
+            count = recorder.frame_count
+            assert count > 0
+            time.sleep(0.05)
+            assert recorder.frame_count == count
+    print(f"[OK] Background recording captured {count} frames")
+
+
+def test_skip_unchanged():
+    """Test identical auto-named frames are not written again"""
+    from PIL import Image
+    from screensnap import CaptureBackend, ScreenSnap
+    
+    class StaticBackend(CaptureBackend):
+        """Returns a fixed frame; flips one pixel when asked"""
+        changed = False
+        
+        def _grab(self):
+            image = Image.new('RGB', (200, 100), (10, 20, 30))
+            if self.changed:
+                image.putpixel((150, 90), (11, 20, 30))
+            return image
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        snap = ScreenSnap(output_dir=tmp, skip_unchanged=True,
+                          backend="synthetic", config_path=Path(tmp) / ".screensnaprc")
+        snap.backend = StaticBackend()
+        
+        first = snap.capture()
+        assert snap.capture() == first
+        assert snap.capture_async().result() == first
+        assert snap.frames_skipped == 2
+        
+        # Explicit names are always written
+        named = snap.capture("named.png")
+        assert named.name == "named.png" and named.exists()
+        
+        # A single changed pixel is detected
+        snap.backend.changed = True
+        assert snap.capture() != named
+        assert snap.frames_skipped == 2
+        snap.close()
+    print("[OK] Unchanged frames skipped")
+
+
+def test_failed_capture_cleanup():
+    """Test failed captures leave no auto-named file behind"""
+    with tempfile.TemporaryDirectory() as tmp:
+        with _synthetic_snap(tmp, skip_unchanged=True) as snap:
+            encode = snap._encode_image
+            snap._encode_image = lambda image: (_ for _ in ()).throw(OSError("disk full"))
+            try:
+                snap.capture_async().result()
+                raise AssertionError("Failed async save did not raise")
+            except RuntimeError:
+                pass
+            assert not any(Path(tmp).iterdir())
+            
+            # The failed frame is not the "last saved" one, so it is written
+            snap._encode_image = encode
+            saved = snap.capture_async().result()
+            assert saved.exists() and snap.frames_skipped == 0
+            
+            snap.backend.grab_monitor = lambda monitor: (_ for _ in ()).throw(OSError("gone"))
+            try:
+                snap.capture_monitor(1)
+                raise AssertionError("Failed monitor grab did not raise")
+            except RuntimeError:
+                pass
+            assert list(Path(tmp).iterdir()) == [saved]
+            
+            # Encoder ValueErrors (e.g. from PIL) are re-raised as-is, but
+            # still clean up and reset change detection
+            snap._encode_image = lambda image: (_ for _ in ()).throw(ValueError("bad mode"))
+            try:
+                snap.capture()
+                raise AssertionError("Failed save did not raise")
+            except ValueError:
+                pass
+            assert list(Path(tmp).iterdir()) == [saved]
+            snap._encode_image = encode
+            retry = snap.capture()
+            assert retry != saved and retry.stat().st_size > 0
+    print("[OK] Failed captures cleaned up")
+
+
+def test_capture_periodic():
+    """Test timer mode captures on schedule"""
+    with tempfile.TemporaryDirectory() as tmp:
+        with _synthetic_snap(tmp) as snap:
+            seen = []
+            paths = snap.capture_periodic(0.01, count=3, on_capture=seen.append)
+            assert 1 <= len(paths) <= 3 and seen == paths
+    print("[OK] Periodic capture works")
+
+
+def test_capture_timing():
+    """Test timing records reach hooks for saved, skipped and failed captures"""
+    from screensnap import ScreenSnap, CAPTURE_STAGES
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        with ScreenSnap(output_dir=tmp, backend="synthetic", skip_unchanged=True,
+                        backend_options={"width": 320, "height": 200},
+                        config_path=Path(tmp) / ".screensnaprc") as snap:
+            records = []
+            snap.add_timing_hook(records.append)
+            
+            @snap.add_timing_hook
+            def broken_hook(timing):
+                raise RuntimeError("hook bug")
+            
+            filepath = snap.capture("timed.png", region=(0, 0, 100, 50))
+            timing = records[-1]
+            assert timing is snap.last_timing and timing.error is None
+            assert timing.path == filepath and not timing.skipped
+            assert (timing.width, timing.height) == (100, 50)
+            assert timing.bytes == filepath.stat().st_size
+            assert set(timing.stages) == set(CAPTURE_STAGES)
+            assert timing.stages["grab"] > 0 and timing.stages["encode"] > 0
+            assert timing.total >= sum(timing.stages.values())
+            
+            # Window fallback is recorded against the requested title
+            snap.capture_window("No Such Window")
+            assert records[-1].window == "No Such Window"
+            
+            snap.remove_timing_hook(broken_hook)
+            snap.backend.close()
+            snap.backend.grab = lambda region=None: (_ for _ in ()).throw(OSError("gone"))
+            try:
+                snap.capture()
+                raise AssertionError("Failed capture did not raise")
+            except RuntimeError:
+                pass
+            assert records[-1].error == "OSError" and records[-1].path is None
+            assert records[-1].to_dict()["error"] == "OSError"
+            assert len(records) == 3
+    print("[OK] Capture timing hooks work")
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("ScreenSnap - Capture Mode Tests")
+    print("=" * 60)
+    
+    tests = [
+        test_burst_capture,
+        test_burst_validation,
+        test_capture_async,
+        test_capture_async_validation,
+        test_pipeline_save_errors,
+        test_flight_recorder_dump,
+        test_flight_recorder_budget,
+        test_flight_recorder_background,
+        test_skip_unchanged,
+        test_failed_capture_cleanup,
+        test_capture_periodic,
+        test_capture_timing
+    ]
+    
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"[FAIL] {test.__name__}: {e}")
+    
+    print("=" * 60)
+    print(f"Results: {passed}/{len(tests)} tests passed")
+    print("=" * 60)
+    sys.exit(0 if passed == len(tests) else 1)
@@ -0,0 +1,156 @@
+"""
+Daemon mode tests for ScreenSnap
+Purpose: Confirm the Unix-socket capture service and thin client work
+"""
+
+import sys
+sys.path.insert(0, '.')
+
+import socket
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+
+def _start_daemon(tmp):
+    """Start a synthetic-backend daemon in a background thread"""
+    from screensnap import ScreenSnap, ScreenSnapDaemon, ScreenSnapClient
+    
+    snap = ScreenSnap(output_dir=tmp, backend="synthetic",
+                      backend_options={"width": 160, "height": 120},
+                      config_path=Path(tmp) / ".screensnaprc")
+    daemon = ScreenSnapDaemon(snap, Path(tmp) / "snap.sock")
+    thread = threading.Thread(target=daemon.serve_forever, daemon=True)
+    thread.start()
+    
+    client = ScreenSnapClient(daemon.socket_path, timeout=5.0)
+    for _ in range(100):
+        if client.ping():
+            break
+        time.sleep(0.02)
+    return daemon, client, thread
+
+
+def test_daemon_capture():
+    """Test captures round-trip through the daemon"""
+    if not hasattr(socket, "AF_UNIX"):
+        print("[SKIP] Unix sockets not available")
+        return
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        daemon, client, thread = _start_daemon(tmp)
+        try:
+            first = client.capture("daemon_a.png")
+            second = client.capture()
+            assert first.exists() and first.name == "daemon_a.png"
+            assert second.exists() and "screenshot_" in second.name
+            assert client.last_timing["path"] == str(second)
+            assert client.last_timing["stages_ms"]["encode"] > 0
+        finally:
+            client.shutdown()
+            thread.join(timeout=5)
+        assert not thread.is_alive()
+        assert not daemon.socket_path.exists()
+    print("[OK] Daemon capture round trip works")
+
+
+def test_daemon_validation_errors():
+    """Test validation errors come back as ValueError"""
+    if not hasattr(socket, "AF_UNIX"):
+        print("[SKIP] Unix sockets not available")
+        return
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        daemon, client, thread = _start_daemon(tmp)
+        try:
+            try:
+                client.capture("../../escape.png")
+                raise AssertionError("Path traversal accepted by daemon")
+            except ValueError as e:
+                assert "path components" in str(e).lower()
+        finally:
+            client.shutdown()
+            thread.join(timeout=5)
+    print("[OK] Daemon propagates validation errors")
+
+
+def test_client_without_daemon():
+    """Test client reports a missing daemon clearly"""
+    from screensnap import ScreenSnapClient
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        client = ScreenSnapClient(Path(tmp) / "missing.sock", timeout=1.0)
+        assert client.ping() is False
+        try:
+            client.capture()
+            raise AssertionError("Capture succeeded without a daemon")
+        except RuntimeError as e:
+            assert "not reachable" in str(e)
+    print("[OK] Missing daemon reported")
+
+
+def test_capture_metrics():
+    """Test Prometheus metrics from captures, as text file and over HTTP"""
+    from screensnap import ScreenSnap, CaptureMetrics
+    import urllib.request
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        with ScreenSnap(output_dir=tmp, backend="synthetic",
+                        backend_options={"width": 160, "height": 120},
+                        config_path=Path(tmp) / ".screensnaprc") as snap:
+            metrics = CaptureMetrics().attach(snap)
+            first = snap.capture("m1.png")
+            snap.capture("m2.png")
+            try:
+                snap.capture("bad/name.png")
+            except ValueError:
+                pass
+            
+            text = metrics.render()
+            assert 'screensnap_captures_total{kind="screen"} 3' in text
+            assert 'screensnap_capture_failures_total{exception="ValueError"} 1' in text
+            assert 'screensnap_capture_duration_seconds_bucket{le="+Inf"} 2' in text
+            assert 'screensnap_stage_duration_seconds_count{stage="encode"} 2' in text
+            assert "screensnap_frames_skipped_total 0" in text
+            assert "screensnap_encode_queue_depth 0" in text
+            written = int(text.split("\nscreensnap_bytes_written_total ")[1].split()[0])
+            assert written > first.stat().st_size
+            
+            textfile = Path(tmp) / "screensnap.prom"
+            metrics.start_textfile(textfile, interval=60)
+            host, port = metrics.serve_http(0)
+            try:
+                with urllib.request.urlopen(f"http://{host}:{port}/metrics",
+                                            timeout=5) as response:
+                    assert response.read().decode() == metrics.render()
+            finally:
+                metrics.close()
+            assert textfile.read_text() == metrics.render()
+    print("[OK] Capture metrics exported")
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("ScreenSnap - Daemon Tests")
+    print("=" * 60)
+    
+    tests = [
+        test_daemon_capture,
+        test_daemon_validation_errors,
+        test_client_without_daemon,
+        test_capture_metrics
+    ]
+    
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"[FAIL] {test.__name__}: {e}")
+    
+    print("=" * 60)
+    print(f"Results: {passed}/{len(tests)} tests passed")
+    print("=" * 60)
+    sys.exit(0 if passed == len(tests) else 1)
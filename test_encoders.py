@@ -0,0 +1,283 @@
+"""
+Encoder tests for ScreenSnap
+Purpose: Confirm alternative encoders write standard, pixel-exact files
+"""
+
+import sys
+sys.path.insert(0, '.')
+
+import json
+import tempfile
+import zlib
+from pathlib import Path
+
+
+def test_parallel_png_roundtrip():
+    """Test the parallel encoder decodes pixel-exact for every filter and mode"""
+    from screensnap import ParallelPngEncoder, create_backend
+    from PIL import Image
+    import io
+    
+    frame = create_backend("synthetic", width=333, height=217).grab()
+    for mode in ("RGB", "RGBA", "L", "LA"):
+        image = frame.convert(mode)
+        for png_filter in ("none", "sub", "up"):
+            with ParallelPngEncoder(workers=4, filter=png_filter,
+                                    min_strip_rows=8) as encoder:
+                data = encoder.encode(image)
+            with Image.open(io.BytesIO(data)) as decoded:
+                decoded.load()
+                assert decoded.mode == mode
+                assert decoded.tobytes() == image.tobytes(), (mode, png_filter)
+    
+    # Palette images are written as RGB
+    with ParallelPngEncoder(workers=2) as encoder:
+        data = encoder.encode(frame.convert('P'))
+    with Image.open(io.BytesIO(data)) as decoded:
+        assert decoded.mode == "RGB"
+    print("[OK] Parallel PNG encoder round-trips")
+
+
+def test_parallel_png_stream():
+    """Test strips form one valid zlib stream split across several IDATs"""
+    from screensnap import ParallelPngEncoder, create_backend
+    
+    frame = create_backend("synthetic", width=200, height=160).grab()
+    with ParallelPngEncoder(workers=4, min_strip_rows=16) as encoder:
+        data = encoder.encode(frame)
+    
+    chunks, pos = [], 8
+    while pos < len(data):
+        length = int.from_bytes(data[pos:pos + 4], "big")
+        chunks.append((data[pos + 4:pos + 8], data[pos + 8:pos + 8 + length]))
+        pos += 12 + length
+    idat = [body for kind, body in chunks if kind == b"IDAT"]
+    assert len(idat) == 8
+    # zlib.decompress verifies the combined Adler-32 trailer
+    raw = zlib.decompress(b"".join(idat))
+    assert len(raw) == 160 * (200 * 3 + 1)
+    print("[OK] Parallel PNG strips form a valid zlib stream")
+
+
+def test_parallel_png_threads():
+    """Test concurrent encode() calls share one pool that close() stops"""
+    from screensnap import ParallelPngEncoder, create_backend
+    from concurrent.futures import ThreadPoolExecutor
+    import threading
+    
+    frame = create_backend("synthetic", width=160, height=120).grab()
+    encoder = ParallelPngEncoder(workers=2, min_strip_rows=8)
+    start = threading.Barrier(6)
+    
+    def encode(_):
+        start.wait()
+        return encoder.encode(frame)
+    
+    with ThreadPoolExecutor(6) as callers:
+        assert len(set(callers.map(encode, range(6)))) == 1
+    encoder.close()
+    assert not [thread for thread in threading.enumerate()
+                if thread.name.startswith("screensnap-png")]
+    print("[OK] Parallel PNG encoder is thread-safe")
+
+
+def test_encoder_selection():
+    """Test the encoder is chosen from the constructor or config"""
+    from screensnap import ScreenSnap
+    from PIL import Image
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        config_path = Path(tmp) / ".screensnaprc"
+        config_path.write_text(json.dumps({"output_dir": tmp, "encoder": "parallel"}))
+        with ScreenSnap(config_path=config_path, backend="synthetic",
+                        backend_options={"width": 160, "height": 120}) as snap:
+            assert snap.encoder == "parallel"
+            filepath = snap.capture("parallel.png")
+            with Image.open(filepath) as image:
+                assert image.size == (160, 120)
+        
+        try:
+            ScreenSnap(output_dir=tmp, encoder="gpu",
+                       backend="synthetic", config_path=Path(tmp) / ".screensnaprc")
+            raise AssertionError("Invalid encoder accepted")
+        except ValueError as e:
+            assert "invalid encoder" in str(e).lower()
+    print("[OK] Encoder selected from config")
+
+
+def test_compression_profiles():
+    """Test profiles trade speed for size and come from the config"""
+    from screensnap import ScreenSnap
+    from PIL import Image
+    
+    options = {"width": 640, "height": 400, "seed": 3}
+    with tempfile.TemporaryDirectory() as tmp:
+        sizes = {}
+        for fmt in ("png", "jpg"):
+            for profile in ("fast", "small"):
+                with ScreenSnap(output_dir=tmp, format=fmt, profile=profile,
+                                backend="synthetic", backend_options=options,
+                                config_path=Path(tmp) / ".screensnaprc") as snap:
+                    filepath = snap.capture(f"{profile}_{fmt}")
+                sizes[fmt, profile] = filepath.stat().st_size
+                with Image.open(filepath) as image:
+                    assert image.size == (640, 400)
+        assert sizes["png", "small"] < sizes["png", "fast"]
+        assert sizes["jpg", "small"] < sizes["jpg", "fast"]
+        
+        config_path = Path(tmp) / ".screensnaprc"
+        config_path.write_text(json.dumps({"output_dir": tmp, "profile": "FAST"}))
+        assert ScreenSnap(config_path=config_path).profile == "fast"
+        assert ScreenSnap(config_path=config_path, profile="small").profile == "small"
+        try:
+            ScreenSnap(output_dir=tmp, profile="tiny",
+                       backend="synthetic", config_path=Path(tmp) / ".screensnaprc")
+            raise AssertionError("Invalid profile accepted")
+        except ValueError as e:
+            assert "invalid profile" in str(e).lower()
+    print("[OK] Compression profiles work")
+
+
+def test_raw_format():
+    """Test raw captures store the grabbed pixels with a header, unencoded"""
+    from screensnap import ScreenSnap, create_backend, read_raw
+    
+    expected = create_backend("synthetic", width=160, height=120).grab()
+    with tempfile.TemporaryDirectory() as tmp:
+        with ScreenSnap(output_dir=tmp, format="raw", backend="synthetic", atomic_writes=True,
+                        backend_options={"width": 160, "height": 120},
+                        config_path=Path(tmp) / ".screensnaprc") as snap:
+            filepath = snap.capture()
+            assert filepath.suffix == ".raw"
+            assert not list(Path(tmp).glob(".*"))
+            assert filepath.stat().st_size == 64 + 160 * 120 * 3
+            assert snap.last_timing.bytes == filepath.stat().st_size
+            
+            image, timestamp = read_raw(filepath)
+            assert (image.mode, image.size) == ("RGB", (160, 120))
+            assert image.tobytes() == expected.tobytes()
+            assert timestamp == snap.last_timing.timestamp
+            
+            (Path(tmp) / "bad.raw").write_bytes(b"x" * 80)
+            try:
+                read_raw(Path(tmp) / "bad.raw")
+                raise AssertionError("Garbage accepted as a raw frame")
+            except ValueError:
+                pass
+    print("[OK] Raw format works")
+
+
+def test_encode_raw_frames():
+    """Test `screensnap encode` converts raw captures in worker processes"""
+    from datetime import datetime
+    from screensnap import ScreenSnap, encode_raw, encode_raw_frames, main
+    from PIL import Image
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        raw_dir = Path(tmp) / "raw"
+        with ScreenSnap(output_dir=raw_dir, format="raw", backend="synthetic",
+                        backend_options={"width": 96, "height": 64},
+                        config_path=Path(tmp) / ".screensnaprc") as snap:
+            snap.capture_burst(3, fps=50, prefix="f")
+        (raw_dir / "f_0001.png").write_bytes(b"done earlier")
+        
+        out = Path(tmp) / "out"
+        assert main(["encode", str(raw_dir), "--format", "jpg", "-o", str(out),
+                     "--keep", "-j", "2"]) == 0
+        assert sorted(p.name for p in out.iterdir()) == ["f_0000.jpg", "f_0001.jpg",
+                                                         "f_0002.jpg"]
+        assert len(list(raw_dir.glob("*.raw"))) == 3
+        
+        # Beside the raw files: the existing f_0001.png counts as done
+        assert main(["encode", str(raw_dir)]) == 0
+        assert not list(raw_dir.glob("*.raw"))
+        assert (raw_dir / "f_0001.png").read_bytes() == b"done earlier"
+        with Image.open(raw_dir / "f_0002.png") as image:
+            assert image.size == (96, 64)
+        try:
+            encode_raw_frames([raw_dir], format="raw")
+            raise AssertionError("Encoding to raw accepted")
+        except ValueError:
+            pass
+        
+        # Outputs are found by capture time, not encode time
+        taken = datetime(2020, 1, 2, 3, 4, 5)
+        (raw_dir / "old.raw").write_bytes(
+            encode_raw(Image.new("RGB", (8, 8)), timestamp=taken))
+        encode_raw_frames([raw_dir / "old.raw"], output_dir=out, workers=1)
+        with ScreenSnap(output_dir=out, layout="flat",
+                        backend="synthetic", config_path=Path(tmp) / ".screensnaprc") as snap:
+            assert snap.find_capture(taken, tolerance=1) == out / "old.png"
+        with ScreenSnap(output_dir=tmp, layout="date",
+                        backend="synthetic", config_path=Path(tmp) / ".screensnaprc") as snap:
+            assert (snap._generate_filename("old", taken).parent
+                    == Path(tmp) / "2020-01-02" / "03")
+    print("[OK] Raw frames encoded offline")
+
+
+def test_encode_sessions_webp():
+    """Test encoding raw sessions to lossless WebP with progress and throughput"""
+    from screensnap import ScreenSnap, SessionReader, encode_raw_frames
+    from PIL import Image, features
+    
+    if not features.check("webp"):
+        print("[SKIP] Pillow built without WebP")
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        with ScreenSnap(output_dir=tmp, format="raw", backend="synthetic",
+                        backend_options={"width": 96, "height": 64},
+                        config_path=Path(tmp) / ".screensnaprc") as snap:
+            session = snap.open_session("run")
+            snap.capture_burst(3, fps=50, store=session)
+            session.close()
+        
+        updates = []
+        out = Path(tmp) / "webp"
+        stats = encode_raw_frames([tmp], format="webp", output_dir=out, workers=2,
+                                  progress=lambda done, total, s: updates.append((done, total)))
+        assert sorted(updates) == [(1, 3), (2, 3), (3, 3)]
+        assert (stats["frames"], stats["encoded"], stats["skipped"]) == (3, 3, 0)
+        assert stats["bytes_in"] == 3 * 96 * 64 * 3 and 0 < stats["bytes_out"]
+        assert stats["frames_per_second"] > 0 and stats["seconds"] > 0
+        assert session.path.exists()  # Sessions are never removed
+        
+        with SessionReader(session.path) as reader:
+            for index in range(3):
+                with Image.open(out / f"run_{index:04d}.webp") as image:
+                    assert image.format == "WEBP"
+                    assert image.convert("RGB").tobytes() == reader.frame(index).tobytes()
+        
+        # Resume: everything is done already
+        stats = encode_raw_frames([session.path], format="webp", output_dir=out)
+        assert (stats["encoded"], stats["skipped"]) == (0, 3)
+    print("[OK] Sessions encoded to WebP")
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("ScreenSnap - Encoder Tests")
+    print("=" * 60)
+    
+    tests = [
+        test_parallel_png_roundtrip,
+        test_parallel_png_stream,
+        test_parallel_png_threads,
+        test_encoder_selection,
+        test_compression_profiles,
+        test_raw_format,
+        test_encode_raw_frames,
+        test_encode_sessions_webp
+    ]
+    
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"[FAIL] {test.__name__}: {e}")
+    
+    print("=" * 60)
+    print(f"Results: {passed}/{len(tests)} tests passed")
+    print("=" * 60)
+    sys.exit(0 if passed == len(tests) else 1)
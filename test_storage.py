@@ -0,0 +1,569 @@
+"""
+Storage tests for ScreenSnap
+Purpose: Confirm alternative on-disk layouts store and rebuild frames exactly
+"""
+
+import sys
+sys.path.insert(0, '.')
+
+import tempfile
+from pathlib import Path
+
+
+def _frames(count, width=200, height=130):
+    """Deterministic near-duplicate frames from the synthetic backend"""
+    from screensnap import create_backend
+    
+    backend = create_backend("synthetic", width=width, height=height, seed=3)
+    return [backend.grab() for _ in range(count)]
+
+
+def test_tile_store_roundtrip():
+    """Test every frame is rebuilt pixel-exactly, in any order"""
+    from screensnap import TileStoreWriter, TileStoreReader
+    
+    frames = _frames(12)
+    with tempfile.TemporaryDirectory() as tmp:
+        with TileStoreWriter(Path(tmp) / "s.tiles", tile_size=32,
+                             keyframe_interval=5) as writer:
+            for frame in frames:
+                writer.write(frame)
+        assert writer.keyframes_written == 3
+        assert writer.tiles_written < writer.tiles_total / 2
+        
+        with TileStoreReader(Path(tmp) / "s.tiles") as reader:
+            assert len(reader) == 12
+            for index in (11, 0, 6, 7, 3, 10):
+                assert reader.frame(index).tobytes() == frames[index].tobytes()
+            assert [f.tobytes() for f in reader] == [f.tobytes() for f in frames]
+    print(f"[OK] Tile store round trip ({writer.tiles_written}/{writer.tiles_total} tiles)")
+
+
+def test_tile_store_torn_record():
+    """Test a partially written final record is ignored"""
+    from screensnap import TileStoreWriter, TileStoreReader
+    
+    frames = _frames(3)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = Path(tmp) / "s.tiles"
+        with TileStoreWriter(store) as writer:
+            for frame in frames:
+                writer.write(frame)
+        with open(store / TileStoreWriter.MANIFEST, 'a') as f:
+            f.write('{"frame": 3, "ti')
+        with TileStoreReader(store) as reader:
+            assert len(reader) == 3
+            assert reader.frame(2).tobytes() == frames[2].tobytes()
+    print("[OK] Torn tile store record ignored")
+
+
+def test_burst_into_tile_store():
+    """Test burst capture can write straight into a tile store"""
+    from screensnap import ScreenSnap, TileStoreReader
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        with ScreenSnap(output_dir=tmp, backend="synthetic",
+                        backend_options={"width": 160, "height": 120},
+                        config_path=Path(tmp) / ".screensnaprc") as snap:
+            with snap.open_tile_store("glitch") as store:
+                result = snap.capture_burst(4, fps=100, store=store)
+        assert result.paths == [] and result.summary()["frames"] == 4
+        with TileStoreReader(Path(tmp) / "glitch.tiles") as reader:
+            assert len(reader) == 4
+            assert reader.timestamp(0) <= reader.timestamp(3)
+    print("[OK] Burst writes into tile store")
+
+
+def test_filename_allocator_concurrent():
+    """Test auto-names never collide across threads and processes"""
+    import subprocess
+    
+    worker = (
+        "import sys, threading\n"
+        "sys.path.insert(0, '.')\n"
+        "from screensnap import allocate_filename\n"
+        "def run():\n"
+        "    for _ in range(100):\n"
+        "        allocate_filename(sys.argv[1], 'screenshot', 'png')\n"
+        "threads = [threading.Thread(target=run) for _ in range(4)]\n"
+        "[t.start() for t in threads]\n"
+        "[t.join() for t in threads]\n"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        processes = [subprocess.Popen([sys.executable, "-c", worker, tmp])
+                     for _ in range(4)]
+        for process in processes:
+            assert process.wait(timeout=60) == 0
+        assert len(list(Path(tmp).glob("screenshot_*.png"))) == 4 * 4 * 100
+    print("[OK] Filename allocator is collision-free")
+
+
+def test_rapid_auto_named_captures():
+    """Test back-to-back captures get distinct, ordered names"""
+    from screensnap import ScreenSnap
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        with ScreenSnap(output_dir=tmp, backend="synthetic",
+                        backend_options={"width": 64, "height": 48},
+                        config_path=Path(tmp) / ".screensnaprc") as snap:
+            paths = [snap.capture() for _ in range(5)]
+            paths += [snap.capture_async().result() for _ in range(5)]
+        assert len(set(paths)) == 10
+        assert paths == sorted(paths)
+        assert all(p.stat().st_size > 0 for p in paths)
+        assert len(list(Path(tmp).iterdir())) == 10
+    print("[OK] Rapid captures do not overwrite each other")
+
+
+def test_atomic_writes():
+    """Test atomic mode publishes complete files only, via rename"""
+    import os
+    import screensnap
+    from screensnap import ScreenSnap
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        renames = []
+        real_replace = os.replace
+        
+        def spy_replace(src, dst):
+            # The final name must not exist yet (not even as a placeholder)
+            renames.append((Path(src).name, Path(dst).exists()))
+            real_replace(src, dst)
+        
+        with ScreenSnap(output_dir=tmp, backend="synthetic", atomic_writes=True,
+                        fsync="per-file",
+                        backend_options={"width": 64, "height": 48},
+                        config_path=Path(tmp) / ".screensnaprc") as snap:
+            screensnap.os.replace = spy_replace
+            try:
+                auto = snap.capture()
+                named = snap.capture("named.png")
+            finally:
+                screensnap.os.replace = real_replace
+            
+            assert [exists for _, exists in renames] == [False, False]
+            assert all(name.startswith(".") and name.endswith(".tmp")
+                       for name, _ in renames)
+            assert auto.stat().st_size > 0 and named.stat().st_size > 0
+            
+            # A failed write leaves neither the final file nor a temp file
+            snap._encode_image = lambda image: None
+            try:
+                snap.capture()
+                raise AssertionError("Failed write did not raise")
+            except RuntimeError:
+                pass
+        assert sorted(p.name for p in Path(tmp).iterdir()) == sorted([auto.name, "named.png"])
+    print("[OK] Atomic writes publish complete files")
+
+
+def test_fsync_batched():
+    """Test the batched fsync policy syncs once per batch"""
+    import screensnap
+    from screensnap import OutputWriter
+    
+    synced = []
+    real_fsync = screensnap.os.fsync
+    with tempfile.TemporaryDirectory() as tmp:
+        writer = OutputWriter(atomic=True, fsync="batched", batch_size=3,
+                              batch_seconds=3600)
+        screensnap.os.fsync = lambda fd: synced.append(fd)
+        try:
+            for i in range(4):
+                writer.write(Path(tmp) / f"f{i}.png", b"data")
+            # 3 files + 1 directory for the first batch
+            assert len(synced) == 4
+            writer.close()
+            assert len(synced) == 6
+        finally:
+            screensnap.os.fsync = real_fsync
+    
+    try:
+        OutputWriter(fsync="sometimes")
+        raise AssertionError("Invalid fsync policy accepted")
+    except ValueError:
+        pass
+    print("[OK] Batched fsync works")
+
+
+def test_sharded_layouts():
+    """Test date/hash layouts place captures by time and find them again"""
+    from datetime import datetime, timedelta
+    from screensnap import (ScreenSnap, OutputLayout, allocate_filename,
+                            parse_capture_time)
+    
+    base = datetime(2026, 1, 18, 13, 58, 0)
+    times = [base + timedelta(seconds=37 * i) for i in range(20)]
+    for layout in ("date", "hash"):
+        with tempfile.TemporaryDirectory() as tmp:
+            shards = OutputLayout(tmp, layout)
+            paths = [allocate_filename(shards.directory_for(t), "screenshot", "png", now=t)
+                     for t in times]
+            assert [parse_capture_time(p) for p in paths] == times
+            if layout == "date":
+                assert paths[0].parent.relative_to(tmp).as_posix() == "2026-01-18/13"
+                assert paths[-1].parent.relative_to(tmp).as_posix() == "2026-01-18/14"
+            else:
+                assert len({p.parent for p in paths}) > 10
+            
+            start, end = times[5], times[8]
+            found = shards.find(start, end)
+            assert [p for _, p in found] == paths[5:9]
+            # Only the shards covering the range are listed
+            assert shards.candidate_directories(start, start) == [paths[5].parent]
+            if layout == "date":
+                assert len(shards.candidate_directories(start, end)) == 1
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        with ScreenSnap(output_dir=tmp, backend="synthetic", layout="date",
+                        backend_options={"width": 64, "height": 48},
+                        config_path=Path(tmp) / ".screensnaprc") as snap:
+            first = snap.capture()
+            named = snap.capture("named.png")
+            assert first.parent == named.parent != Path(tmp)
+            assert snap.find_captures(datetime.now() - timedelta(minutes=1)) == [first, named]
+            assert snap.find_capture(parse_capture_time(first)) == first
+            assert snap.find_capture(datetime(2000, 1, 1)) is None
+        try:
+            ScreenSnap(output_dir=tmp, layout="tree",
+                       backend="synthetic", config_path=Path(tmp) / ".screensnaprc")
+            raise AssertionError("Invalid layout accepted")
+        except ValueError:
+            pass
+    print("[OK] Sharded layouts work")
+
+
+def test_capture_index():
+    """Test captures are indexed in batches and searchable by time, window, hash"""
+    from screensnap import ScreenSnap, CaptureIndex, FlightRecorder
+    from datetime import datetime, timedelta
+    import hashlib
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        before = datetime.now() - timedelta(seconds=1)
+        with ScreenSnap(output_dir=tmp, backend="synthetic", index=True,
+                        backend_options={"width": 160, "height": 120,
+                                         "monitors": [[160, 120], [80, 60]]},
+                                         config_path=Path(tmp) / ".screensnaprc") as snap:
+            first = snap.capture("i1.png")
+            snap.capture_monitor(2, "i2.png")
+            snap.capture()
+            try:
+                snap.capture("bad/name.png")
+            except ValueError:
+                pass
+            snap.index.flush()
+            index_path = snap.index.path
+        
+        assert index_path == Path(tmp) / ".screensnap-index.db"
+        with CaptureIndex(index_path) as index:
+            rows = index.query(start=before)
+            assert len(rows) == 3  # The failed capture is not indexed
+            assert [row["kind"] for row in rows] == ["screen", "monitor", "screen"]
+            assert rows[1]["monitor"] == 2 and (rows[1]["width"], rows[1]["height"]) == (80, 60)
+            assert rows[0]["path"] == str(first.absolute())
+            assert rows[0]["bytes"] == first.stat().st_size
+            assert rows[0]["encode_ms"] > 0 and rows[0]["total_ms"] >= rows[0]["encode_ms"]
+            
+            digest = hashlib.sha256(first.read_bytes()).hexdigest()
+            assert rows[0]["sha256"] == digest
+            assert [row["path"] for row in index.query(sha256=digest[:10])] == [rows[0]["path"]]
+            assert index.query(end=before) == []
+            nearest = index.query(around=rows[2]["timestamp"], limit=1)
+            assert nearest[0]["id"] == rows[2]["id"]
+            assert index.query(window="chrome") == []
+    
+    # Frames saved off the capture() path are indexed too
+    with tempfile.TemporaryDirectory() as tmp:
+        with ScreenSnap(output_dir=tmp, backend="synthetic", index=True,
+                        backend_options={"width": 160, "height": 120,
+                                         "monitors": [[160, 120], [80, 60]]},
+                                         config_path=Path(tmp) / ".screensnaprc") as snap:
+            recorder = FlightRecorder(snap, seconds=5, fps=10)
+            recorder.record_frame()
+            recorder.dump("flight")
+            snap.capture_async().result()
+            snap.capture_burst(2, fps=50, prefix="b")
+            snap.capture_all_monitors("all")
+            session = snap.open_session("timer")
+            snap.capture_periodic(0.01, count=1, store=session)
+            session.close()
+            snap.index.flush()
+            rows = snap.index.query()
+        kinds = sorted(row["kind"] for row in rows)
+        assert kinds == ["burst", "burst", "monitor", "monitor", "recorder",
+                         "screen", "screen"]
+        # The timer frame went into the session, which is not hashed
+        in_session = [row for row in rows if row["path"] == str(session.path.absolute())]
+        assert len(in_session) == 1 and in_session[0]["sha256"] is None
+        assert all(row["sha256"] for row in rows if row not in in_session)
+    print("[OK] Capture index works")
+
+
+def test_query_cli():
+    """Test `screensnap query` reads the index written by --index"""
+    from screensnap import main
+    import contextlib
+    import io
+    import json
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        assert main(["--backend", "synthetic", "--output-dir", tmp, "--index", "q.png"]) == 0
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            assert main(["query", "--output-dir", tmp, "--since", "00:00", "--json"]) == 0
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert len(rows) == 1 and rows[0]["path"].endswith("q.png")
+        assert len(rows[0]["sha256"]) == 64
+        
+        assert main(["query", "--index", str(Path(tmp) / "missing.db")]) == 1
+    print("[OK] Query CLI works")
+
+
+def test_dedup_store():
+    """Test identical frames are stored once and unreferenced data is collected"""
+    from screensnap import ScreenSnap, main
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        with ScreenSnap(output_dir=tmp, backend="synthetic", dedup=True, atomic_writes=True,
+                        backend_options={"width": 160, "height": 120},
+                        config_path=Path(tmp) / ".screensnaprc") as snap:
+            # The taskbar clock is outside the region, so these frames match
+            same = [snap.capture(region=(0, 0, 100, 50)) for _ in range(3)]
+            assert snap.last_timing.bytes == 0
+            full = snap.capture("full.png")
+            stats = snap.store.stats()
+            assert (stats["objects"], stats["references"]) == (2, 4)
+            assert (stats["hits"], stats["misses"]) == (2, 2)
+            assert len({path.stat().st_ino for path in same}) == 1
+            assert same[0].read_bytes() != full.read_bytes()
+            assert not list(Path(tmp).glob(".*.tmp"))
+        
+        for path in same[1:] + [full]:
+            path.unlink()
+        assert main(["gc", "--output-dir", tmp, "--dry-run"]) == 0
+        assert snap.store.stats()["objects"] == 2
+        assert main(["gc", "--output-dir", tmp]) == 0
+        stats = snap.store.stats()
+        assert (stats["objects"], stats["references"]) == (1, 1)
+        assert same[0].stat().st_size > 0
+    print("[OK] Deduplicating store works")
+
+
+def test_retention_evictor():
+    """Test retention limits from config evict oldest-first or largest-first"""
+    from screensnap import ScreenSnap, RetentionEvictor, parse_size, parse_duration
+    import json
+    import os
+    import time
+    
+    assert parse_size("1.5KB") == 1536 and parse_size(2048) == 2048
+    assert parse_size("500M") == parse_size("500MB") == 500 * 1024 ** 2
+    assert parse_size("5k") == 5120 and parse_size("1G") == 1024 ** 3
+    assert parse_duration("2h") == 7200 and parse_duration("90") == 90
+    for bad in (lambda: parse_size("lots"), lambda: parse_size("5XB"),
+                lambda: parse_size("5 MiB"), lambda: parse_size("-1"),
+                lambda: RetentionEvictor(".", priority="newest")):
+        try:
+            bad()
+            raise AssertionError("Invalid retention setting accepted")
+        except ValueError:
+            pass
+    with tempfile.TemporaryDirectory() as tmp:
+        with ScreenSnap(output_dir=tmp, backend="synthetic",
+                        retention={"max_bytes": "500M"},
+                        config_path=Path(tmp) / ".screensnaprc") as snap:
+            assert snap.evictor.max_bytes == 500 * 1024 ** 2
+        try:
+            ScreenSnap(output_dir=tmp, backend="synthetic", retention={"max_bytes": "5XB"},
+                       config_path=Path(tmp) / ".screensnaprc")
+            raise AssertionError("Invalid max_bytes accepted")
+        except ValueError:
+            pass
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        old = [tmp / "screenshot_20200101_120000_000_0001.png",
+               tmp / "screenshot_20200101_120001_000_0002.webp",
+               tmp / "session_20200101_120002_000_0003.snapsession"]
+        logo = tmp / "docs" / "logo.png"
+        logo.parent.mkdir()
+        for path in (*old, logo):
+            path.write_bytes(b"x" * 10)
+            os.utime(path, (time.time() - 7200, time.time() - 7200))
+        (tmp / ".hidden.png").write_bytes(b"x" * 10)
+        (tmp / ".screensnaprc").write_text(json.dumps({
+            "retention": {"max_age": "1h", "max_count_per_dir": 3}
+        }))
+        with ScreenSnap(output_dir=tmp, backend="synthetic", config_path=tmp / ".screensnaprc",
+                        backend_options={"width": 160, "height": 120}) as snap:
+            paths = []
+            for i in range(5):
+                paths.append(snap.capture(f"r{i}.png"))
+                os.utime(paths[-1], (time.time() - 60 + i, time.time() - 60 + i))
+        assert not any(path.exists() for path in old) and (tmp / ".hidden.png").exists()
+        assert logo.exists()  # Not named like a capture: never ours to delete
+        assert sorted(p.name for p in tmp.glob("r*.png")) == ["r2.png", "r3.png", "r4.png"]
+        assert snap.evictor.evicted == 5 and snap.evictor.file_count == 3
+        
+        # A fresh evictor skips the custom names on its scan until they are
+        # reported through track()
+        sizes = {path: path.stat().st_size for path in paths[2:]}
+        largest = max(sizes, key=sizes.get)
+        evictor = RetentionEvictor(tmp, max_bytes=sum(sizes.values()) - 1,
+                                   priority="largest").start()
+        evictor.enforce()
+        assert evictor.file_count == 0 and largest.exists()
+        for path in paths[2:]:
+            evictor.track(path)
+        evictor.close()
+        assert not largest.exists() and evictor.bytes_evicted == sizes[largest]
+        assert evictor.total_bytes == sum(sizes.values()) - sizes[largest]
+        
+        # Sessions count once they are closed
+        with ScreenSnap(output_dir=tmp / "s", backend="synthetic",
+                        retention={"max_count_per_dir": 1},
+                        backend_options={"width": 16, "height": 16},
+                        config_path=Path(tmp) / ".screensnaprc") as snap:
+            for name in ("first", "second"):
+                with snap.open_session(name) as session:
+                    session.write(snap.backend.grab())
+                snap.evictor.enforce()
+            assert [p.name for p in (tmp / "s").iterdir()] == ["second.snapsession"]
+    print("[OK] Retention evictor works")
+
+
+def test_session_container():
+    """Test burst frames go into one session file readable at random"""
+    from screensnap import ScreenSnap, SessionReader
+    from PIL import Image
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        with ScreenSnap(output_dir=tmp, backend="synthetic",
+                        backend_options={"width": 160, "height": 120},
+                        config_path=Path(tmp) / ".screensnaprc") as snap:
+            session = snap.open_session("run")
+            result = snap.capture_burst(4, fps=50, store=session)
+            session.close()
+            assert result.paths == [] and session.frames_written == 4
+            assert session.path == Path(tmp) / "run.snapsession"
+            try:
+                snap.open_session("run")
+                raise AssertionError("Existing session overwritten")
+            except ValueError:
+                pass
+            
+            with SessionReader(session.path) as reader:
+                assert reader.complete and len(reader) == 4
+                assert reader.extensions == ["png"] * 4
+                third = reader.frame(2)
+                assert third.size == (160, 120)
+                assert third.tobytes() != reader.frame(1).tobytes()
+                assert reader.timestamp(0) <= reader.timestamp(3)
+                stored = bytes(reader.frame_bytes(2))
+            
+            paths = snap.export_session(session.path)
+            assert [p.name for p in paths] == [f"run_{i:04d}.png" for i in range(4)]
+            assert paths[2].read_bytes() == stored
+        
+        with ScreenSnap(output_dir=Path(tmp) / "jpg", format="jpg", backend="synthetic",
+                        config_path=Path(tmp) / ".screensnaprc") as snap:
+            paths = snap.export_session(session.path, "j")
+            with Image.open(paths[2]) as image:
+                assert image.format == "JPEG" and image.size == (160, 120)
+    print("[OK] Session container works")
+
+
+def test_session_recovery():
+    """Test a session without its trailing index is rebuilt by scanning"""
+    from screensnap import ScreenSnap, SessionReader, main
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        with ScreenSnap(output_dir=tmp, backend="synthetic",
+                        backend_options={"width": 96, "height": 64},
+                        config_path=Path(tmp) / ".screensnaprc") as snap:
+            session = snap.open_session("crash")
+            snap.capture_periodic(0.01, count=3, store=session)
+            # Writer killed mid-frame: no footer, torn last record
+            session._file.write(b"FRME\x03")
+            session._file.flush()
+            with SessionReader(session.path) as reader:
+                assert not reader.complete and len(reader) == 3
+                assert reader.frame(2).size == (96, 64)
+            session._file.close()
+        
+        out = Path(tmp) / "out"
+        assert main(["session", "export", str(session.path), "-o", str(out)]) == 0
+        assert len(list(out.glob("crash_*.png"))) == 3
+        assert main(["session", "info", str(Path(tmp) / "missing.snapsession")]) == 1
+    print("[OK] Session recovery works")
+
+
+def test_session_retention_cli():
+    """Test sessions written from the CLI are reported to retention"""
+    import screensnap
+    import contextlib
+    import io
+    import json
+    import os
+    import time
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        old = tmp / "screenshot_20200101_120000_000_0001.png"
+        old.write_bytes(b"x" * 10)
+        os.utime(old, (time.time() - 60, time.time() - 60))
+        config_path = tmp / ".screensnaprc"
+        config_path.write_text(json.dumps({
+            "backend_options": {"width": 32, "height": 24},
+            "retention": {"max_count_per_dir": 1}
+        }))
+        default_config = screensnap.DEFAULT_CONFIG_PATH
+        screensnap.DEFAULT_CONFIG_PATH = config_path
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                assert screensnap.main(["--backend", "synthetic", "--output-dir", str(tmp),
+                                        "--session", "--burst", "2", "run"]) == 0
+        finally:
+            screensnap.DEFAULT_CONFIG_PATH = default_config
+        # The closed session counted, pushing out the older capture
+        remaining = [p.name for p in tmp.iterdir() if not p.name.startswith(".")]
+        assert remaining == ["run.snapsession"]
+    print("[OK] CLI sessions are covered by retention")
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("ScreenSnap - Storage Tests")
+    print("=" * 60)
+    
+    tests = [
+        test_tile_store_roundtrip,
+        test_tile_store_torn_record,
+        test_burst_into_tile_store,
+        test_filename_allocator_concurrent,
+        test_rapid_auto_named_captures,
+        test_atomic_writes,
+        test_fsync_batched,
+        test_sharded_layouts,
+        test_capture_index,
+        test_query_cli,
+        test_dedup_store,
+        test_retention_evictor,
+        test_session_container,
+        test_session_recovery,
+        test_session_retention_cli
+    ]
+    
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"[FAIL] {test.__name__}: {e}")
+    
+    print("=" * 60)
+    print(f"Results: {passed}/{len(tests)} tests passed")
+    print("=" * 60)
+    sys.exit(0 if passed == len(tests) else 1)